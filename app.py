@@ -5,8 +5,11 @@ from flask import Flask, flash, redirect, url_for, request, render_template
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.middleware.proxy_fix import ProxyFix
 from extensions import db
+import sqlite_backend
+import sharding
 from models import User, Admin, Coach
 from decorators import admin_required, coach_required
+from hot_queries import user_by_username
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -24,8 +27,11 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
 }
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
-# initialize extensions
-db.init_app(app)
+# tournament shards from SHARD_DATABASES, if any (see sharding.py)
+sharding.configure(app)
+
+# initialize extensions (SQLite files get WAL, pragmas and separate read/write pools)
+sqlite_backend.init_app(app, db)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
@@ -42,7 +48,7 @@ def login():
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
-        user = User.query.filter_by(username=username).first()
+        user = user_by_username(username)
         
         if user and user.check_password(password):
             login_user(user)
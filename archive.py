@@ -0,0 +1,117 @@
+"""Archival of MatchUpdate events for completed matches.
+
+Events of finished tournaments are copied into match_update_archive, compacted
+into one MatchSummary row per match, then deleted from the live table, all with
+set-based INSERT ... SELECT / DELETE statements in batches of matches. The live
+table only ever holds current seasons, so its size and index depth stay flat.
+Archived rows get ids of their own, so transfer.py can import archived events
+next to rows archived locally.
+
+Usage:
+    python archive.py tournament 3
+    python archive.py before 2025-07-01     # every tournament ended before that date
+"""
+import argparse
+from datetime import date, datetime
+
+from sqlalchemy import select, insert, delete, func, case, and_, literal, DateTime
+
+from extensions import db
+from models import Tournament, Match, MatchUpdate, MatchUpdateArchive, MatchSummary
+
+BATCH_MATCHES = 500
+
+EVENT_COLUMNS = ['match_id', 'minute', 'update_type', 'team_id', 'player_id', 'description', 'timestamp']
+
+
+def _count_where(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def _archive_batch(match_ids):
+    """Move one batch of matches' events to the archive and write their summaries."""
+    live = MatchUpdate.__table__
+    archived_at = datetime.utcnow()
+
+    db.session.execute(
+        insert(MatchUpdateArchive.__table__).from_select(
+            EVENT_COLUMNS + ['archived_at'],
+            select(*[live.c[name] for name in EVENT_COLUMNS], literal(archived_at, DateTime))
+            .where(live.c.match_id.in_(match_ids))
+            .order_by(live.c.id)
+        )
+    )
+
+    summary = select(
+        Match.id,
+        Match.tournament_id,
+        func.count(live.c.id),
+        _count_where(and_(live.c.update_type == 'goal', live.c.team_id == Match.home_team_id)),
+        _count_where(and_(live.c.update_type == 'goal', live.c.team_id == Match.away_team_id)),
+        _count_where(live.c.update_type == 'yellow_card'),
+        _count_where(live.c.update_type == 'red_card'),
+        func.min(live.c.timestamp),
+        func.max(live.c.timestamp),
+        literal(archived_at, DateTime),
+    ).select_from(Match).outerjoin(live, live.c.match_id == Match.id)\
+     .where(Match.id.in_(match_ids))\
+     .group_by(Match.id, Match.tournament_id)
+    db.session.execute(
+        insert(MatchSummary.__table__).from_select(
+            ['match_id', 'tournament_id', 'event_count', 'home_goals', 'away_goals',
+             'yellow_cards', 'red_cards', 'first_event_at', 'last_event_at', 'archived_at'],
+            summary
+        )
+    )
+
+    result = db.session.execute(delete(live).where(live.c.match_id.in_(match_ids)))
+    db.session.commit()
+    return result.rowcount
+
+
+def archive_tournament(tournament_id, batch_matches=BATCH_MATCHES):
+    """Archive the events of every completed, not yet archived match of a tournament.
+
+    Returns (matches archived, events moved).
+    """
+    match_ids = db.session.scalars(
+        select(Match.id)
+        .where(Match.tournament_id == tournament_id, Match.status == 'completed')
+        .where(~select(MatchSummary.match_id).where(MatchSummary.match_id == Match.id).exists())
+        .order_by(Match.id)
+    ).all()
+
+    events = 0
+    for start in range(0, len(match_ids), batch_matches):
+        events += _archive_batch(match_ids[start:start + batch_matches])
+    return len(match_ids), events
+
+
+def archive_finished_before(cutoff):
+    """Archive every tournament whose end_date is before cutoff. Returns {tournament_id: (matches, events)}."""
+    tournament_ids = db.session.scalars(
+        select(Tournament.id).where(Tournament.end_date < cutoff).order_by(Tournament.id)
+    ).all()
+    return {tournament_id: archive_tournament(tournament_id) for tournament_id in tournament_ids}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Archive MatchUpdate events of completed matches.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    tournament_parser = sub.add_parser('tournament')
+    tournament_parser.add_argument('tournament_id', type=int)
+    before_parser = sub.add_parser('before')
+    before_parser.add_argument('cutoff', type=date.fromisoformat)
+    args = parser.parse_args()
+
+    from app import app
+
+    with app.app_context():
+        db.create_all()
+        if args.command == 'tournament':
+            matches, events = archive_tournament(args.tournament_id)
+            print(f"Archived {events} events from {matches} matches of tournament {args.tournament_id}")
+        else:
+            for tournament_id, (matches, events) in archive_finished_before(args.cutoff).items():
+                print(f" - Tournament {tournament_id}: {events} events from {matches} matches")
+            print("Archival complete.")
@@ -0,0 +1,198 @@
+"""Endpoint benchmark suite.
+
+Drives the hot public and live endpoints against the configured database
+(populate it first with synthetic_data.py) and reports p50/p99 latency and
+throughput per endpoint. Results can be saved and compared against a
+baseline so a regression fails the run before deploy.
+
+Usage:
+    python benchmark.py --requests 200 --concurrency 4 --output bench.json
+    python benchmark.py --baseline bench.json --max-regression 0.2
+    python benchmark.py --base-url http://localhost:5000   # drive a running server
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from sqlalchemy import select
+
+from extensions import db
+from models import Tournament, Team, Match
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def build_scenarios(rng, sample_size=50):
+    """Pick a reproducible sample of ids and return (name, method, url, payload) factories."""
+    tournament_ids = db.session.scalars(select(Tournament.id).limit(sample_size)).all()
+    team_ids = db.session.scalars(select(Team.id).limit(sample_size * 4)).all()
+    match_ids = db.session.scalars(select(Match.id).order_by(Match.id.desc()).limit(sample_size * 4)).all()
+    live_ids = db.session.scalars(
+        select(Match.id).where(Match.status != 'completed').limit(sample_size)).all() or match_ids
+    if not (tournament_ids and team_ids and match_ids):
+        raise SystemExit('Database is empty: run synthetic_data.py first.')
+
+    return [
+        ('standings', 'GET', lambda: f'/tournaments/{rng.choice(tournament_ids)}/standings', None),
+        ('team_detail', 'GET', lambda: f'/teams/{rng.choice(team_ids)}', None),
+        ('matches', 'GET', lambda: '/matches', None),
+        ('api_live_match_data', 'GET', lambda: f'/api/matches/{rng.choice(match_ids)}/live', None),
+        ('api_update_score', 'POST', lambda: f'/api/matches/{rng.choice(live_ids)}/score',
+         lambda: {'team': rng.choice(('home', 'away'))}),
+    ]
+
+
+class TestClientDriver:
+    """Runs requests in-process through Flask's test client (one client per thread)."""
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def request(self, method, url, payload):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.open(url, method=method, json=payload)
+        response.close()
+        return response.status_code
+
+
+class HttpDriver:
+    """Runs requests against a live server, e.g. gunicorn behind the real proxy."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, url, payload):
+        data = json.dumps(payload).encode() if payload is not None else None
+        req = urllib.request.Request(self.base_url + url, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'} if data else {})
+        try:
+            with urllib.request.urlopen(req) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as exc:
+            return exc.code
+
+
+def run_scenario(driver, method, url_factory, payload_factory, requests, concurrency, warmup=5):
+    """Issue `requests` calls over `concurrency` threads; return timing samples in ms."""
+    for _ in range(warmup):
+        driver.request(method, url_factory(), payload_factory() if payload_factory else None)
+
+    samples, errors = [], []
+    lock = threading.Lock()
+    per_thread = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+
+    def worker(count):
+        local_samples, local_errors = [], 0
+        for _ in range(count):
+            url = url_factory()
+            payload = payload_factory() if payload_factory else None
+            started = time.perf_counter()
+            status = driver.request(method, url, payload)
+            local_samples.append((time.perf_counter() - started) * 1000)
+            if status >= 500:
+                local_errors += 1
+        with lock:
+            samples.extend(local_samples)
+            errors.append(local_errors)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(count,)) for count in per_thread]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    samples.sort()
+    return {
+        'requests': len(samples),
+        'errors': sum(errors),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'mean_ms': round(sum(samples) / len(samples), 3) if samples else 0.0,
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def compare(results, baseline, max_regression):
+    """Return the list of endpoints whose p50 or p99 regressed beyond the allowed ratio."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for key in ('p50_ms', 'p99_ms'):
+            if previous[key] and result[key] > previous[key] * (1 + max_regression):
+                regressions.append(f'{name} {key}: {previous[key]} -> {result[key]}')
+    return regressions
+
+
+def print_report(results):
+    print(f"{'endpoint':<22}{'reqs':>7}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'req/s':>10}")
+    for name, r in results.items():
+        print(f"{name:<22}{r['requests']:>7}{r['errors']:>8}{r['p50_ms']:>10}{r['p99_ms']:>10}"
+              f"{r['mean_ms']:>10}{r['throughput_rps']:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the key endpoints.')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--only', action='append', help='run only the named endpoint(s)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--base-url', help='drive a running server instead of the test client')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='allowed relative p50/p99 slowdown versus the baseline')
+    args = parser.parse_args(argv)
+
+    from app import app
+    import routes  # noqa: F401
+
+    rng = random.Random(args.seed)
+    with app.app_context():
+        scenarios = build_scenarios(rng)
+        db.session.remove()
+
+    driver = HttpDriver(args.base_url) if args.base_url else TestClientDriver(app)
+    results = {}
+    for name, method, url_factory, payload_factory in scenarios:
+        if args.only and name not in args.only:
+            continue
+        results[name] = run_scenario(driver, method, url_factory, payload_factory,
+                                     args.requests, args.concurrency)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            regressions = compare(results, json.load(fp), args.max_regression)
+        if regressions:
+            print('Regressions detected:')
+            for line in regressions:
+                print(f' - {line}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
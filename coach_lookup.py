@@ -0,0 +1,93 @@
+"""Coach lookup for the team form.
+
+Only unassigned coaches can be picked, so the filter runs in SQL (NOT EXISTS
+on team.coach_id) over plain user columns, without hydrating polymorphic
+Coach objects. Pages use a keyset cursor on username, so a deep page costs
+the same as the first. Results are cached per (prefix, cursor, limit) and
+keyed on a version of the coach list and team assignments, checked in one
+cheap aggregate query; entries also expire after CACHE_SECONDS because
+username edits do not change that version.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import select, func, exists
+
+from extensions import db
+from http_cache import fingerprint, table_version
+import sharding
+from models import User, Team, Coach
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+CACHE_SECONDS = 60
+MAX_ENTRIES = 1000
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _unassigned():
+    if sharding.enabled():
+        # Teams live in the tournament shards, away from users: collect their coaches first
+        return User.id.notin_(db.session.scalars(select(Team.coach_id).where(Team.coach_id.isnot(None))).all())
+    return ~exists().where(Team.coach_id == User.id)
+
+
+def _version():
+    coaches = User.role == 'coach'
+    etag, _ = fingerprint(
+        (select(func.count()).select_from(User).where(coaches).scalar_subquery(),
+         select(func.max(User.id)).where(coaches).scalar_subquery()),
+        table_version(Team, Team.coach_id.isnot(None)),
+    )
+    return etag
+
+
+def search_coaches(prefix='', after=None, limit=DEFAULT_LIMIT):
+    """Unassigned coaches whose username or name starts with prefix, ordered by username."""
+    stmt = (select(User.id, User.username, User.first_name, User.last_name)
+            .where(User.role == 'coach', _unassigned())
+            .order_by(User.username)
+            .limit(limit + 1))
+    if prefix:
+        stmt = stmt.where(db.or_(User.username.istartswith(prefix, autoescape=True),
+                                 User.first_name.istartswith(prefix, autoescape=True),
+                                 User.last_name.istartswith(prefix, autoescape=True)))
+    if after:
+        stmt = stmt.where(User.username > after)
+    rows = db.session.execute(stmt).all()
+    coaches = [{'id': row.id, 'username': row.username,
+                'name': ' '.join(part for part in (row.first_name, row.last_name) if part)}
+               for row in rows[:limit]]
+    return {'coaches': coaches, 'next': coaches[-1]['username'] if len(rows) > limit else None}
+
+
+def cached_search(prefix='', after=None, limit=DEFAULT_LIMIT):
+    key = (prefix.lower(), after, limit)
+    version = _version()
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(key)
+        if entry and entry[0] == version and entry[1] > now:
+            _cache.move_to_end(key)
+            return entry[2]
+    page = search_coaches(prefix, after, limit)
+    with _lock:
+        _cache[key] = (version, now + CACHE_SECONDS, page)
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return page
+
+
+def get_available_coach(username):
+    """The coach with this (unique) username if it exists and has no team yet, in a single query."""
+    return db.session.scalars(
+        select(Coach).where(Coach.username == username, _unassigned())).first()
+
+
+def invalidate():
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,128 @@
+"""Player eligibility for upcoming matches.
+
+A player is eligible when available (Player.is_available) and not suspended.
+Suspensions come from cards recorded in PlayerMatchPerformance within the
+team's tournament: a red card bans the player for the team's next
+RED_CARD_BAN matches, and every YELLOW_CARD_THRESHOLD accumulated yellows ban
+them for the next match.
+
+Each team's squad eligibility is computed with two queries and kept in a
+per-process cache until something that affects it changes: a card, an
+availability toggle, a new player, a squad selection or a completed match.
+Cards and results written by another worker arrive over the live bus; roster
+and availability writes publish no live event (they have no match), so
+entries also expire after CACHE_SECONDS. The coach dashboard reads the whole
+squad with one lookup.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import select
+
+from extensions import db
+from models import Team, Player, Match, PlayerMatchPerformance
+
+YELLOW_CARD_THRESHOLD = 3
+RED_CARD_BAN = 1
+CACHE_SECONDS = 60
+
+_cache = {}  # team_id -> (expires_at, squad)
+_lock = threading.Lock()
+
+
+def _team_matches(team):
+    return db.session.scalars(
+        select(Match.id)
+        .where(Match.tournament_id == team.tournament_id, Match.status == 'completed',
+               db.or_(Match.home_team_id == team.id, Match.away_team_id == team.id))
+        .order_by(Match.match_date, Match.id)
+    ).all()
+
+
+def _card_history(team):
+    perf = PlayerMatchPerformance
+    return db.session.execute(
+        select(perf.player_id, perf.match_id, perf.yellow_cards, perf.red_cards)
+        .join(Player, Player.id == perf.player_id)
+        .join(Match, Match.id == perf.match_id)
+        .where(Player.team_id == team.id, Match.tournament_id == team.tournament_id,
+               Match.status == 'completed',
+               db.or_(perf.yellow_cards > 0, perf.red_cards > 0))
+        .order_by(Match.match_date, Match.id)
+    ).all()
+
+
+def compute_team_eligibility(team):
+    """Squad eligibility of one team: {player_id: {...}} for every player."""
+    match_index = {match_id: i for i, match_id in enumerate(_team_matches(team))}
+    next_match = len(match_index)
+
+    yellows = defaultdict(int)
+    suspended_until = {}
+    reasons = {}
+    for player_id, match_id, yellow_cards, red_cards in _card_history(team):
+        index = match_index.get(match_id)
+        if index is None:
+            continue
+        ban = 0
+        if red_cards:
+            ban += RED_CARD_BAN
+            reasons[player_id] = 'red_card'
+        before = yellows[player_id]
+        yellows[player_id] += yellow_cards or 0
+        accumulated = yellows[player_id] // YELLOW_CARD_THRESHOLD - before // YELLOW_CARD_THRESHOLD
+        if accumulated:
+            ban += accumulated
+            reasons.setdefault(player_id, 'yellow_accumulation')
+        if ban:
+            # A ban is served over the team's following matches, stacking with any ban in progress
+            start = max(index + 1, suspended_until.get(player_id, 0))
+            suspended_until[player_id] = start + ban
+
+    squad = {}
+    for player_id, is_available in db.session.execute(
+            select(Player.id, Player.is_available).where(Player.team_id == team.id)):
+        suspended = suspended_until.get(player_id, 0) > next_match
+        squad[player_id] = {
+            'available': bool(is_available),
+            'suspended': suspended,
+            'matches_remaining': max(0, suspended_until.get(player_id, 0) - next_match),
+            'reason': reasons.get(player_id) if suspended else None,
+            'yellow_cards': yellows.get(player_id, 0),
+            'eligible': bool(is_available) and not suspended,
+        }
+    return squad
+
+
+def get_team_eligibility(team_id):
+    """Cached squad eligibility for a team; computed on first use after an invalidation or expiry."""
+    now = time.monotonic()
+    with _lock:
+        expires_at, squad = _cache.get(team_id, (0, None))
+    if squad is None or expires_at <= now:
+        team = db.session.get(Team, team_id)
+        if team is None:
+            return None
+        squad = compute_team_eligibility(team)
+        with _lock:
+            _cache[team_id] = (now + CACHE_SECONDS, squad)
+    return squad
+
+
+def eligible_player_ids(team_id):
+    squad = get_team_eligibility(team_id) or {}
+    return {player_id for player_id, row in squad.items() if row['eligible']}
+
+
+def invalidate_team(team_id):
+    with _lock:
+        _cache.pop(team_id, None)
+
+
+def invalidate_from_event(event):
+    """Live bus subscriber: cards and results written by another worker change eligibility."""
+    payload = event.get('payload') or {}
+    for team_id in (payload.get('home_team_id'), payload.get('away_team_id')):
+        if team_id is not None:
+            invalidate_team(team_id)
@@ -0,0 +1,188 @@
+"""Cross-process bus for live match events.
+
+Events are written to the live_event outbox table in the same transaction as
+the match write that caused them, so the table id is a commit-ordered sequence
+number. It only ever increases but may skip values (a rolled-back publish still
+consumes a PostgreSQL sequence value), so readers rely on order, never on
+consecutive ids. Every process (each Gunicorn worker, the live gateway) runs one
+EventBus thread that reads new rows past the last sequence it delivered and
+hands each one, in order and exactly once, to its local subscribers.
+
+On PostgreSQL publishers NOTIFY the `live_events` channel and the bus thread
+LISTENs, so delivery is immediate; publishers also take a transaction-scoped
+advisory lock so ids commit in order. On SQLite, where writers are already
+serialized, the thread polls. A subscriber that fell behind resumes with
+events_since(seq).
+"""
+import json
+import logging
+import select as select_module
+import threading
+
+from sqlalchemy import select, delete, func, text
+
+from extensions import db
+from models import LiveEvent
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'live_events'
+PUBLISH_LOCK_KEY = 7_313_001
+POLL_INTERVAL = 0.5
+BATCH_SIZE = 500
+
+
+def _is_postgresql(bind):
+    return bind.dialect.name == 'postgresql'
+
+
+def publish(match_id, event_type, payload):
+    """Stage a live event in the current session; it is delivered once the transaction commits."""
+    bind = db.session.get_bind()
+    if _is_postgresql(bind):
+        db.session.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': PUBLISH_LOCK_KEY})
+    event = LiveEvent(match_id=match_id, event_type=event_type, payload=json.dumps(payload, default=str))
+    db.session.add(event)
+    db.session.flush()
+    if _is_postgresql(bind):
+        db.session.execute(text('SELECT pg_notify(:channel, :seq)'), {'channel': CHANNEL, 'seq': str(event.id)})
+    return event
+
+
+def events_since(seq, match_id=None, limit=BATCH_SIZE):
+    """Committed events after `seq`, oldest first, optionally for one match."""
+    query = LiveEvent.query.filter(LiveEvent.id > seq)
+    if match_id is not None:
+        query = query.filter(LiveEvent.match_id == match_id)
+    return query.order_by(LiveEvent.id).limit(limit).all()
+
+
+def prune_events(before):
+    """Delete delivered events older than `before`; resumes further back fall back to a full reload."""
+    result = db.session.execute(delete(LiveEvent).where(LiveEvent.created_at < before))
+    db.session.commit()
+    return result.rowcount
+
+
+_process_bus = None
+_process_bus_lock = threading.Lock()
+
+
+def process_bus(engine):
+    """The EventBus of the current process, created on first use (after any Gunicorn fork)."""
+    global _process_bus
+    with _process_bus_lock:
+        if _process_bus is None:
+            _process_bus = EventBus(engine)
+        return _process_bus
+
+
+class EventBus:
+    """Per-process reader of the live_event sequence, dispatching to local subscribers."""
+
+    def __init__(self, engine, poll_interval=POLL_INTERVAL):
+        self.engine = engine
+        self.poll_interval = poll_interval
+        self.last_seq = None
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback):
+        """Register callback(event_dict); starts the bus thread on first use."""
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+        self.start()
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def start(self, from_seq=None):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self.last_seq = self._current_seq() if from_seq is None else from_seq
+            self._thread = threading.Thread(target=self._run, name='live-event-bus', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _current_seq(self):
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.coalesce(func.max(LiveEvent.id), 0))).scalar()
+
+    def _fetch(self, conn):
+        table = LiveEvent.__table__
+        rows = conn.execute(
+            select(table).where(table.c.id > self.last_seq).order_by(table.c.id).limit(BATCH_SIZE)
+        ).mappings().all()
+        return [{
+            'seq': row['id'],
+            'match_id': row['match_id'],
+            'type': row['event_type'],
+            'payload': json.loads(row['payload']) if row['payload'] else None,
+        } for row in rows]
+
+    def _dispatch(self, events):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for event in events:
+            for callback in subscribers:
+                try:
+                    callback(event)
+                except Exception:
+                    logger.exception('Live event subscriber failed on seq %s', event['seq'])
+            self.last_seq = event['seq']
+
+    def drain(self, conn):
+        """Deliver every committed event past last_seq. Returns the number delivered."""
+        delivered = 0
+        while True:
+            events = self._fetch(conn)
+            if not events:
+                return delivered
+            self._dispatch(events)
+            delivered += len(events)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if _is_postgresql(self.engine):
+                    self._listen()
+                else:
+                    with self.engine.connect() as conn:
+                        while not self._stop.is_set():
+                            self.drain(conn)
+                            conn.rollback()
+                            self._stop.wait(self.poll_interval)
+            except Exception:
+                logger.exception('Live event bus connection lost, reconnecting')
+                self._stop.wait(1)
+
+    def _listen(self):
+        raw = self.engine.raw_connection()
+        try:
+            driver_connection = raw.driver_connection
+            driver_connection.autocommit = True
+            with driver_connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+            with self.engine.connect() as conn:
+                while not self._stop.is_set():
+                    # Drain after LISTEN so nothing committed in between is missed
+                    self.drain(conn)
+                    conn.rollback()
+                    ready, _, _ = select_module.select([driver_connection], [], [], self.poll_interval * 10)
+                    if ready:
+                        driver_connection.poll()
+                        driver_connection.notifies.clear()
+        finally:
+            raw.close()
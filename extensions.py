@@ -1,7 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 
+from sharding import ShardSession
+
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base) 
\ No newline at end of file
+db = SQLAlchemy(model_class=Base, session_options={'class_': ShardSession}) 
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""Team and venue clash detection for fixture scheduling.
+
+A ClashIndex holds two in-memory date indexes for a tournament: (team, day)
+and (venue, day), each mapping to the fixture already booked there. It is
+built from the stored matches with one query. Checking or booking a fixture
+is then a couple of dict lookups, so validating or repairing a complete
+fixture set is linear in its size, and conflicts are known before anything is
+written.
+
+repair() moves each clashing fixture to the next free day (at most
+MAX_SHIFT_DAYS later, and never past the tournament's last day when one is
+given) and reports what moved and what could not be placed.
+Booked days point to a later day to try, with path compression, so the
+search for a free day stays near-constant even on crowded calendars.
+"""
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select
+
+from extensions import db
+from models import Match
+
+MAX_SHIFT_DAYS = 30
+
+
+def _day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _venue_key(venue):
+    venue = (venue or '').strip().lower()
+    return venue or None
+
+
+class ClashIndex:
+    """Per-team and per-venue day indexes of booked fixtures."""
+
+    def __init__(self):
+        self.teams = {}
+        self.venues = {}
+        self._skip = {}  # (index, key, booked day) -> a later day to try next, path-compressed
+
+    @classmethod
+    def for_tournament(cls, tournament_id, exclude=()):
+        """Index the tournament's stored matches, except the match ids in `exclude`."""
+        index = cls()
+        rows = db.session.execute(
+            select(Match.id, Match.home_team_id, Match.away_team_id, Match.match_date, Match.venue)
+            .where(Match.tournament_id == tournament_id))
+        for match_id, home, away, when, venue in rows:
+            if match_id not in exclude:
+                index.add({'id': match_id, 'home_team_id': home, 'away_team_id': away,
+                           'match_date': when, 'venue': venue})
+        return index
+
+    def conflicts(self, fixture, when=None):
+        """Clashes of `fixture` if played on `when` (default: its own date)."""
+        day = _day(when or fixture['match_date'])
+        found = []
+        for team_id in (fixture['home_team_id'], fixture['away_team_id']):
+            other = self.teams.get((team_id, day))
+            if other is not None:
+                found.append({'type': 'team', 'team_id': team_id, 'date': day.isoformat(), 'with': other.get('id')})
+        venue = _venue_key(fixture.get('venue'))
+        other = self.venues.get((venue, day)) if venue else None
+        if other is not None:
+            found.append({'type': 'venue', 'venue': fixture['venue'], 'date': day.isoformat(), 'with': other.get('id')})
+        return found
+
+    def _keys(self, fixture):
+        keys = [(self.teams, fixture['home_team_id']), (self.teams, fixture['away_team_id'])]
+        venue = _venue_key(fixture.get('venue'))
+        if venue:
+            keys.append((self.venues, venue))
+        return keys
+
+    def _next_free(self, booked, key, day):
+        path = []
+        while (key, day) in booked:
+            path.append(day)
+            day = self._skip.get((id(booked), key, day), day + timedelta(days=1))
+        for busy in path:
+            self._skip[id(booked), key, busy] = day
+        return day
+
+    def first_free_day(self, fixture, day):
+        """Earliest day from `day` on when both teams and the venue are free."""
+        keys = self._keys(fixture)
+        while True:
+            candidate = day
+            for booked, key in keys:
+                candidate = self._next_free(booked, key, candidate)
+            if candidate == day:
+                return day
+            day = candidate
+
+    def add(self, fixture):
+        day = _day(fixture['match_date'])
+        self.teams[fixture['home_team_id'], day] = fixture
+        self.teams[fixture['away_team_id'], day] = fixture
+        venue = _venue_key(fixture.get('venue'))
+        if venue:
+            self.venues[venue, day] = fixture
+
+
+def validate(fixtures, index=None):
+    """Conflicts within `fixtures` and against the index, as [{'fixture': i, ...}]; books them."""
+    index = index or ClashIndex()
+    report = []
+    for position, fixture in enumerate(fixtures):
+        for conflict in index.conflicts(fixture):
+            report.append({'fixture': position, **conflict})
+        index.add(fixture)
+    return report
+
+
+def repair(fixtures, index=None, max_shift_days=MAX_SHIFT_DAYS, last_day=None):
+    """Shift clashing fixtures to the next free day, in place; return (moved, unplaced).
+
+    A fixture whose free day is more than `max_shift_days` away, or after
+    `last_day`, is left where it is and reported as unplaced.
+    """
+    index = index or ClashIndex()
+    last_day = _day(last_day) if last_day else None
+    moved, unplaced = [], []
+    for position, fixture in enumerate(fixtures):
+        original = fixture['match_date']
+        free = index.first_free_day(fixture, _day(original))
+        shift = free - _day(original)
+        if shift > timedelta(days=max_shift_days) or (shift and last_day and free > last_day):
+            unplaced.append({'fixture': position, 'conflicts': index.conflicts(fixture)})
+        elif shift:
+            fixture['match_date'] = original + shift
+            moved.append({'fixture': position, 'from': original.isoformat(), 'to': fixture['match_date'].isoformat()})
+        index.add(fixture)
+    return moved, unplaced
+
+
+def parse_fixture(data):
+    """Fixture dict from JSON input; raises ValueError on missing or malformed fields."""
+    try:
+        when = data['match_date']
+        when = datetime.fromisoformat(when) if 'T' in when or ' ' in when else date.fromisoformat(when)
+        return {'id': data.get('id'), 'home_team_id': int(data['home_team_id']),
+                'away_team_id': int(data['away_team_id']), 'match_date': when, 'venue': data.get('venue')}
+    except (KeyError, TypeError) as e:
+        raise ValueError(f'Invalid fixture: {data}') from e
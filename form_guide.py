@@ -0,0 +1,134 @@
+"""Form guide and head-to-head analytics per tournament.
+
+One query turns every completed match of a tournament into two team-perspective
+rows and numbers each team's rows latest-first with ROW_NUMBER() OVER
+(PARTITION BY team). A single linear pass over that result then yields, for
+every team, the last-5 form string (latest first), the current streak,
+home/away splits and head-to-head records against each opponent. On SQLite
+builds without window functions the numbering is done during the same pass.
+
+Results are cached per tournament and reused until the tournament's matches
+change (max updated_at and count, the same validator the HTTP cache uses).
+"""
+import sqlite3
+import threading
+from collections import defaultdict
+
+from sqlalchemy import select, union_all, literal, case, func
+
+from extensions import db
+from http_cache import fingerprint, table_version
+from models import Match
+
+FORM_LENGTH = 5
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def _perspective_rows(tournament_id):
+    base = [Match.tournament_id == tournament_id, Match.status == 'completed']
+    home = select(
+        Match.home_team_id.label('team_id'), Match.away_team_id.label('opponent_id'),
+        Match.id.label('match_id'), Match.match_date.label('match_date'), literal('home').label('venue'),
+        Match.home_score.label('goals_for'), Match.away_score.label('goals_against'),
+    ).where(*base)
+    away = select(
+        Match.away_team_id, Match.home_team_id, Match.id, Match.match_date, literal('away'),
+        Match.away_score, Match.home_score,
+    ).where(*base)
+    return union_all(home, away).subquery('perspective')
+
+
+def _supports_window_functions():
+    bind = db.session.get_bind()
+    return bind.dialect.name != 'sqlite' or sqlite3.sqlite_version_info >= (3, 25)
+
+
+def _fetch(tournament_id):
+    rows = _perspective_rows(tournament_id)
+    result = case((rows.c.goals_for > rows.c.goals_against, 'W'),
+                  (rows.c.goals_for == rows.c.goals_against, 'D'), else_='L')
+    columns = [rows.c.team_id, rows.c.opponent_id, rows.c.venue,
+               rows.c.goals_for, rows.c.goals_against, result.label('result')]
+    if _supports_window_functions():
+        position = func.row_number().over(
+            partition_by=rows.c.team_id, order_by=(rows.c.match_date.desc(), rows.c.match_id.desc()))
+        stmt = select(*columns, position.label('position')).order_by(rows.c.team_id, 'position')
+        return db.session.execute(stmt).all()
+    stmt = select(*columns).order_by(rows.c.team_id, rows.c.match_date.desc(), rows.c.match_id.desc())
+    numbered, current, position = [], None, 0
+    for row in db.session.execute(stmt):
+        position = position + 1 if row.team_id == current else 1
+        current = row.team_id
+        numbered.append((*row, position))
+    return numbered
+
+
+def _empty_split():
+    return {'played': 0, 'won': 0, 'drawn': 0, 'lost': 0, 'goals_for': 0, 'goals_against': 0}
+
+
+def _add(split, result, goals_for, goals_against):
+    split['played'] += 1
+    split[{'W': 'won', 'D': 'drawn', 'L': 'lost'}[result]] += 1
+    split['goals_for'] += goals_for
+    split['goals_against'] += goals_against
+
+
+def compute_tournament_form(tournament_id):
+    """{team_id: {'form', 'streak', 'home', 'away', 'head_to_head'}} for every team with a result.
+
+    head_to_head is keyed by the opponent's id as a string, so it serializes to JSON as is.
+    """
+    teams = {}
+    for team_id, opponent_id, venue, goals_for, goals_against, result, position in _fetch(tournament_id):
+        team = teams.get(team_id)
+        if team is None:
+            team = teams[team_id] = {
+                'form': '', 'streak': {'type': result, 'length': 0}, 'streak_open': True,
+                'home': _empty_split(), 'away': _empty_split(),
+                'head_to_head': defaultdict(_empty_split),
+            }
+        if position <= FORM_LENGTH:
+            team['form'] += result
+        if team['streak_open']:
+            if result == team['streak']['type']:
+                team['streak']['length'] += 1
+            else:
+                team['streak_open'] = False
+        _add(team[venue], result, goals_for, goals_against)
+        _add(team['head_to_head'][str(opponent_id)], result, goals_for, goals_against)
+
+    for team in teams.values():
+        del team['streak_open']
+        team['head_to_head'] = dict(team['head_to_head'])
+    return teams
+
+
+def tournament_form(tournament_id):
+    """Cached compute_tournament_form(), recomputed only when the tournament's matches changed."""
+    version, _ = fingerprint(table_version(Match, Match.tournament_id == tournament_id))
+    with _lock:
+        cached = _cache.get(tournament_id)
+    if cached and cached[0] == version:
+        return cached[1]
+    teams = compute_tournament_form(tournament_id)
+    with _lock:
+        _cache[tournament_id] = (version, teams)
+    return teams
+
+
+def team_form(team):
+    return tournament_form(team.tournament_id).get(team.id)
+
+
+def match_preview(match):
+    """Form of both sides and their head-to-head record before a match."""
+    teams = tournament_form(match.tournament_id)
+    home, away = teams.get(match.home_team_id), teams.get(match.away_team_id)
+    return {
+        'home': {key: home[key] for key in ('form', 'streak', 'home', 'away')} if home else None,
+        'away': {key: away[key] for key in ('form', 'streak', 'home', 'away')} if away else None,
+        'head_to_head': home['head_to_head'].get(str(match.away_team_id), _empty_split()) if home else _empty_split(),
+    }
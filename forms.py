@@ -1,9 +1,46 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, TextAreaField, DateField, IntegerField, SelectField, SubmitField, PasswordField
+from wtforms import Field, StringField, TextAreaField, DateField, IntegerField, SelectField, SubmitField, PasswordField
 from wtforms.validators import DataRequired, Length, NumberRange, Optional, Email, EqualTo, ValidationError
-from wtforms.widgets import TextArea
+from wtforms.widgets import TextArea, html_params
+from markupsafe import Markup
 from models import Tournament, Team, Coach, User
-from wtforms_sqlalchemy.fields import QuerySelectField
+from coach_lookup import get_available_coach, cached_search
+
+class CoachLookupInput:
+    """Text input for a coach username with a <datalist> of the first unassigned coaches.
+
+    Usable without JavaScript; a script may refill the list from data-lookup-url as the user types.
+    """
+
+    def __call__(self, field, **kwargs):
+        kwargs.setdefault('id', field.id)
+        list_id = f"{kwargs['id']}-options"
+        options = Markup('').join(
+            Markup('<option value="{}">{}</option>').format(coach['username'], coach['name'])
+            for coach in cached_search()['coaches'])
+        return Markup('<input {}><datalist id="{}">{}</datalist>').format(
+            Markup(html_params(name=field.name, type='text', value=field._value(), list=list_id,
+                               autocomplete='off', **kwargs)), list_id, options)
+
+class CoachLookupField(Field):
+    """Coach picked by username, from the lookup list or typed in.
+
+    Validation loads that one coach by its unique username instead of listing every coach.
+    """
+    widget = CoachLookupInput()
+
+    def _value(self):
+        return self.data.username if self.data else (getattr(self, 'raw_username', None) or '')
+
+    def process_formdata(self, valuelist):
+        self.data = None
+        self.raw_username = valuelist[0].strip() if valuelist else None
+
+    def pre_validate(self, form):
+        if getattr(self, 'raw_username', None):
+            self.data = get_available_coach(self.raw_username)
+            if self.data is None:
+                raise ValidationError('This coach does not exist or already has a team.')
 
 class TournamentForm(FlaskForm):
     name = StringField('Tournament Name', validators=[DataRequired(), Length(min=3, max=100)])
@@ -17,7 +54,7 @@ class TeamForm(FlaskForm):
     name = StringField('Team Name', validators=[DataRequired(), Length(min=2, max=80)])
     city = StringField('City', validators=[Optional(), Length(max=80)])
     founded_year = IntegerField('Founded Year', validators=[Optional(), NumberRange(min=1800, max=2025)])
-    coach = QuerySelectField('Coach', query_factory=lambda: Coach.query.all(), get_label='username', allow_blank=True, blank_text='-- Select a Coach --', validators=[Optional()])
+    coach = CoachLookupField('Coach', validators=[Optional()], render_kw={'data-lookup-url': '/api/coaches'})
     submit = SubmitField('Register Team')
 
 class PlayerForm(FlaskForm):
@@ -0,0 +1,133 @@
+"""Rendered template fragment cache.
+
+Row-level partials (a fixture row, a roster row, ...) are rendered once per
+(fragment, entity id, version) and reused until the entity changes. The version
+is normally the entity's updated_at, so a stale entry can never be served; the
+routes that write a Match, Team or Player also call the invalidate_* helpers so
+superseded entries are dropped right away instead of aging out of the LRU.
+Those helpers only reach the current process; the version is what keeps other
+workers correct. Match rows also show the team names, so their version is
+match_version(): the match's and both teams' updated_at. A rename also drops
+the team's match fragments in its own process when it commits.
+
+In a template:
+    {{ cache_fragment('match_row', match.id, match_version(match),
+                      'matches/_row.html', match=match) }}
+"""
+import threading
+from collections import OrderedDict
+
+from flask import render_template
+from markupsafe import Markup
+from sqlalchemy import event, inspect, select, or_
+from sqlalchemy.orm import Session, object_session
+
+from models import Team, Match
+
+MAX_FRAGMENTS = 20000
+
+
+class FragmentCache:
+    """Thread-safe LRU of rendered fragments, indexed by (name, entity id) for invalidation."""
+
+    def __init__(self, max_entries=MAX_FRAGMENTS):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name, entity_id, version):
+        with self._lock:
+            entry = self._entries.get((name, entity_id))
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end((name, entity_id))
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def set(self, name, entity_id, version, html):
+        with self._lock:
+            self._entries[(name, entity_id)] = (version, html)
+            self._entries.move_to_end((name, entity_id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, name, entity_id):
+        with self._lock:
+            self._entries.pop((name, entity_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+fragments = FragmentCache()
+
+
+def cache_fragment(name, entity_id, version, template, **context):
+    """Template global: return the cached fragment, rendering `template` on a miss."""
+    html = fragments.get(name, entity_id, version)
+    if html is None:
+        html = Markup(render_template(template, **context))
+        fragments.set(name, entity_id, version, html)
+    return html
+
+
+def match_version(match):
+    """Fragment version of a match row: it changes with the match and with either team."""
+    return match.updated_at, match.home_team.updated_at, match.away_team.updated_at
+
+
+def invalidate_match(match):
+    """Drop every fragment that displays this match (fixture lists, results, team pages)."""
+    fragments.invalidate('match_row', match.id)
+    fragments.invalidate('fixture_row', match.id)
+    invalidate_team(match.home_team_id)
+    invalidate_team(match.away_team_id)
+
+
+def invalidate_from_event(event):
+    """Live bus subscriber: drop fragments for a match written by another worker."""
+    payload = event.get('payload') or {}
+    fragments.invalidate('match_row', event['match_id'])
+    fragments.invalidate('fixture_row', event['match_id'])
+    for team_id in (payload.get('home_team_id'), payload.get('away_team_id')):
+        if team_id is not None:
+            invalidate_team(team_id)
+    for player_id in payload.get('player_ids') or ():
+        fragments.invalidate('player_row', player_id)
+
+
+def invalidate_team(team_id):
+    fragments.invalidate('team_row', team_id)
+    fragments.invalidate('team_summary', team_id)
+
+
+def invalidate_player(player):
+    fragments.invalidate('player_row', player.id)
+    invalidate_team(player.team_id)
+
+
+@event.listens_for(Team, 'after_update')
+def _on_team_update(mapper, connection, target):
+    session = object_session(target)
+    if session is None or not inspect(target).attrs.name.history.has_changes():
+        return
+    match_ids = connection.execute(select(Match.id).where(
+        or_(Match.home_team_id == target.id, Match.away_team_id == target.id))).scalars()
+    session.info.setdefault('renamed_team_matches', set()).update(match_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _drop_renamed(session):
+    # After the commit, so a concurrent render cannot cache the old name again
+    for match_id in session.info.pop('renamed_team_matches', ()):
+        fragments.invalidate('match_row', match_id)
+        fragments.invalidate('fixture_row', match_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_renamed(session):
+    session.info.pop('renamed_team_matches', None)
@@ -0,0 +1,165 @@
+"""Cached statements for the hottest read paths.
+
+Each query here is a lambda statement. SQLAlchemy builds the select() and
+its cache key once per call site and, on later calls, only pulls the new
+parameter values out of the closure before reusing the compiled SQL from the
+engine's bounded compiled cache (query_cache_size). Queries whose callers do
+not need ORM objects fetch plain Core rows:
+
+  * team_results() - a team's completed scores, for standings (Team.get_stats);
+  * recent_updates() - the latest events of a match as dicts, with team and
+    player names joined in instead of two lazy loads per event;
+  * player_stats() - a player's PlayerStats row (Player.get_stats);
+  * user_by_username() - the login lookup.
+
+Usage:
+    python hot_queries.py --iterations 2000   # per-call cost, query builder vs cached
+"""
+import argparse
+import time
+
+from sqlalchemy import select, lambda_stmt, or_
+
+from extensions import db
+from models import Team, Player, Match, MatchUpdate, MatchUpdateArchive, PlayerStats, User, update_dict
+
+RECENT_UPDATES = 10
+
+
+def _team_results_stmt(team_id):
+    return lambda_stmt(lambda: select(Match.home_team_id, Match.home_score, Match.away_score)
+                       .where(or_(Match.home_team_id == team_id, Match.away_team_id == team_id),
+                              Match.status == 'completed'))
+
+
+def _updates(model):
+    return (select(model.id, model.minute, model.update_type, Team.name, Player.name, model.description,
+                   model.timestamp)
+            .outerjoin(Team, Team.id == model.team_id)
+            .outerjoin(Player, Player.id == model.player_id)
+            .order_by(model.timestamp.desc(), model.id.desc()))
+
+
+def _recent_updates_stmt(match_id, limit):
+    return lambda_stmt(lambda: _updates(MatchUpdate).where(MatchUpdate.match_id == match_id).limit(limit))
+
+
+def _recent_archived_updates_stmt(match_id, limit):
+    return lambda_stmt(
+        lambda: _updates(MatchUpdateArchive).where(MatchUpdateArchive.match_id == match_id).limit(limit))
+
+
+def _player_stats_stmt(player_id):
+    return lambda_stmt(lambda: select(PlayerStats).where(PlayerStats.player_id == player_id).limit(1))
+
+
+def _user_stmt(username):
+    return lambda_stmt(lambda: select(User).where(User.username == username).limit(1))
+
+
+def team_results(team_id):
+    """(home_team_id, home_score, away_score) of the team's completed matches."""
+    return db.session.execute(_team_results_stmt(team_id)).all()
+
+
+def recent_updates(match_id, limit=RECENT_UPDATES):
+    """Latest-first events of a match as MatchUpdate.to_dict() dicts, live table or archive."""
+    rows = db.session.execute(_recent_updates_stmt(match_id, limit)).all()
+    if not rows:
+        # Archiving moves all of a match's events, so only finished matches get here
+        rows = db.session.execute(_recent_archived_updates_stmt(match_id, limit)).all()
+    return [update_dict(*row) for row in rows]
+
+
+def player_stats(player_id):
+    return db.session.scalars(_player_stats_stmt(player_id)).first()
+
+
+def user_by_username(username):
+    return db.session.scalars(_user_stmt(username)).first()
+
+
+def _per_call_us(fn, args, iterations):
+    started = time.perf_counter()
+    for i in range(iterations):
+        fn(args[i % len(args)])
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def benchmark(iterations=2000):
+    """Per-call cost of each hot query, as rebuilt through the ORM query builder vs cached.
+
+    'build' is the Python work before the compiled cache lookup (constructing the
+    statement and its cache key), which is what caching removes; 'call' is a full
+    execution including the database round trip.
+    """
+    samples = {
+        'team_results': db.session.scalars(select(Team.id).limit(50)).all(),
+        'recent_updates': db.session.scalars(select(MatchUpdate.match_id).distinct().limit(50)).all(),
+        'player_stats': db.session.scalars(select(PlayerStats.player_id).limit(50)).all(),
+        'user_by_username': db.session.scalars(select(User.username).limit(50)).all(),
+    }
+    if not all(samples.values()):
+        raise SystemExit('Database is empty: run synthetic_data.py first.')
+
+    def recent_updates_built(match_id):
+        return [update.to_dict() for update in MatchUpdate.query.filter_by(match_id=match_id)
+                .order_by(MatchUpdate.timestamp.desc(), MatchUpdate.id.desc()).limit(RECENT_UPDATES).all()]
+
+    cases = {  # name: (query as previously built, cached statement, previous call, cached call)
+        'team_results': (
+            lambda team_id: Match.query.filter(db.or_(Match.home_team_id == team_id, Match.away_team_id == team_id),
+                                               Match.status == 'completed'),
+            _team_results_stmt,
+            lambda team_id: Match.query.filter(db.or_(Match.home_team_id == team_id, Match.away_team_id == team_id),
+                                               Match.status == 'completed').all(),
+            team_results),
+        'recent_updates': (
+            lambda match_id: MatchUpdate.query.filter_by(match_id=match_id)
+            .order_by(MatchUpdate.timestamp.desc(), MatchUpdate.id.desc()).limit(RECENT_UPDATES),
+            lambda match_id: _recent_updates_stmt(match_id, RECENT_UPDATES),
+            recent_updates_built,
+            recent_updates),
+        'player_stats': (
+            lambda player_id: PlayerStats.query.filter_by(player_id=player_id).limit(1),
+            _player_stats_stmt,
+            lambda player_id: PlayerStats.query.filter_by(player_id=player_id).first(),
+            player_stats),
+        'user_by_username': (
+            lambda username: User.query.filter_by(username=username).limit(1),
+            _user_stmt,
+            lambda username: User.query.filter_by(username=username).first(),
+            user_by_username),
+    }
+    report = {}
+    for name, (query, stmt, built_call, cached_call) in cases.items():
+        args = samples[name]
+        build = {
+            'query_builder': lambda arg: query(arg).statement._generate_cache_key(),
+            'cached': lambda arg: stmt(arg)._generate_cache_key(),
+        }
+        call = {
+            'query_builder': lambda arg: (built_call(arg), db.session.expunge_all()),
+            'cached': lambda arg: (cached_call(arg), db.session.expunge_all()),
+        }
+        for fn in (*build.values(), *call.values()):
+            _per_call_us(fn, args, min(iterations, 100))  # Warm up the compiled cache
+        report[name] = {
+            'build_us': {variant: round(_per_call_us(fn, args, iterations), 1) for variant, fn in build.items()},
+            'call_us': {variant: round(_per_call_us(fn, args, iterations), 1) for variant, fn in call.items()},
+        }
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Micro-benchmark the cached hot queries.')
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    from app import app
+
+    with app.app_context():
+        for name, result in benchmark(args.iterations).items():
+            build, call = result['build_us'], result['call_us']
+            print(f"{name:18} build {build['query_builder']:>7} -> {build['cached']:>7} us   "
+                  f"call {call['query_builder']:>8} -> {call['cached']:>8} us")
@@ -0,0 +1,87 @@
+"""Conditional GET support for public read pages.
+
+Each cached view declares a validator: a function returning the scalar
+subqueries (max updated_at, row count, ...) that describe the rows the page is
+built from. They are evaluated in one cheap SELECT; the result becomes the
+ETag and Last-Modified of the page. A matching If-None-Match or
+If-Modified-Since gets a 304 before the view runs, and 200 responses carry
+shared-cache headers so a CDN or reverse proxy can serve match-day spikes.
+Authenticated requests, and requests with flash messages to show, are never
+shared-cached or answered with a 304.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import request, make_response, session
+from flask_login import current_user
+from sqlalchemy import select, func
+
+from extensions import db
+import sharding
+
+DEFAULT_MAX_AGE = 30
+DEFAULT_SHARED_MAX_AGE = 120
+
+
+def table_version(model, *criteria):
+    """Scalar subqueries (max updated_at, count) for the rows of model matching criteria."""
+    return (
+        select(func.max(model.updated_at)).where(*criteria).scalar_subquery(),
+        select(func.count()).select_from(model).where(*criteria).scalar_subquery(),
+    )
+
+
+def fingerprint(*versions):
+    """Evaluate table_version() tuples in one round trip (one per shard); return (etag, last_modified)."""
+    columns = [column for version in versions for column in version]
+    if sharding.enabled():
+        row = sharding.scalar_values(columns)
+    else:
+        row = db.session.execute(select(*columns)).one()
+    etag = hashlib.sha1(repr(tuple(row)).encode()).hexdigest()[:20]
+    stamps = [value for value in row if isinstance(value, datetime)]
+    last_modified = max(stamps).replace(tzinfo=timezone.utc, microsecond=0) if stamps else None
+    return etag, last_modified
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def conditional_get(validator, max_age=DEFAULT_MAX_AGE, shared_max_age=DEFAULT_SHARED_MAX_AGE):
+    """Decorate a GET view with ETag/Last-Modified validation and Cache-Control headers.
+
+    `validator` receives the view's keyword arguments and returns a list of
+    table_version() tuples.
+    """
+    def decorator(view):
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            if request.method != 'GET' or current_user.is_authenticated or session.get('_flashes'):
+                response = make_response(view(*args, **kwargs))
+                response.headers['Cache-Control'] = 'private, no-cache'
+                return response
+
+            etag, last_modified = fingerprint(*validator(**kwargs))
+            if _not_modified(etag, last_modified):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            if last_modified:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = (
+                f'public, max-age={max_age}, s-maxage={shared_max_age}, '
+                f'stale-while-revalidate={shared_max_age}'
+            )
+            response.vary.add('Cookie')
+            return response
+        return decorated_function
+    return decorator
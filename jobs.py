@@ -0,0 +1,273 @@
+"""Database-backed background jobs.
+
+Requests stage jobs with enqueue() in their own transaction, so a job exists
+exactly when the change that caused it was committed. A job with an
+idempotency key is only created once, unless it failed: enqueueing the key
+again requeues it. Workers are separate processes that claim queued jobs one
+at a time and run the registered task:
+
+  * claiming is an UPDATE ... WHERE status = 'queued' guarded by rowcount
+    (plus FOR UPDATE SKIP LOCKED on PostgreSQL), so concurrent workers never
+    run the same job;
+  * a failed attempt is retried after an exponential backoff until
+    max_attempts, then the job is marked failed with its traceback;
+  * a job whose worker died is requeued once its lease expires;
+  * every attempt records its queue wait and run time, aggregated in SQL by
+    job_metrics() over a recent window;
+  * idle workers delete jobs finished more than RETENTION ago.
+
+Tasks are plain functions registered with @task('name'); their modules are
+listed in TASK_MODULES and imported by the workers.
+
+Usage:
+    python jobs.py worker --processes 4
+    python jobs.py metrics
+    python jobs.py prune --days 7
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import socket
+import time
+import traceback
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import Job
+
+TASK_MODULES = ('post_match', 'search', 'snapshots')
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BACKOFF = 5  # Seconds, doubled after every failed attempt
+LEASE_SECONDS = 600  # A running job older than this is assumed orphaned
+POLL_INTERVAL = 1.0
+RETENTION = timedelta(days=7)  # Finished jobs are kept this long
+PRUNE_INTERVAL = 3600  # Seconds between prunes by one idle worker
+METRICS_WINDOW = timedelta(days=1)  # Default job_metrics() window
+
+TASKS = {}
+
+
+def task(name):
+    """Register a function as the job handler for `name`."""
+    def decorator(fn):
+        TASKS[name] = fn
+        return fn
+    return decorator
+
+
+def load_tasks():
+    for module in TASK_MODULES:
+        importlib.import_module(module)
+
+
+def enqueue(name, idempotency_key=None, max_attempts=DEFAULT_MAX_ATTEMPTS, delay=0, **kwargs):
+    """Stage a job in the current session; workers see it once the transaction commits.
+
+    With an idempotency key, the existing job is returned instead of a new one;
+    a failed one is queued again with the new arguments and fresh attempts.
+    """
+    if idempotency_key:
+        existing = Job.query.filter_by(idempotency_key=idempotency_key).first()
+        if existing and existing.status == 'failed':
+            existing.name, existing.args, existing.max_attempts = name, json.dumps(kwargs), max_attempts
+            existing.status, existing.attempts, existing.last_error = 'queued', 0, None
+            existing.enqueued_at = datetime.utcnow()
+            existing.run_after = existing.enqueued_at + timedelta(seconds=delay)
+            existing.started_at = existing.finished_at = existing.queue_ms = existing.duration_ms = None
+        if existing:
+            return existing
+    job = Job(name=name, args=json.dumps(kwargs), idempotency_key=idempotency_key,
+              max_attempts=max_attempts, run_after=datetime.utcnow() + timedelta(seconds=delay))
+    try:
+        with db.session.begin_nested():
+            db.session.add(job)
+    except IntegrityError:
+        # Another request committed the same key in between
+        return Job.query.filter_by(idempotency_key=idempotency_key).one()
+    return job
+
+
+def _is_postgresql():
+    return db.session.get_bind().dialect.name == 'postgresql'
+
+
+def claim(worker_id):
+    """Mark the next due job as running for this worker and return it, or None."""
+    now = datetime.utcnow()
+    stmt = (select(Job.id).where(Job.status == 'queued', Job.run_after <= now)
+            .order_by(Job.run_after, Job.id).limit(1))
+    if _is_postgresql():
+        stmt = stmt.with_for_update(skip_locked=True)
+    job_id = db.session.scalar(stmt)
+    if job_id is None:
+        db.session.rollback()
+        return None
+    result = db.session.execute(
+        update(Job).where(Job.id == job_id, Job.status == 'queued')
+        .values(status='running', locked_by=worker_id, locked_at=now, started_at=now,
+                attempts=Job.attempts + 1)
+    )
+    db.session.commit()
+    if result.rowcount != 1:
+        return None  # Claimed by another worker first
+    return db.session.get(Job, job_id)
+
+
+def run_job(job):
+    """Run a claimed job, then record its outcome and timings."""
+    job_id, attempts, max_attempts = job.id, job.attempts, job.max_attempts
+    waited_since = max(job.enqueued_at, job.run_after or job.enqueued_at)
+    values = {'queue_ms': int((job.started_at - waited_since).total_seconds() * 1000),
+              'locked_by': None, 'locked_at': None}
+    started = time.perf_counter()
+    try:
+        if job.name not in TASKS:
+            load_tasks()
+        TASKS[job.name](**json.loads(job.args or '{}'))
+        db.session.commit()
+        values.update(status='succeeded', last_error=None)
+    except Exception:
+        db.session.rollback()
+        values['last_error'] = traceback.format_exc(limit=5)
+        if attempts < max_attempts:
+            values.update(status='queued',
+                          run_after=datetime.utcnow() + timedelta(seconds=RETRY_BACKOFF * 2 ** (attempts - 1)))
+        else:
+            values['status'] = 'failed'
+    values.update(duration_ms=int((time.perf_counter() - started) * 1000), finished_at=datetime.utcnow())
+    db.session.execute(update(Job).where(Job.id == job_id).values(**values))
+    db.session.commit()
+    return values['status']
+
+
+def requeue_stale():
+    """Give back jobs whose worker died mid-run, or fail them when out of attempts."""
+    expired = datetime.utcnow() - timedelta(seconds=LEASE_SECONDS)
+    stale = [Job.status == 'running', Job.locked_at < expired]
+    db.session.execute(update(Job).where(*stale, Job.attempts >= Job.max_attempts)
+                       .values(status='failed', last_error='Lease expired', locked_by=None, locked_at=None))
+    result = db.session.execute(update(Job).where(*stale)
+                                .values(status='queued', locked_by=None, locked_at=None))
+    db.session.commit()
+    return result.rowcount
+
+
+def prune_finished(before):
+    """Delete succeeded and failed jobs finished before `before`."""
+    result = db.session.execute(
+        delete(Job).where(Job.status.in_(('succeeded', 'failed')), Job.finished_at < before))
+    db.session.commit()
+    return result.rowcount
+
+
+def work(worker_id, burst=False):
+    """Worker loop inside an app context; with burst=True, return once the queue is empty."""
+    load_tasks()
+    pruned_at = 0.0
+    while True:
+        job = claim(worker_id)
+        if job is None:
+            if burst:
+                return
+            requeue_stale()
+            if time.monotonic() - pruned_at > PRUNE_INTERVAL:
+                prune_finished(datetime.utcnow() - RETENTION)
+                pruned_at = time.monotonic()
+            time.sleep(POLL_INTERVAL)
+            continue
+        run_job(job)
+
+
+def _worker_process(index):
+    from app import app
+
+    with app.app_context():
+        work(f'{socket.gethostname()}:{os.getpid()}:{index}')
+
+
+def run_pool(processes):
+    """Start `processes` worker processes and wait for them."""
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_worker_process, args=(i,), daemon=True) for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+
+
+def _percentile(column, name, window, count, pct):
+    """Value at `pct` percent of a task's finished attempts, read with ORDER BY ... OFFSET."""
+    if not count:
+        return None
+    return db.session.scalar(
+        select(column).where(Job.name == name, Job.duration_ms.is_not(None), window)
+        .order_by(column).offset(min(count - 1, int(pct / 100 * count))).limit(1))
+
+
+def _round(value):
+    return round(float(value), 1) if value is not None else None
+
+
+def job_metrics(since=None):
+    """Per task: job counts by status and queue/run time statistics of finished attempts.
+
+    Covers the jobs enqueued since `since`, by default the last METRICS_WINDOW.
+    """
+    window = Job.enqueued_at >= (since or datetime.utcnow() - METRICS_WINDOW)
+    counts = defaultdict(dict)
+    for name, status, count in db.session.execute(
+            select(Job.name, Job.status, func.count()).where(window).group_by(Job.name, Job.status)):
+        counts[name][status] = count
+    wait = func.coalesce(Job.queue_ms, 0)
+    finished = {row[0]: row[1:] for row in db.session.execute(
+        select(Job.name, func.count(), func.avg(Job.duration_ms), func.max(Job.duration_ms), func.avg(wait))
+        .where(window, Job.duration_ms.is_not(None)).group_by(Job.name))}
+    metrics = {}
+    for name in sorted(counts):
+        runs, avg_run, max_run, avg_wait = finished.get(name, (0, None, None, None))
+        metrics[name] = {
+            'counts': counts[name],
+            'duration_ms': {'avg': _round(avg_run),
+                            'p50': _percentile(Job.duration_ms, name, window, runs, 50),
+                            'p95': _percentile(Job.duration_ms, name, window, runs, 95),
+                            'max': max_run},
+            'queue_ms': {'avg': _round(avg_wait), 'p95': _percentile(wait, name, window, runs, 95)},
+        }
+    return metrics
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Background job workers.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    worker_parser = sub.add_parser('worker')
+    worker_parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    worker_parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty (single process)')
+    metrics_parser = sub.add_parser('metrics')
+    metrics_parser.add_argument('--hours', type=float, default=METRICS_WINDOW.total_seconds() / 3600)
+    prune_parser = sub.add_parser('prune')
+    prune_parser.add_argument('--days', type=float, default=RETENTION.days)
+    args = parser.parse_args()
+
+    if args.command == 'worker' and not args.burst:
+        run_pool(args.processes)
+    else:
+        from app import app
+
+        with app.app_context():
+            db.create_all()
+            if args.command == 'worker':
+                work(f'{socket.gethostname()}:{os.getpid()}', burst=True)
+            elif args.command == 'prune':
+                print(f"Deleted {prune_finished(datetime.utcnow() - timedelta(days=args.days))} finished jobs")
+            else:
+                print(json.dumps(job_metrics(datetime.utcnow() - timedelta(hours=args.hours)), indent=2))
@@ -0,0 +1,331 @@
+"""Asyncio ASGI gateway for live match spectators.
+
+Serves Server-Sent Events on /api/matches/<id>/live/stream so long-lived
+spectator connections cost one coroutine and one queue each instead of a
+synchronous Flask worker. All spectators of a match share a single MatchFeed:
+one source reads the match state once and the pre-encoded event is fanned out
+to every subscriber queue. By default the feed is refreshed when the live event
+bus (event_bus.py) reports a write to that match, whichever Flask worker made
+it. Admin writes stay in the Flask app.
+
+Run it next to the Flask app, on the same database, under any ASGI server:
+    uvicorn live_gateway:app --port 8001
+    gunicorn -k uvicorn.workers.UvicornWorker live_gateway:app
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+
+from sqlalchemy import create_engine, select
+
+from event_bus import EventBus
+import sharding
+import sqlite_backend
+from models import Match, MatchUpdate, MatchStats, Team
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = float(os.environ.get('LIVE_POLL_INTERVAL', '1.0'))
+HEARTBEAT_INTERVAL = 15.0
+SUBSCRIBER_QUEUE_SIZE = 64
+RECENT_UPDATES = 10
+
+STREAM_PATH = re.compile(r'^/api/matches/(\d+)/live/stream$')
+
+
+def sse(event, data, event_id=None):
+    """Encode one Server-Sent Event."""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, ensure_ascii=False)}')
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+class MatchStateReader:
+    """Blocking reads of a match's live state, run off the event loop in a thread."""
+
+    def __init__(self, database_url, shard_urls=None):
+        self.engine = self._engine(database_url)
+        # Tournament shards (sharding.py), by shard number; shard 0 is the main database
+        self.shards = {0: self.engine}
+        for shard, url in sharding.parse_shards(
+                os.environ.get('SHARD_DATABASES') if shard_urls is None else shard_urls).items():
+            self.shards[shard] = self._engine(url)
+
+    @staticmethod
+    def _engine(database_url):
+        if sqlite_backend.is_sqlite_file(database_url):
+            return sqlite_backend.install(create_engine(
+                database_url, **sqlite_backend.engine_options(readonly=True)), readonly=True)
+        return create_engine(database_url, pool_pre_ping=True, pool_recycle=300)
+
+    def read(self, match_id, after_update_id=0):
+        match, stats, updates = Match.__table__, MatchStats.__table__, MatchUpdate.__table__
+        with self.shards.get(sharding.shard_of(match_id), self.engine).connect() as conn:
+            row = conn.execute(
+                select(match.c.home_score, match.c.away_score, match.c.status, match.c.updated_at)
+                .where(match.c.id == match_id)
+            ).mappings().first()
+            if row is None:
+                return None
+            stats_row = conn.execute(
+                select(stats).where(stats.c.match_id == match_id).order_by(stats.c.id.desc()).limit(1)
+            ).mappings().first()
+            query = select(updates, Team.__table__.c.name.label('team_name'))\
+                .outerjoin(Team.__table__, Team.__table__.c.id == updates.c.team_id)\
+                .where(updates.c.match_id == match_id, updates.c.id > after_update_id)\
+                .order_by(updates.c.id.desc()).limit(RECENT_UPDATES)
+            new_updates = [dict(u) for u in conn.execute(query).mappings()][::-1]
+        return {
+            'score': {
+                'home_score': row['home_score'],
+                'away_score': row['away_score'],
+                'status': row['status'],
+                'version': row['updated_at'].isoformat() if row['updated_at'] else None,
+            },
+            'stats': {key: value for key, value in stats_row.items()
+                      if key not in ('id', 'match_id', 'updated_at')} if stats_row else None,
+            'updates': [{
+                'id': u['id'],
+                'minute': u['minute'],
+                'type': u['update_type'],
+                'team': u['team_name'],
+                'description': u['description'],
+                'timestamp': u['timestamp'].isoformat() if u['timestamp'] else None,
+            } for u in new_updates],
+        }
+
+
+class MatchFeed:
+    """Shared live state of one match and the queues of its spectators."""
+
+    def __init__(self, match_id):
+        self.match_id = match_id
+        self.subscribers = set()
+        self.score = None
+        self.stats = None
+        self.recent = []
+        self.last_update_id = 0
+        self.task = None
+        self.ready = None
+
+    def snapshot(self):
+        return sse('snapshot', {'score': self.score, 'stats': self.stats, 'updates': self.recent},
+                   self.last_update_id or None)
+
+    def publish(self, payload):
+        """Fan a pre-encoded event out; a spectator too slow to keep up is resynced from a snapshot."""
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self.snapshot())
+
+    def apply(self, state):
+        """Merge freshly read state and publish what changed."""
+        if state['score'] != self.score:
+            self.score = state['score']
+            self.publish(sse('score', self.score))
+        if state['stats'] != self.stats:
+            self.stats = state['stats']
+            self.publish(sse('stats', self.stats))
+        for update in state['updates']:
+            self.last_update_id = max(self.last_update_id, update['id'])
+            self.recent = (self.recent + [update])[-RECENT_UPDATES:]
+            self.publish(sse('update', update, update['id']))
+
+
+class PollingSource:
+    """Feeds MatchFeeds by reading the database once per interval per watched match."""
+
+    def __init__(self, reader, interval=POLL_INTERVAL):
+        self.reader = reader
+        self.interval = interval
+
+    async def run(self, feed):
+        while feed.subscribers:
+            try:
+                state = await asyncio.to_thread(self.reader.read, feed.match_id, feed.last_update_id)
+                if state is not None:
+                    feed.apply(state)
+            except Exception:
+                logger.exception('Live poll failed for match %s', feed.match_id)
+            await asyncio.sleep(self.interval)
+
+
+class BusSource:
+    """Feeds MatchFeeds from the live event bus: the match is re-read only when an event names it."""
+
+    def __init__(self, reader, bus):
+        self.reader = reader
+        self.bus = bus
+        self.loop = None
+        self.wakeups = {}
+
+    def on_event(self, event):
+        # Called on the bus thread
+        wakeup = self.wakeups.get(event['match_id'])
+        if wakeup is not None and self.loop is not None:
+            self.loop.call_soon_threadsafe(wakeup.set)
+
+    async def run(self, feed):
+        self.loop = asyncio.get_running_loop()
+        wakeup = self.wakeups[feed.match_id] = asyncio.Event()
+        try:
+            # The first subscription starts the bus, which reads the current sequence: not on the loop
+            await asyncio.to_thread(self.bus.subscribe, self.on_event)
+            # Catch up on anything committed between the initial read and this subscription
+            wakeup.set()
+            while feed.subscribers:
+                await wakeup.wait()
+                wakeup.clear()
+                try:
+                    state = await asyncio.to_thread(self.reader.read, feed.match_id, feed.last_update_id)
+                    if state is not None:
+                        feed.apply(state)
+                except Exception:
+                    logger.exception('Live read failed for match %s', feed.match_id)
+        finally:
+            self.wakeups.pop(feed.match_id, None)
+
+
+class LiveGateway:
+    """ASGI application serving SSE streams from shared per-match feeds."""
+
+    def __init__(self, source, reader):
+        self.source = source
+        self.reader = reader
+        self.feeds = {}
+
+    async def subscribe(self, match_id):
+        feed = self.feeds.get(match_id)
+        if feed is None:
+            # Register the feed before awaiting so concurrent spectators share the first read
+            feed = self.feeds[match_id] = MatchFeed(match_id)
+            feed.ready = asyncio.ensure_future(asyncio.to_thread(self.reader.read, match_id))
+        try:
+            state = await asyncio.shield(feed.ready)
+        except Exception:
+            # Drop the failed feed (unless already replaced) so the next spectator reads again
+            if self.feeds.get(match_id) is feed:
+                del self.feeds[match_id]
+            raise
+        if state is None:
+            if self.feeds.get(match_id) is feed:
+                del self.feeds[match_id]
+            return None, None
+        if feed.score is None:
+            feed.apply(state)
+        queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        feed.subscribers.add(queue)
+        if feed.task is None or feed.task.done():
+            feed.task = asyncio.create_task(self.source.run(feed))
+        return feed, queue
+
+    def unsubscribe(self, feed, queue):
+        feed.subscribers.discard(queue)
+        if not feed.subscribers:
+            if feed.task is not None:
+                feed.task.cancel()
+            self.feeds.pop(feed.match_id, None)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        path = scope['path']
+        stream = STREAM_PATH.match(path)
+        if stream and scope['method'] == 'GET':
+            await self.stream(int(stream.group(1)), scope, receive, send)
+        elif path == '/healthz':
+            body = json.dumps({
+                'feeds': len(self.feeds),
+                'spectators': sum(len(feed.subscribers) for feed in self.feeds.values()),
+            }).encode()
+            await self.respond(send, 200, body, b'application/json')
+        else:
+            await self.respond(send, 404, b'Not Found', b'text/plain')
+
+    async def respond(self, send, status, body, content_type):
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', content_type), (b'content-length', str(len(body)).encode())]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def stream(self, match_id, scope, receive, send):
+        try:
+            feed, queue = await self.subscribe(match_id)
+        except Exception:
+            logger.exception('Live read failed for match %s', match_id)
+            await self.respond(send, 503, b'Live state unavailable', b'text/plain')
+            return
+        if feed is None:
+            await self.respond(send, 404, b'Match not found', b'text/plain')
+            return
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        disconnected = asyncio.create_task(self.wait_disconnect(receive))
+        try:
+            await send({'type': 'http.response.body', 'body': feed.snapshot(), 'more_body': True})
+            while not disconnected.done():
+                getter = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({getter, disconnected}, timeout=HEARTBEAT_INTERVAL,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    payload = getter.result()
+                else:
+                    getter.cancel()
+                    if disconnected.done():
+                        break
+                    payload = b': keep-alive\n\n'
+                await send({'type': 'http.response.body', 'body': payload, 'more_body': True})
+        except OSError:
+            pass
+        finally:
+            disconnected.cancel()
+            self.unsubscribe(feed, queue)
+
+    async def wait_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for feed in list(self.feeds.values()):
+                    if feed.task is not None:
+                        feed.task.cancel()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def default_database_url():
+    """Same default as the Flask app, whose relative SQLite path lives in the instance folder."""
+    instance_db = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'football_tournament.db')
+    return os.environ.get('DATABASE_URL', f'sqlite:///{instance_db}')
+
+
+def create_gateway(database_url=None, source=None):
+    """Build the gateway; LIVE_SOURCE=poll selects database polling instead of the event bus."""
+    reader = MatchStateReader(database_url or default_database_url())
+    if (source or os.environ.get('LIVE_SOURCE', 'bus')) == 'poll':
+        return LiveGateway(PollingSource(reader), reader)
+    return LiveGateway(BusSource(reader, EventBus(reader.engine)), reader)
+
+
+app = create_gateway()
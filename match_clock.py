@@ -0,0 +1,118 @@
+"""Live match clock.
+
+The clock is never ticked or stored: the current minute is derived in O(1)
+from the transition timestamps kept on Match (kickoff, half time, second half
+kick-off, final whistle). Minutes follow the usual convention: the minute in
+progress is reported (the first one is minute 1), stoppage time stays on the
+last minute of the half and is reported separately as `added`, so 45+2 is
+minute 45 with added 2. A stopped half keeps the minute of its whistle. Event
+minutes stored on MatchUpdate are therefore always ordered correctly by
+(minute, id).
+"""
+from datetime import datetime
+
+HALF_LENGTH = 45
+
+NOT_STARTED = 'not_started'
+FIRST_HALF = 'first_half'
+HALF_TIME = 'half_time'
+SECOND_HALF = 'second_half'
+FULL_TIME = 'full_time'
+
+
+class ClockError(ValueError):
+    """Raised for a transition that does not follow the current period."""
+
+
+def current_period(match):
+    if match.ended_at or match.status == 'completed':  # Completed before the clock existed
+        return FULL_TIME
+    if match.second_half_started_at:
+        return SECOND_HALF
+    if match.half_time_at:
+        return HALF_TIME
+    if match.kickoff_at:
+        return FIRST_HALF
+    return NOT_STARTED
+
+
+def _half_minute(start, end, offset):
+    played = int((end - start).total_seconds() // 60) + 1  # The minute in progress
+    return offset + min(played, HALF_LENGTH), max(0, played - HALF_LENGTH)
+
+
+def match_minute(match, now=None):
+    """Return (minute, added) for the match at `now` (default: current UTC time)."""
+    now = now or datetime.utcnow()
+    if match.kickoff_at is None:
+        return 0, 0  # Not started, or ended without a kick-off
+    if match.second_half_started_at is None:
+        return _half_minute(match.kickoff_at, match.half_time_at or match.ended_at or now, 0)
+    return _half_minute(match.second_half_started_at, match.ended_at or now, HALF_LENGTH)
+
+
+def display_minute(minute, added):
+    return f"{minute}+{added}'" if added else f"{minute}'"
+
+
+def clock_state(match, now=None):
+    """Clock summary for the live API."""
+    period = current_period(match)
+    minute, added = match_minute(match, now)
+    announced = match.second_half_added_time if period in (SECOND_HALF, FULL_TIME) else match.first_half_added_time
+    return {
+        'period': period,
+        'minute': minute,
+        'added': added,
+        'display': display_minute(minute, added),
+        'announced_added_time': announced or 0,
+        'kickoff_at': match.kickoff_at.isoformat() if match.kickoff_at else None,
+        'second_half_started_at': match.second_half_started_at.isoformat() if match.second_half_started_at else None
+    }
+
+
+def _require(match, expected, action):
+    period = current_period(match)
+    if period not in expected:
+        raise ClockError(f'Cannot {action} during {period}')
+
+
+def require_live(match, action):
+    """Raise ClockError unless a half is being played."""
+    _require(match, (FIRST_HALF, SECOND_HALF), action)
+
+
+def kick_off(match, now=None):
+    _require(match, (NOT_STARTED,), 'kick off')
+    match.kickoff_at = now or datetime.utcnow()
+
+
+def start_half_time(match, now=None):
+    _require(match, (FIRST_HALF,), 'start half time')
+    match.half_time_at = now or datetime.utcnow()
+
+
+def start_second_half(match, now=None):
+    _require(match, (HALF_TIME,), 'start the second half')
+    match.second_half_started_at = now or datetime.utcnow()
+
+
+def announce_added_time(match, minutes):
+    period = current_period(match)
+    if period == FIRST_HALF:
+        match.first_half_added_time = minutes
+    elif period == SECOND_HALF:
+        match.second_half_added_time = minutes
+    else:
+        raise ClockError(f'Cannot announce added time during {period}')
+
+
+def final_whistle(match, now=None):
+    """Stop the clock. A match ended before the second half keeps its first half minute."""
+    period = current_period(match)
+    if period == FULL_TIME:
+        raise ClockError('Match already ended')
+    now = now or datetime.utcnow()
+    if period == FIRST_HALF:
+        match.half_time_at = now
+    match.ended_at = now
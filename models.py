@@ -1,6 +1,8 @@
 from extensions import db
 from datetime import datetime
+import json
 from sqlalchemy import func, Table, Column, Integer, ForeignKey
+from sqlalchemy.orm import declared_attr
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 
@@ -56,6 +58,7 @@ class Team(db.Model):
     founded_year = db.Column(db.Integer)
     tournament_id = db.Column(db.Integer, db.ForeignKey('tournament.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Add a foreign key for the coach
     coach_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True) # Coach can be optional initially
@@ -83,19 +86,15 @@ class Team(db.Model):
             'points': 0
         }
         
-        # Get all matches for this team
-        matches = Match.query.filter(
-            db.or_(Match.home_team_id == self.id, Match.away_team_id == self.id),
-            Match.status == 'completed'
-        ).all()
-        
-        for match in matches:
-            if match.home_team_id == self.id:
-                goals_for = match.home_score
-                goals_against = match.away_score
+        # Scores of all completed matches for this team
+        from hot_queries import team_results
+        for home_team_id, home_score, away_score in team_results(self.id):
+            if home_team_id == self.id:
+                goals_for = home_score
+                goals_against = away_score
             else:
-                goals_for = match.away_score
-                goals_against = match.home_score
+                goals_for = away_score
+                goals_against = home_score
             
             stats['played'] += 1
             stats['goals_for'] += goals_for
@@ -119,6 +118,7 @@ class Team(db.Model):
     
     def select_players_for_match(self, match_id, player_ids):
         """Sélectionne les joueurs pour un match spécifique"""
+        from eligibility import invalidate_team
         # Vérifier que tous les joueurs appartiennent à l'équipe
         players = Player.query.filter(
             Player.id.in_(player_ids),
@@ -151,6 +151,7 @@ class Team(db.Model):
                 performance.is_selected = True
         
         db.session.commit()
+        invalidate_team(self.id)
         return players
 
 class Coach(User):
@@ -192,6 +193,7 @@ class Tournament(db.Model):
     max_teams = db.Column(db.Integer, default=16)
     status = db.Column(db.String(50), default='registration')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     teams = db.relationship('Team', backref='tournament', lazy=True, cascade='all, delete-orphan')
@@ -201,6 +203,10 @@ class Tournament(db.Model):
         return f'<Tournament {self.name}>'
 
 class Player(db.Model):
+    __table_args__ = (
+        db.Index('ix_player_team_available', 'team_id', 'is_available'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), nullable=False)
     position = db.Column(db.String(20))  # goalkeeper, defender, midfielder, forward
@@ -209,6 +215,7 @@ class Player(db.Model):
     nationality = db.Column(db.String(50))
     team_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_available = db.Column(db.Boolean, default=True)  # Si le joueur est disponible pour jouer
 
     def __repr__(self):
@@ -216,7 +223,8 @@ class Player(db.Model):
     
     def get_stats(self):
         """Calculate player statistics"""
-        stats = PlayerStats.query.filter_by(player_id=self.id).first()
+        from hot_queries import player_stats
+        stats = player_stats(self.id)
         if not stats:
             stats = PlayerStats(player_id=self.id)
             db.session.add(stats)
@@ -225,8 +233,10 @@ class Player(db.Model):
 
     def toggle_availability(self):
         """Change la disponibilité du joueur"""
+        from eligibility import invalidate_team
         self.is_available = not self.is_available
         db.session.commit()
+        invalidate_team(self.team_id)
         return self.is_available
 
 class Match(db.Model):
@@ -241,6 +251,15 @@ class Match(db.Model):
     status = db.Column(db.String(50), default='scheduled')
     round_number = db.Column(db.Integer, default=1)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Match clock transitions, see match_clock.py
+    kickoff_at = db.Column(db.DateTime)
+    half_time_at = db.Column(db.DateTime)
+    second_half_started_at = db.Column(db.DateTime)
+    ended_at = db.Column(db.DateTime)
+    first_half_added_time = db.Column(db.Integer, default=0)  # Announced added minutes
+    second_half_added_time = db.Column(db.Integer, default=0)
 
     def __repr__(self):
         return f'<Match {self.home_team.name} vs {self.away_team.name} on {self.match_date}>'
@@ -251,7 +270,22 @@ class Match(db.Model):
             return f"{self.home_score} - {self.away_score}"
         return "vs"
 
-class MatchUpdate(db.Model):
+def update_dict(id, minute, update_type, team_name, player_name, description, timestamp):
+    """JSON shape of a match event, shared by to_dict() and the Core rows of hot_queries.py"""
+    return {
+        'id': id,
+        'minute': minute,
+        'type': update_type,
+        'team': team_name,
+        'player': player_name,
+        'description': description,
+        'timestamp': timestamp.isoformat(),
+        'text': description,
+        'time': timestamp.strftime('%H:%M')
+    }
+
+class MatchUpdateMixin:
+    """Columns shared by the live MatchUpdate table and its archive"""
     id = db.Column(db.Integer, primary_key=True)
     match_id = db.Column(db.Integer, db.ForeignKey('match.id'), nullable=False)
     minute = db.Column(db.Integer)  # Match minute
@@ -260,28 +294,163 @@ class MatchUpdate(db.Model):
     player_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=True)
     description = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @declared_attr
+    def team(cls):
+        return db.relationship('Team')
+
+    @declared_attr
+    def player(cls):
+        return db.relationship('Player')
+    
+    def to_dict(self):
+        return update_dict(self.id, self.minute, self.update_type, self.team.name if self.team else None,
+                           self.player.name if self.player else None, self.description, self.timestamp)
+
+class MatchUpdate(MatchUpdateMixin, db.Model):
+    __table_args__ = (
+        db.Index('ix_match_update_match_timestamp', 'match_id', 'timestamp'),
+        db.Index('ix_match_update_match_minute', 'match_id', 'minute', 'id'),
+    )
     
     # Relationships
     match = db.relationship('Match', backref='updates')
-    team = db.relationship('Team')
-    player = db.relationship('Player')
+
+class MatchUpdateArchive(MatchUpdateMixin, db.Model):
+    """Events of completed matches moved out of the live table by archive.py"""
+    __table_args__ = (
+        db.Index('ix_match_update_archive_match_timestamp', 'match_id', 'timestamp'),
+        db.Index('ix_match_update_archive_match_minute', 'match_id', 'minute', 'id'),
+    )
+    
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class MatchSummary(db.Model):
+    """Compact per-match digest of archived events"""
+    match_id = db.Column(db.Integer, db.ForeignKey('match.id'), primary_key=True)
+    tournament_id = db.Column(db.Integer, db.ForeignKey('tournament.id'), nullable=False, index=True)
+    event_count = db.Column(db.Integer, default=0)
+    home_goals = db.Column(db.Integer, default=0)
+    away_goals = db.Column(db.Integer, default=0)
+    yellow_cards = db.Column(db.Integer, default=0)
+    red_cards = db.Column(db.Integer, default=0)
+    first_event_at = db.Column(db.DateTime)
+    last_event_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationship
+    match = db.relationship('Match', backref=db.backref('summary', uselist=False))
+    
+    def to_dict(self):
+        return {
+            'event_count': self.event_count,
+            'home_goals': self.home_goals,
+            'away_goals': self.away_goals,
+            'yellow_cards': self.yellow_cards,
+            'red_cards': self.red_cards,
+            'first_event_at': self.first_event_at.isoformat() if self.first_event_at else None,
+            'last_event_at': self.last_event_at.isoformat() if self.last_event_at else None
+        }
+
+class LiveEvent(db.Model):
+    """Outbox of live match events; the id is the bus sequence number"""
+    __table_args__ = (
+        {'sqlite_autoincrement': True},  # Never reuse the ids of pruned events
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    match_id = db.Column(db.Integer, db.ForeignKey('match.id'), nullable=False, index=True)
+    event_type = db.Column(db.String(30), nullable=False)  # score, update, status, stats
+    payload = db.Column(db.Text)  # JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
+    def to_dict(self):
+        return {
+            'seq': self.id,
+            'match_id': self.match_id,
+            'type': self.event_type,
+            'payload': json.loads(self.payload) if self.payload else None,
+            'created_at': self.created_at.isoformat()
+        }
+
+class Job(db.Model):
+    """Background job queued for the worker pool, see jobs.py"""
+    __table_args__ = (
+        db.Index('ix_job_status_run_after', 'status', 'run_after'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False, index=True)
+    args = db.Column(db.Text)  # JSON keyword arguments
+    idempotency_key = db.Column(db.String(200), unique=True)
+    status = db.Column(db.String(20), default='queued')  # queued, running, succeeded, failed
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=3)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    enqueued_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    queue_ms = db.Column(db.Integer)  # Wait between enqueue (or retry) and start of the last attempt
+    duration_ms = db.Column(db.Integer)  # Run time of the last attempt
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
     def to_dict(self):
         return {
             'id': self.id,
-            'minute': self.minute,
-            'type': self.update_type,
-            'team': self.team.name if self.team else None,
-            'player': self.player.name if self.player else None,
-            'description': self.description,
-            'timestamp': self.timestamp.isoformat(),
-            'text': self.description,
-            'time': self.timestamp.strftime('%H:%M')
+            'name': self.name,
+            'args': json.loads(self.args) if self.args else {},
+            'idempotency_key': self.idempotency_key,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'enqueued_at': self.enqueued_at.isoformat() if self.enqueued_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'queue_ms': self.queue_ms,
+            'duration_ms': self.duration_ms
         }
 
-class MatchStats(db.Model):
+class TournamentProjection(db.Model):
+    """Snapshot of ratings and simulated final-table odds, see season_analytics.py"""
+    id = db.Column(db.Integer, primary_key=True)
+    tournament_id = db.Column(db.Integer, db.ForeignKey('tournament.id'), nullable=False, index=True)
+    simulations = db.Column(db.Integer, nullable=False)
+    completed_matches = db.Column(db.Integer, default=0)  # Results the snapshot was built from
+    remaining_matches = db.Column(db.Integer, default=0)
+    payload = db.Column(db.Text)  # JSON, one entry per team
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'tournament_id': self.tournament_id,
+            'simulations': self.simulations,
+            'completed_matches': self.completed_matches,
+            'remaining_matches': self.remaining_matches,
+            'teams': json.loads(self.payload) if self.payload else [],
+            'created_at': self.created_at.isoformat()
+        }
+
+class MatchStatsSnapshot(db.Model):
+    """Append-only series of a match's stats, one packed row per change, see stats_reducer.py"""
+    __table_args__ = (
+        db.Index('ix_match_stats_snapshot_match_id', 'match_id', 'id'),
+        {'sqlite_autoincrement': True},  # A rebuilt tail gets new ids, never the ones clients saw
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     match_id = db.Column(db.Integer, db.ForeignKey('match.id'), nullable=False)
+    minute = db.Column(db.Integer)
+    recorded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    values = db.Column(db.LargeBinary, nullable=False)  # Little-endian int32 per stats_reducer.SNAPSHOT_FIELDS
+
+class MatchStats(db.Model):
+    """Current stats of a match: the fold state, always equal to its latest snapshot"""
+    id = db.Column(db.Integer, primary_key=True)
+    match_id = db.Column(db.Integer, db.ForeignKey('match.id'), nullable=False, unique=True)
     home_possession = db.Column(db.Integer, default=50)
     away_possession = db.Column(db.Integer, default=50)
     home_shots = db.Column(db.Integer, default=0)
@@ -296,10 +465,15 @@ class MatchStats(db.Model):
     away_yellow_cards = db.Column(db.Integer, default=0)
     home_red_cards = db.Column(db.Integer, default=0)
     away_red_cards = db.Column(db.Integer, default=0)
+    # Possession accumulators folded by stats_reducer.py
+    home_possession_seconds = db.Column(db.Integer, default=0)
+    away_possession_seconds = db.Column(db.Integer, default=0)
+    possession_team = db.Column(db.String(4))  # home, away or None when the ball is dead
+    possession_since = db.Column(db.DateTime)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship
-    match = db.relationship('Match', backref='stats_detail', uselist=False)
+    match = db.relationship('Match', backref=db.backref('stats_detail', uselist=False), uselist=False)
     
     def to_dict(self):
         return {
@@ -0,0 +1,119 @@
+"""Player match ratings computed from PlayerMatchPerformance.
+
+Every performance of a matchday (the completed matches of a tournament on the
+same date) is loaded with one query into a feature matrix, one row per
+performance. Ratings are BASE_RATING plus the dot product of each row with
+the weights of the player's position, clipped to [MIN_RATING, 10]. They are
+written back with a single executemany UPDATE keyed on the primary key.
+Performances without minutes stay unrated (0.0).
+
+Rating runs as a post-match job (see post_match.py) and is idempotent, so
+every match of a matchday can queue it again as it ends.
+
+Usage:
+    python player_ratings.py 42       # rate the matchday of match 42
+"""
+import argparse
+
+import numpy as np
+from sqlalchemy import select, update, func, case
+
+from extensions import db
+from models import Player, Match, PlayerMatchPerformance
+
+BASE_RATING = 6.0
+MIN_RATING = 3.0
+MAX_RATING = 10.0
+PASS_BASELINE = 0.75  # Completion rate that neither adds nor removes anything
+
+FEATURES = ('goals', 'assists', 'shots_on_target', 'shots_off_target', 'pass_completion', 'tackles',
+            'interceptions', 'saves', 'yellow_cards', 'red_cards', 'minutes', 'clean_sheet', 'goals_conceded')
+
+# Per position weight of each feature, in FEATURES order
+WEIGHTS = {
+    #              goal  ast   sot   off   pass  tkl   int   save  yc    rc    min   cs    conc
+    'goalkeeper': (1.5, 1.0, 0.1, 0.0, 0.5, 0.2, 0.2, 0.25, -0.5, -2.0, 0.3, 0.8, -0.4),
+    'defender':   (1.2, 0.8, 0.2, -0.05, 1.0, 0.25, 0.25, 0.0, -0.5, -2.0, 0.3, 0.7, -0.25),
+    'midfielder': (1.0, 0.8, 0.25, -0.05, 2.0, 0.15, 0.15, 0.0, -0.5, -2.0, 0.3, 0.2, -0.1),
+    'forward':    (1.0, 0.7, 0.3, -0.1, 0.8, 0.1, 0.1, 0.0, -0.5, -2.0, 0.3, 0.0, 0.0),
+}
+POSITIONS = tuple(WEIGHTS)
+DEFAULT_POSITION = 'midfielder'
+WEIGHT_MATRIX = np.array([WEIGHTS[position] for position in POSITIONS])
+
+
+def matchday_match_ids(match):
+    """Completed matches of the match's tournament played on the same date."""
+    return db.session.scalars(
+        select(Match.id).where(
+            Match.tournament_id == match.tournament_id,
+            Match.status == 'completed',
+            func.date(Match.match_date) == func.date(match.match_date))
+    ).all()
+
+
+def _load(match_ids):
+    perf = PlayerMatchPerformance
+    conceded = case((Player.team_id == Match.home_team_id, Match.away_score), else_=Match.home_score)
+    return db.session.execute(
+        select(perf.id, Player.position, perf.goals, perf.assists, perf.shots, perf.shots_on_target,
+               perf.passes, perf.passes_completed, perf.tackles, perf.interceptions, perf.saves,
+               perf.yellow_cards, perf.red_cards, perf.minutes_played, conceded.label('conceded'))
+        .join(Player, Player.id == perf.player_id)
+        .join(Match, Match.id == perf.match_id)
+        .where(perf.match_id.in_(match_ids))
+    ).all()
+
+
+def compute_ratings(rows):
+    """Return (performance ids, ratings) for rows as loaded by _load()."""
+    if not rows:
+        return np.array([], dtype=np.int64), np.array([])
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    position_index = {position: i for i, position in enumerate(POSITIONS)}
+    positions = np.array([position_index.get((row[1] or '').lower(), position_index[DEFAULT_POSITION])
+                          for row in rows])
+    (goals, assists, shots, on_target, passes, completed, tackles, interceptions, saves,
+     yellows, reds, minutes, conceded) = np.array([row[2:] for row in rows], dtype=np.float64).T.clip(0)
+
+    pass_completion = np.divide(completed, passes, out=np.full_like(passes, PASS_BASELINE), where=passes > 0)
+    features = np.column_stack((
+        goals, assists, on_target, np.maximum(shots - on_target, 0), pass_completion - PASS_BASELINE,
+        tackles, interceptions, saves, yellows, reds, minutes / 90.0,
+        (conceded == 0) & (minutes >= 60), conceded,
+    ))
+    ratings = BASE_RATING + np.einsum('ij,ij->i', features, WEIGHT_MATRIX[positions])
+    ratings = np.round(np.clip(ratings, MIN_RATING, MAX_RATING), 1)
+    return ids, np.where(minutes > 0, ratings, 0.0)
+
+
+def rate_matches(match_ids):
+    """Rate every performance of the given matches with one bulk UPDATE; return the number rated."""
+    if not match_ids:
+        return 0
+    ids, ratings = compute_ratings(_load(match_ids))
+    if len(ids):
+        db.session.execute(
+            update(PlayerMatchPerformance),
+            [{'id': int(i), 'rating': float(r)} for i, r in zip(ids, ratings)]
+        )
+    db.session.commit()
+    return int((ratings > 0).sum())
+
+
+def rate_matchday(match_id):
+    match = db.session.get(Match, match_id)
+    if match is None:
+        return 0
+    return rate_matches(matchday_match_ids(match))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compute player ratings for the matchday of a match.')
+    parser.add_argument('match_id', type=int)
+    args = parser.parse_args()
+
+    from app import app
+
+    with app.app_context():
+        print(f"Rated {rate_matchday(args.match_id)} performances")
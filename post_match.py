@@ -0,0 +1,126 @@
+"""Post-match and post-import work, run by the job workers (see jobs.py).
+
+A completed match queues three independent jobs, which workers run in parallel:
+player stats aggregation, matchday player ratings and the tournament
+projection, then a delayed one publishing the tournament's static snapshot
+if it is finished. An imported tournament queues the same work for all of its
+matches at once, plus a search reindex. Idempotency keys include the final
+score, so a repeated final whistle reuses the pending jobs while a corrected
+score queues new ones.
+"""
+from sqlalchemy import select, update, insert, func, case
+
+from extensions import db
+from event_bus import publish
+from jobs import task, enqueue
+from models import Team, Player, Match, PlayerStats, PlayerMatchPerformance, TournamentProjection
+import player_ratings
+import season_analytics
+from snapshots import SNAPSHOT_DELAY, mark_stale
+
+STAT_COLUMNS = ('goals', 'assists', 'yellow_cards', 'red_cards', 'minutes_played', 'shots',
+                'shots_on_target', 'passes', 'tackles', 'interceptions', 'saves')
+
+
+def refresh_player_stats(player_ids):
+    """Recompute PlayerStats totals of the given players from all their performances."""
+    if not player_ids:
+        return 0
+    perf = PlayerMatchPerformance
+    totals = db.session.execute(
+        select(perf.player_id,
+               func.sum(case((perf.minutes_played > 0, 1), else_=0)).label('matches_played'),
+               func.sum(perf.passes_completed).label('passes_completed'),
+               *[func.coalesce(func.sum(getattr(perf, column)), 0).label(column) for column in STAT_COLUMNS])
+        .where(perf.player_id.in_(player_ids))
+        .group_by(perf.player_id)
+    ).mappings().all()
+    existing = dict(db.session.execute(
+        select(PlayerStats.player_id, PlayerStats.id).where(PlayerStats.player_id.in_(player_ids))).all())
+
+    updates, inserts = [], []
+    for total in totals:
+        row = {column: total[column] for column in STAT_COLUMNS}
+        row['matches_played'] = total['matches_played'] or 0
+        passes = total['passes']
+        row['pass_accuracy'] = round((total['passes_completed'] or 0) / passes * 100, 1) if passes else 0.0
+        if total['player_id'] in existing:
+            updates.append({'id': existing[total['player_id']], **row})
+        else:
+            inserts.append({'player_id': total['player_id'], **row})
+    if updates:
+        db.session.execute(update(PlayerStats), updates)
+    if inserts:
+        db.session.execute(insert(PlayerStats), inserts)
+    mark_stale(db.session(), 'player', player_ids)  # Bulk statements skip the mapper events
+    return len(totals)
+
+
+@task('match.player_stats')
+def match_player_stats(match_id):
+    match = db.session.get(Match, match_id)
+    player_ids = db.session.scalars(
+        select(PlayerMatchPerformance.player_id).where(PlayerMatchPerformance.match_id == match_id)).all()
+    refresh_player_stats(player_ids)
+    # Web processes drop their cached rows for these teams and players
+    publish(match_id, 'post_match', {
+        'home_team_id': match.home_team_id,
+        'away_team_id': match.away_team_id,
+        'player_ids': player_ids
+    })
+
+
+@task('match.ratings')
+def match_ratings(match_id):
+    player_ratings.rate_matchday(match_id)
+
+
+@task('tournament.player_stats')
+def tournament_player_stats(tournament_id):
+    refresh_player_stats(db.session.scalars(
+        select(Player.id).join(Team, Team.id == Player.team_id).where(Team.tournament_id == tournament_id)).all())
+
+
+@task('tournament.ratings')
+def tournament_ratings(tournament_id):
+    player_ratings.rate_matches(db.session.scalars(
+        select(Match.id).where(Match.tournament_id == tournament_id, Match.status == 'completed')).all())
+
+
+@task('tournament.projection')
+def tournament_projection(tournament_id, simulations=None, seed=None):
+    if simulations is None:  # Queued by a result, not requested explicitly
+        completed = db.session.scalar(
+            select(func.count()).select_from(Match)
+            .where(Match.tournament_id == tournament_id, Match.status == 'completed'))
+        latest = db.session.scalar(
+            select(TournamentProjection.completed_matches)
+            .where(TournamentProjection.tournament_id == tournament_id)
+            .order_by(TournamentProjection.created_at.desc(), TournamentProjection.id.desc()).limit(1))
+        if latest == completed:  # Several results landing together need only one run
+            return
+        simulations = season_analytics.SIMULATIONS
+    season_analytics.project_tournament(tournament_id, simulations, workers=1, seed=seed)
+
+
+def enqueue_post_match(match):
+    """Stage the follow-up jobs of a completed match in the current transaction."""
+    score = f'{match.home_score}-{match.away_score}'
+    return [
+        enqueue('match.player_stats', f'match.player_stats:{match.id}:{score}', match_id=match.id),
+        enqueue('match.ratings', f'match.ratings:{match.id}:{score}', match_id=match.id),
+        enqueue('tournament.projection', f'tournament.projection:{match.id}:{score}',
+                tournament_id=match.tournament_id),
+        # Publishes the static pages once this was the tournament's last match (snapshots.py)
+        enqueue('tournament.snapshot', f'tournament.snapshot:{match.id}:{score}', delay=SNAPSHOT_DELAY,
+                tournament_id=match.tournament_id),
+    ]
+
+
+def enqueue_post_import(tournament_id):
+    """Stage the rebuild jobs of a freshly imported tournament in the current transaction."""
+    return [enqueue(name, f'{name}:import:{tournament_id}', tournament_id=tournament_id)
+            for name in ('tournament.player_stats', 'tournament.ratings', 'tournament.projection',
+                         'search.reindex')] + [
+        enqueue('tournament.snapshot', f'tournament.snapshot:import:{tournament_id}', delay=SNAPSHOT_DELAY,
+                tournament_id=tournament_id)]
@@ -0,0 +1,223 @@
+"""Bulk creation of coach, referee and admin accounts from a CSV file.
+
+Columns (header required, only email and role are mandatory):
+    username, email, first_name, last_name, role, password, nationality
+
+A missing username is derived from the name (numbered when taken) and a
+missing password is generated and returned in the report, like seeds.py
+prints them. Rows are checked first: invalid rows and usernames or emails
+already taken, either in the database or earlier in the file, are reported
+and skipped while the rest go ahead. Password hashing is the slow part, so
+it is spread over a process pool and runs outside any transaction (on SQLite
+nobody waits on the write lock meanwhile). Accounts are inserted in batches
+with ORM bulk INSERTs, so each role fills the user table and its own subtable
+(referee) together. A batch that hits a concurrent duplicate is retried row
+by row, so only the clashing rows are lost.
+
+Usage:
+    python provisioning.py coaches.csv --workers 8 --passwords-out passwords.csv
+"""
+import argparse
+import csv
+import io
+import multiprocessing
+import os
+import re
+import secrets
+import string
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import select, insert, func
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+
+from extensions import db
+from models import User, Admin, Coach, Referee
+
+ROLES = {'coach': Coach, 'referee': Referee, 'admin': Admin}
+COLUMNS = ('username', 'email', 'first_name', 'last_name', 'role', 'password', 'nationality')
+BATCH_SIZE = 500
+LOOKUP_CHUNK = 500
+HASH_CHUNKSIZE = 32
+EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+def generate_password(length=16):
+    alphabet = string.ascii_letters + string.digits
+    return ''.join(secrets.choice(alphabet) for _ in range(length))
+
+
+def _username(row):
+    base = re.sub(r'[^a-z0-9]', '', f"{row['first_name'][:1]}{row['last_name']}".lower())
+    return base or row['email'].split('@')[0].lower()
+
+
+def parse_csv(stream):
+    """(line, row) pairs of a CSV text stream, plus [{'line', 'error'}] for unusable rows."""
+    reader = csv.DictReader(stream)
+    missing = {'email', 'role'} - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"Missing CSV columns: {', '.join(sorted(missing))}")
+    rows, invalid = [], []
+    for row in reader:
+        line = reader.line_num
+        row = {column: (row.get(column) or '').strip() for column in COLUMNS}
+        row['email'] = row['email'].lower()
+        row['role'] = row['role'].lower()
+        if row['role'] not in ROLES:
+            invalid.append({'line': line, 'error': f"Unknown role '{row['role']}'"})
+        elif not EMAIL.match(row['email']) or len(row['email']) > 120:
+            invalid.append({'line': line, 'error': f"Invalid email '{row['email']}'"})
+        elif row['password'] and len(row['password']) < 6:
+            invalid.append({'line': line, 'error': 'Password shorter than 6 characters'})
+        else:
+            row['derived'] = not row['username']
+            row['username'] = (row['username'] or _username(row))[:80]
+            rows.append((line, row))
+    return rows, invalid
+
+
+def _existing(expression, values):
+    values, found = list(values), set()
+    for start in range(0, len(values), LOOKUP_CHUNK):
+        found.update(db.session.scalars(
+            select(expression).where(expression.in_(values[start:start + LOOKUP_CHUNK]))))
+    return found
+
+
+def find_duplicates(rows):
+    """Split (line, row) pairs into new rows and duplicate reports."""
+    usernames = _existing(User.username, {row['username'] for _, row in rows})
+    emails = _existing(func.lower(User.email), {row['email'] for _, row in rows})
+    fresh, duplicates = [], []
+    for line, row in rows:
+        if row['derived'] and row['username'] in usernames:
+            # Two coaches named J. Smith: number the derived usernames instead of rejecting them
+            base, suffix = row['username'][:76], 2
+            while f'{base}{suffix}' in usernames:
+                suffix += 1
+            row['username'] = f'{base}{suffix}'
+        if row['username'] in usernames:
+            duplicates.append({'line': line, 'field': 'username', 'value': row['username']})
+        elif row['email'] in emails:
+            duplicates.append({'line': line, 'field': 'email', 'value': row['email']})
+        else:
+            usernames.add(row['username'])
+            emails.add(row['email'])
+            fresh.append((line, row))
+    return fresh, duplicates
+
+
+def hash_passwords(passwords, workers=None):
+    """generate_password_hash over a process pool; inline for small inputs or workers=1."""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(passwords) < HASH_CHUNKSIZE:
+        return [generate_password_hash(password) for password in passwords]
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return list(pool.map(generate_password_hash, passwords, chunksize=HASH_CHUNKSIZE))
+
+
+def _values(row):
+    values = {'username': row['username'], 'email': row['email'], 'role': row['role'],
+              'password_hash': row['password_hash'],
+              'first_name': row['first_name'] or None, 'last_name': row['last_name'] or None}
+    if row['role'] == 'referee':
+        values['nationality'] = row['nationality'] or None
+    return values
+
+
+def _insert(rows):
+    for role, model in ROLES.items():
+        values = [_values(row) for _, row in rows if row['role'] == role]
+        if values:
+            db.session.execute(insert(model), values)
+
+
+def insert_users(rows):
+    """Insert (line, row) pairs in batches; return (created count, rows lost to concurrent duplicates)."""
+    created, duplicates = 0, []
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start:start + BATCH_SIZE]
+        try:
+            with db.session.begin_nested():
+                _insert(batch)
+            created += len(batch)
+        except IntegrityError:
+            # Someone else created one of these accounts meanwhile: find which, keep the rest
+            for line, row in batch:
+                try:
+                    with db.session.begin_nested():
+                        _insert([(line, row)])
+                    created += 1
+                except IntegrityError:
+                    duplicates.append({'line': line, 'field': 'username or email', 'value': row['username']})
+    return created, duplicates
+
+
+def provision_users(stream, workers=None):
+    """Create the accounts of a CSV text stream; caller commits the inserts. Returns the report.
+
+    The transaction open before hashing (the duplicate lookups, the caller's own
+    queries) is committed first.
+    """
+    rows, invalid = parse_csv(stream)
+    rows, duplicates = find_duplicates(rows)
+    db.session.commit()  # Do not hold the write lock through the hashing
+    generated = []
+    for _, row in rows:
+        if not row['password']:
+            row['password'] = generate_password()
+            generated.append({'username': row['username'], 'email': row['email'], 'password': row['password']})
+    for (_, row), password_hash in zip(rows, hash_passwords([row['password'] for _, row in rows], workers)):
+        row['password_hash'] = password_hash
+    created, raced = insert_users(rows)
+    lost = {entry['value'] for entry in raced}
+    by_role = {}
+    for _, row in rows:
+        if row['username'] not in lost:
+            by_role[row['role']] = by_role.get(row['role'], 0) + 1
+    return {
+        'created': created,
+        'by_role': by_role,
+        'duplicates': duplicates + raced,
+        'invalid': invalid,
+        'generated_passwords': [entry for entry in generated if entry['username'] not in lost],
+    }
+
+
+def provision_file(path, workers=None):
+    with open(path, newline='', encoding='utf-8-sig') as fp:
+        return provision_users(fp, workers)
+
+
+def read_upload(data):
+    """Text stream over an uploaded CSV body, dropping a UTF-8 BOM."""
+    return io.StringIO(data.decode('utf-8-sig'), newline='')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create user accounts from a CSV file.')
+    parser.add_argument('path')
+    parser.add_argument('--workers', type=int, default=None, help='Password hashing processes (default: all CPUs)')
+    parser.add_argument('--passwords-out', help='Write generated passwords to this CSV instead of printing them')
+    args = parser.parse_args()
+
+    from app import app
+
+    with app.app_context():
+        report = provision_file(args.path, args.workers)
+        db.session.commit()
+    print(f"Created {report['created']} users {report['by_role']}")
+    for duplicate in report['duplicates']:
+        print(f" ! line {duplicate['line']}: {duplicate['field']} '{duplicate['value']}' already exists")
+    for entry in report['invalid']:
+        print(f" ! line {entry['line']}: {entry['error']}")
+    if args.passwords_out:
+        with open(args.passwords_out, 'w', newline='') as fp:
+            writer = csv.DictWriter(fp, fieldnames=('username', 'email', 'password'))
+            writer.writeheader()
+            writer.writerows(report['generated_passwords'])
+        print(f"Generated passwords written to {args.passwords_out}")
+    else:
+        for entry in report['generated_passwords']:
+            print(f" - {entry['username']}: {entry['password']}")
@@ -0,0 +1,183 @@
+"""Referee assignment for a matchday or a whole season.
+
+Existing assignments are loaded once into a per-referee interval index: a
+sorted list of the referee's match dates. A candidate date conflicts when the
+nearest booked date on either side is closer than the required gap (the match
+window, or the rest days when larger), which is a bisect, O(log n) per check,
+instead of a query per match.
+
+Fixtures are assigned in date order. Each gets the least-loaded referees who
+are free and who have not yet handled either team max_team_matches times in
+the tournament. Only the bookings (of every tournament) dated within the
+required gap of the fixtures are loaded. New assignments go into
+match_referees in one bulk insert.
+
+Usage:
+    python referee_scheduler.py 3                  # whole season of tournament 3
+    python referee_scheduler.py 3 --date 2025-09-14 --rest-days 2
+"""
+import argparse
+import bisect
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select, insert, func
+
+from extensions import db
+from models import Match, Referee, match_referees
+
+MATCH_WINDOW = timedelta(hours=3)  # Minimum gap between two matches of one referee
+DEFAULT_REST_DAYS = 1
+DEFAULT_MAX_TEAM_MATCHES = 3
+REFEREES_PER_MATCH = 1
+
+
+class RefereeCalendar:
+    """Per-referee sorted match dates with O(log n) conflict checks."""
+
+    def __init__(self, gap):
+        self.gap = gap
+        self._dates = defaultdict(list)
+
+    def add(self, referee_id, when):
+        bisect.insort(self._dates[referee_id], when)
+
+    def conflict(self, referee_id, when):
+        """The booked date closest to `when` if it is within the gap, else None."""
+        dates = self._dates.get(referee_id)
+        if not dates:
+            return None
+        position = bisect.bisect_left(dates, when)
+        for neighbour in dates[max(0, position - 1):position + 1]:
+            if abs(neighbour - when) < self.gap:
+                return neighbour
+        return None
+
+    def load(self, referee_id):
+        return len(self._dates.get(referee_id, ()))
+
+
+def _gap(rest_days):
+    return max(MATCH_WINDOW, timedelta(days=rest_days))
+
+
+def _referee_ids():
+    return db.session.scalars(select(Referee.id).order_by(Referee.id)).all()
+
+
+def _assignments(tournament_id=None, start=None, end=None):
+    """(referee id, match id, match date, tournament id, home team, away team) of booked matches,
+    optionally of one tournament and/or dated within [start, end]."""
+    stmt = (select(match_referees.c.referee_id, Match.id, Match.match_date, Match.tournament_id,
+                   Match.home_team_id, Match.away_team_id)
+            .join(Match, Match.id == match_referees.c.match_id))
+    if tournament_id is not None:
+        stmt = stmt.where(Match.tournament_id == tournament_id)
+    if start is not None:
+        stmt = stmt.where(Match.match_date >= start, Match.match_date <= end)
+    return db.session.execute(stmt.order_by(Match.match_date)).all()
+
+
+def _fixtures(tournament_id, day=None, per_match=REFEREES_PER_MATCH):
+    assigned = (select(func.count()).select_from(match_referees)
+                .where(match_referees.c.match_id == Match.id).scalar_subquery())
+    stmt = (select(Match.id, Match.match_date, Match.home_team_id, Match.away_team_id, assigned.label('assigned'))
+            .where(Match.tournament_id == tournament_id, Match.status == 'scheduled', assigned < per_match)
+            .order_by(Match.match_date, Match.id))
+    if day is not None:
+        start = datetime.combine(day, datetime.min.time())
+        stmt = stmt.where(Match.match_date >= start, Match.match_date < start + timedelta(days=1))
+    return db.session.execute(stmt).all()
+
+
+def assign_referees(tournament_id, day=None, rest_days=DEFAULT_REST_DAYS,
+                    max_team_matches=DEFAULT_MAX_TEAM_MATCHES, per_match=REFEREES_PER_MATCH):
+    """Assign referees to the tournament's unstaffed fixtures (one day, or all); caller commits."""
+    fixtures = _fixtures(tournament_id, day, per_match)
+    if not fixtures:
+        return {'assigned': 0, 'unstaffed_matches': []}
+    gap = _gap(rest_days)
+    calendar = RefereeCalendar(gap)
+    # Only bookings within a gap of the fixtures can clash with them, in any tournament
+    for referee_id, _, when, _, _, _ in _assignments(start=fixtures[0].match_date - gap,
+                                                     end=fixtures[-1].match_date + gap):
+        calendar.add(referee_id, when)
+    team_counts = defaultdict(int)  # (referee, team) -> matches in this tournament
+    booked = defaultdict(set)
+    for referee_id, match_id, _, _, home, away in _assignments(tournament_id):
+        booked[match_id].add(referee_id)
+        team_counts[referee_id, home] += 1
+        team_counts[referee_id, away] += 1
+
+    referee_ids = _referee_ids()
+    rows, unstaffed = [], []
+    for match_id, when, home, away, assigned in fixtures:
+        candidates = sorted(
+            (referee_id for referee_id in referee_ids
+             if referee_id not in booked[match_id]
+             and team_counts[referee_id, home] < max_team_matches
+             and team_counts[referee_id, away] < max_team_matches
+             and calendar.conflict(referee_id, when) is None),
+            key=lambda referee_id: (calendar.load(referee_id), referee_id))
+        chosen = candidates[:per_match - assigned]
+        for referee_id in chosen:
+            calendar.add(referee_id, when)
+            booked[match_id].add(referee_id)
+            team_counts[referee_id, home] += 1
+            team_counts[referee_id, away] += 1
+            rows.append({'match_id': match_id, 'referee_id': referee_id})
+        if assigned + len(chosen) < per_match:
+            unstaffed.append(match_id)
+
+    if rows:
+        db.session.execute(insert(match_referees), rows)
+    return {'assigned': len(rows), 'unstaffed_matches': unstaffed}
+
+
+def find_conflicts(tournament_id=None, rest_days=DEFAULT_REST_DAYS):
+    """Existing double bookings: pairs of matches of one referee closer than the required gap.
+
+    With a tournament, the pairs involving one of its matches, the other match
+    possibly in another tournament.
+    """
+    gap = _gap(rest_days)
+    calendar = RefereeCalendar(gap)
+    window = {}
+    if tournament_id is not None:
+        own = _assignments(tournament_id)
+        if not own:
+            return []
+        window = {'start': own[0].match_date - gap, 'end': own[-1].match_date + gap}
+    match_at = {}
+    conflicts = []
+    for referee_id, match_id, when, match_tournament, _, _ in _assignments(**window):
+        clash = calendar.conflict(referee_id, when)
+        if clash is not None:
+            other, other_tournament = match_at[referee_id, clash]
+            if tournament_id is None or tournament_id in (match_tournament, other_tournament):
+                conflicts.append({'referee_id': referee_id, 'match_id': match_id,
+                                  'conflicts_with': other, 'match_date': when.isoformat()})
+        calendar.add(referee_id, when)
+        match_at[referee_id, when] = match_id, match_tournament
+    return conflicts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Assign referees to scheduled fixtures.')
+    parser.add_argument('tournament_id', type=int)
+    parser.add_argument('--date', type=date.fromisoformat, default=None, help='Only this matchday')
+    parser.add_argument('--rest-days', type=int, default=DEFAULT_REST_DAYS)
+    parser.add_argument('--max-team-matches', type=int, default=DEFAULT_MAX_TEAM_MATCHES)
+    parser.add_argument('--per-match', type=int, default=REFEREES_PER_MATCH)
+    args = parser.parse_args()
+
+    from app import app
+
+    with app.app_context():
+        report = assign_referees(args.tournament_id, args.date, args.rest_days,
+                                 args.max_team_matches, args.per_match)
+        db.session.commit()
+        print(f"Assigned {report['assigned']} referees, {len(report['unstaffed_matches'])} matches left unstaffed")
+        for conflict in find_conflicts(args.tournament_id, args.rest_days):
+            print(f" ! referee {conflict['referee_id']}: match {conflict['match_id']} "
+                  f"clashes with match {conflict['conflicts_with']}")
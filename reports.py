@@ -0,0 +1,171 @@
+"""Streaming statistics reports.
+
+Report rows are built entirely in SQL (aggregates and derived ratios such as
+pass_accuracy and goals_per_match) and read through a server-side cursor, then
+encoded chunk by chunk as CSV or JSON. Memory stays flat whatever the size of
+the report.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select, func, case, cast, Float
+
+from extensions import db
+from models import Team, Player, Match, PlayerMatchPerformance
+
+CHUNK_ROWS = 500
+
+
+def _ratio(numerator, denominator, scale=1, digits=2):
+    """SQL expression for round(numerator * scale / denominator, digits), 0 when the denominator is 0."""
+    return func.round(
+        case((denominator > 0, cast(numerator, Float) * scale / denominator), else_=0.0),
+        digits,
+    )
+
+
+def _apply_filters(stmt, tournament_id=None, team_id=None, date_from=None, date_to=None):
+    if tournament_id is not None:
+        stmt = stmt.where(Match.tournament_id == tournament_id)
+    if team_id is not None:
+        stmt = stmt.where(Player.team_id == team_id)
+    if date_from is not None:
+        stmt = stmt.where(Match.match_date >= datetime.combine(date_from, datetime.min.time()))
+    if date_to is not None:
+        stmt = stmt.where(Match.match_date < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    return stmt
+
+
+def player_season_report(**filters):
+    """One row per player, aggregated from their match performances."""
+    perf = PlayerMatchPerformance
+    matches_played = func.coalesce(func.sum(case((perf.minutes_played > 0, 1), else_=0)), 0)  # Not unused substitutes
+    goals = func.coalesce(func.sum(perf.goals), 0)
+    assists = func.coalesce(func.sum(perf.assists), 0)
+    shots = func.coalesce(func.sum(perf.shots), 0)
+    shots_on_target = func.coalesce(func.sum(perf.shots_on_target), 0)
+    passes = func.coalesce(func.sum(perf.passes), 0)
+    passes_completed = func.coalesce(func.sum(perf.passes_completed), 0)
+    stmt = select(
+        Player.id.label('player_id'),
+        Player.name.label('player_name'),
+        Player.position,
+        Team.name.label('team_name'),
+        matches_played.label('matches_played'),
+        func.coalesce(func.sum(perf.minutes_played), 0).label('minutes_played'),
+        goals.label('goals'),
+        assists.label('assists'),
+        func.coalesce(func.sum(perf.yellow_cards), 0).label('yellow_cards'),
+        func.coalesce(func.sum(perf.red_cards), 0).label('red_cards'),
+        shots.label('shots'),
+        shots_on_target.label('shots_on_target'),
+        _ratio(shots_on_target, shots, 100, 1).label('shooting_accuracy'),
+        passes.label('passes'),
+        passes_completed.label('passes_completed'),
+        _ratio(passes_completed, passes, 100, 1).label('pass_accuracy'),
+        func.coalesce(func.sum(perf.tackles), 0).label('tackles'),
+        func.coalesce(func.sum(perf.interceptions), 0).label('interceptions'),
+        func.coalesce(func.sum(perf.saves), 0).label('saves'),
+        _ratio(goals, matches_played).label('goals_per_match'),
+        _ratio(assists, matches_played).label('assists_per_match'),
+        func.round(func.avg(perf.rating), 2).label('average_rating'),
+    ).select_from(perf)\
+     .join(Player, Player.id == perf.player_id)\
+     .join(Team, Team.id == Player.team_id)\
+     .join(Match, Match.id == perf.match_id)\
+     .where(Match.status == 'completed')
+    stmt = _apply_filters(stmt, **filters)
+    return stmt.group_by(Player.id, Player.name, Player.position, Team.name)\
+               .order_by(Team.name, Player.name)
+
+
+def match_performance_report(**filters):
+    """One row per player per match."""
+    perf = PlayerMatchPerformance
+    home, away = Team.__table__.alias('home'), Team.__table__.alias('away')
+    stmt = select(
+        Match.id.label('match_id'),
+        Match.match_date,
+        home.c.name.label('home_team'),
+        away.c.name.label('away_team'),
+        Match.home_score,
+        Match.away_score,
+        Player.id.label('player_id'),
+        Player.name.label('player_name'),
+        Team.name.label('team_name'),
+        perf.minutes_played,
+        perf.goals,
+        perf.assists,
+        perf.yellow_cards,
+        perf.red_cards,
+        perf.shots,
+        perf.shots_on_target,
+        perf.passes,
+        perf.passes_completed,
+        _ratio(perf.passes_completed, perf.passes, 100, 1).label('pass_accuracy'),
+        perf.tackles,
+        perf.interceptions,
+        perf.saves,
+        perf.rating,
+    ).select_from(perf)\
+     .join(Player, Player.id == perf.player_id)\
+     .join(Team, Team.id == Player.team_id)\
+     .join(Match, Match.id == perf.match_id)\
+     .join(home, home.c.id == Match.home_team_id)\
+     .join(away, away.c.id == Match.away_team_id)\
+     .where(Match.status == 'completed')
+    stmt = _apply_filters(stmt, **filters)
+    return stmt.order_by(Match.match_date, Match.id, Team.name, Player.name)
+
+
+REPORTS = {
+    'players': player_season_report,
+    'performances': match_performance_report,
+}
+
+
+def _encode(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def iter_rows(stmt, chunk_rows=CHUNK_ROWS):
+    """Yield (column names, list of row tuples) chunks from a server-side cursor."""
+    result = db.session.execute(stmt.execution_options(stream_results=True, yield_per=chunk_rows))
+    keys = list(result.keys())
+    for partition in result.partitions():
+        yield keys, partition
+
+
+def stream_csv(stmt):
+    """Generate CSV text chunks for a report statement, header first."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header_written = False
+    for keys, rows in iter_rows(stmt):
+        if not header_written:
+            writer.writerow(keys)
+            header_written = True
+        writer.writerows([_encode(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if not header_written:
+        yield ','.join(stmt.selected_columns.keys()) + '\r\n'
+
+
+def stream_json(stmt):
+    """Generate a JSON array of row objects in chunks."""
+    yield '['
+    first = True
+    for keys, rows in iter_rows(stmt):
+        parts = []
+        for row in rows:
+            parts.append(json.dumps({key: _encode(value) for key, value in zip(keys, row)}, ensure_ascii=False))
+        if parts:
+            yield ('' if first else ',') + ','.join(parts)
+            first = False
+    yield ']'
@@ -1,21 +1,92 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify
+from flask import render_template, request, redirect, url_for, flash, jsonify, abort, Response, stream_with_context
 from app import app, db
-from models import Tournament, Team, Player, Match, MatchUpdate, MatchStats, PlayerStats, PlayerMatchPerformance
+from models import Tournament, Team, Player, Match, MatchUpdate, PlayerStats, PlayerMatchPerformance, TournamentProjection, Job
 from forms import TournamentForm, TeamForm, PlayerForm, MatchForm, ScoreForm
-from datetime import datetime, timedelta
+from reports import REPORTS, stream_csv, stream_json
+from fragment_cache import cache_fragment, match_version, invalidate_match, invalidate_team, invalidate_from_event
+from event_bus import publish, events_since, process_bus
+import match_clock
+import stats_reducer
+import eligibility
+import form_guide
+import coach_lookup
+import search
+import referee_scheduler
+import fixture_clashes
+import hot_queries
+from post_match import enqueue_post_match
+from jobs import enqueue, job_metrics
+from sqlite_backend import serialized_write, read_engine
+from decorators import admin_required
+import provisioning
+import sharding
+import snapshots
+from http_cache import conditional_get, table_version
+from datetime import date, datetime, timedelta
 import itertools
-import random
 
-@app.route('/')
+app.add_template_global(cache_fragment)
+app.add_template_global(match_version)
+
+@app.before_request
+def start_live_bus():
+    # Started lazily so each Gunicorn worker gets its own bus thread after the fork
+    bus = process_bus(read_engine(db))
+    bus.subscribe(invalidate_from_event)
+    bus.subscribe(eligibility.invalidate_from_event)
+
+@app.before_request
+def pick_request_shard():
+    """Default the session to the shard of the tournament, team, match or player in the URL"""
+    view_args = request.view_args or {}
+    entity_id = next((view_args[key] for key in ('id', 'tournament_id', 'team_id') if key in view_args), None)
+    if sharding.enabled():
+        sharding.use_request_shard(entity_id)
+
+@app.before_request
+def serve_snapshot():
+    """Pages of finished tournaments come from their static snapshot when one is published"""
+    return snapshots.serve()
+
+def publish_match_event(match, event_type, update=None):
+    """Stage a live bus event for this match in the current transaction"""
+    db.session.flush()
+    return publish(match.id, event_type, {
+        'home_score': match.home_score,
+        'away_score': match.away_score,
+        'status': match.status,
+        'home_team_id': match.home_team_id,
+        'away_team_id': match.away_team_id,
+        'update': update.to_dict() if update else None
+    })
+
+def _tournament_versions(id):
+    return [
+        table_version(Tournament, Tournament.id == id),
+        table_version(Team, Team.tournament_id == id),
+        table_version(Match, Match.tournament_id == id),
+    ]
+
+@conditional_get(lambda: [table_version(Tournament), table_version(Match, Match.status == 'completed')])
 def index():
-    tournaments = Tournament.query.order_by(Tournament.created_at.desc()).limit(5).all()
-    recent_matches = Match.query.filter_by(status='completed').order_by(Match.match_date.desc()).limit(5).all()
+    # Each shard returns its own latest 5: keep the latest 5 overall
+    tournaments = sharding.merge(Tournament.query.order_by(Tournament.created_at.desc()).limit(5).all(),
+                                 key=lambda t: t.created_at, reverse=True, limit=5)
+    recent_matches = sharding.merge(
+        Match.query.filter_by(status='completed').order_by(Match.match_date.desc()).limit(5).all(),
+        key=lambda m: m.match_date, reverse=True, limit=5)
     return render_template('index.html', tournaments=tournaments, recent_matches=recent_matches)
 
+# app.py registers its own 'index' home page: keep it, so importing these views does not collide
+if 'index' not in app.view_functions:
+    app.add_url_rule('/', view_func=index)
+
 # Tournament routes
 @app.route('/tournaments')
+@conditional_get(lambda: [table_version(Tournament)])
 def tournaments():
-    tournaments = Tournament.query.order_by(Tournament.created_at.desc()).all()
+    tournaments = sharding.merge(Tournament.query.order_by(Tournament.created_at.desc()).all(),
+                                 key=lambda t: t.created_at, reverse=True)
     return render_template('tournaments/list.html', tournaments=tournaments)
 
 @app.route('/tournaments/create', methods=['GET', 'POST'])
@@ -36,6 +107,7 @@ def create_tournament():
     return render_template('tournaments/create.html', form=form)
 
 @app.route('/tournaments/<int:id>')
+@conditional_get(_tournament_versions)
 def tournament_detail(id):
     tournament = Tournament.query.get_or_404(id)
     teams = Team.query.filter_by(tournament_id=id).all()
@@ -64,33 +136,50 @@ def generate_fixtures(id):
         flash('Need at least 2 teams to generate fixtures!', 'error')
         return redirect(url_for('tournament_detail', id=id))
     
-    # Delete existing matches
-    Match.query.filter_by(tournament_id=id).delete()
-    
     # Generate round-robin fixtures
     team_combinations = list(itertools.combinations(teams, 2))
-    start_date = tournament.start_date
+    start_date = datetime.combine(tournament.start_date, datetime.min.time())
+    fixtures = [{
+        'home_team_id': home_team.id,
+        'away_team_id': away_team.id,
+        'match_date': start_date + timedelta(days=i * 3),  # Matches every 3 days
+        'venue': None
+    } for i, (home_team, away_team) in enumerate(team_combinations)]
+    
+    # Resolve team/venue clashes before anything is written. Every stored match is
+    # replaced below, so the new fixtures can only clash with each other.
+    moved, unplaced = fixture_clashes.repair(fixtures, fixture_clashes.ClashIndex(),
+                                             last_day=tournament.end_date)
+    if unplaced:
+        flash(f'{len(unplaced)} fixtures could not be scheduled without a clash, nothing was changed.', 'error')
+        return redirect(url_for('tournament_detail', id=id))
+    
+    # Delete existing matches
+    Match.query.filter_by(tournament_id=id).delete()
     
-    for i, (home_team, away_team) in enumerate(team_combinations):
-        match_date = start_date + timedelta(days=i * 3)  # Matches every 3 days
+    for fixture in fixtures:
         match = Match(
             tournament_id=id,
-            home_team_id=home_team.id,
-            away_team_id=away_team.id,
-            match_date=match_date,
+            home_team_id=fixture['home_team_id'],
+            away_team_id=fixture['away_team_id'],
+            match_date=fixture['match_date'],
+            venue=fixture['venue'],
             round_number=1
         )
         db.session.add(match)
     
     tournament.status = 'active'
     db.session.commit()
+    if moved:
+        flash(f'{len(moved)} fixtures were moved to avoid clashes.', 'info')
     flash('Fixtures generated successfully!', 'success')
     return redirect(url_for('tournament_detail', id=id))
 
 # Team routes
 @app.route('/teams')
+@conditional_get(lambda: [table_version(Team)])
 def teams():
-    teams = Team.query.order_by(Team.name).all()
+    teams = sharding.merge(Team.query.order_by(Team.name).all(), key=lambda t: t.name)
     return render_template('teams/list.html', teams=teams)
 
 @app.route('/tournaments/<int:tournament_id>/teams/create', methods=['GET', 'POST'])
@@ -114,6 +203,8 @@ def create_team(tournament_id):
         )
         db.session.add(team)
         db.session.commit()
+        if team.coach_id:
+            coach_lookup.invalidate()
         flash(f'Team "{team.name}" registered successfully!', 'success')
         return redirect(url_for('tournament_detail', id=tournament_id))
     
@@ -134,12 +225,17 @@ def team_detail(id):
             'stats': player_stats
         })
     
-    return render_template('teams/detail.html', team=team, players=players_with_stats, stats=stats)
+    guide = form_guide.team_form(team)
+    
+    return render_template('teams/detail.html', team=team, players=players_with_stats, stats=stats,
+                           form_guide=guide)
 
 # Player routes
 @app.route('/players')
+@conditional_get(lambda: [table_version(Player), table_version(Team)])
 def players():
-    players = Player.query.join(Team).order_by(Team.name, Player.jersey_number).all()
+    players = sharding.merge(Player.query.join(Team).order_by(Team.name, Player.jersey_number).all(),
+                             key=lambda p: (p.team.name, p.jersey_number or 0))
     return render_template('players/list.html', players=players)
 
 @app.route('/teams/<int:team_id>/players/create', methods=['GET', 'POST'])
@@ -164,6 +260,8 @@ def create_player(team_id):
         )
         db.session.add(player)
         db.session.commit()
+        invalidate_team(team_id)
+        eligibility.invalidate_team(team_id)
         flash(f'Player "{player.name}" added successfully!', 'success')
         return redirect(url_for('team_detail', id=team_id))
     
@@ -172,9 +270,40 @@ def create_player(team_id):
 # Match routes
 @app.route('/matches')
 def matches():
-    matches = Match.query.order_by(Match.match_date.desc()).all()
+    matches = sharding.merge(Match.query.order_by(Match.match_date.desc()).all(),
+                             key=lambda m: m.match_date, reverse=True)
     return render_template('matches/list.html', matches=matches)
 
+@app.route('/matches/<int:id>/reschedule', methods=['GET', 'POST'])
+def reschedule_match(id):
+    match = Match.query.get_or_404(id)
+    form = MatchForm(obj=match)
+    
+    if form.validate_on_submit():
+        fixture = {
+            'id': match.id,
+            'home_team_id': match.home_team_id,
+            'away_team_id': match.away_team_id,
+            'match_date': form.match_date.data,
+            'venue': form.venue.data
+        }
+        index = fixture_clashes.ClashIndex.for_tournament(match.tournament_id, exclude={match.id})
+        conflicts = index.conflicts(fixture)
+        if conflicts:
+            for conflict in conflicts:
+                what = f"team #{conflict['team_id']}" if conflict['type'] == 'team' else f"venue {conflict['venue']}"
+                flash(f"Clash: {what} already plays match #{conflict['with']} on {conflict['date']}.", 'error')
+            return render_template('matches/reschedule.html', form=form, match=match)
+        match.match_date = datetime.combine(form.match_date.data, match.match_date.time())
+        match.venue = form.venue.data
+        match.round_number = form.round_number.data
+        db.session.commit()
+        invalidate_match(match)
+        flash('Match rescheduled successfully!', 'success')
+        return redirect(url_for('matches'))
+    
+    return render_template('matches/reschedule.html', form=form, match=match)
+
 @app.route('/matches/<int:id>/update_score', methods=['GET', 'POST'])
 def update_score(id):
     match = Match.query.get_or_404(id)
@@ -188,13 +317,24 @@ def update_score(id):
         match.home_score = form.home_score.data
         match.away_score = form.away_score.data
         match.status = 'completed'
+        publish_match_event(match, 'score')
+        enqueue_post_match(match)
         db.session.commit()
+        invalidate_match(match)
+        eligibility.invalidate_team(match.home_team_id)
+        eligibility.invalidate_team(match.away_team_id)
         flash('Match score updated successfully!', 'success')
         return redirect(url_for('matches'))
     
     return render_template('matches/update_score.html', form=form, match=match)
 
+def _standings_versions(id):
+    return _tournament_versions(id) + [
+        table_version(TournamentProjection, TournamentProjection.tournament_id == id),
+    ]
+
 @app.route('/tournaments/<int:id>/standings')
+@conditional_get(_standings_versions)
 def standings(id):
     tournament = Tournament.query.get_or_404(id)
     teams = Team.query.filter_by(tournament_id=id).all()
@@ -210,7 +350,20 @@ def standings(id):
     # Sort standings by points, then goal difference, then goals for
     standings.sort(key=lambda x: (x['stats']['points'], x['stats']['goal_difference'], x['stats']['goals_for']), reverse=True)
     
-    return render_template('standings.html', tournament=tournament, standings=standings)
+    # Latest ratings / title and relegation odds snapshot, computed by season_analytics.py
+    projection = _latest_projection(id)
+    
+    return render_template('standings.html', tournament=tournament, standings=standings, projection=projection)
+
+def _latest_projection(id):
+    projection = TournamentProjection.query.filter_by(tournament_id=id).order_by(
+        TournamentProjection.created_at.desc(), TournamentProjection.id.desc()).first()
+    if not projection:
+        return None
+    data = projection.to_dict()
+    completed = Match.query.filter_by(tournament_id=id, status='completed').count()
+    data['stale'] = completed != projection.completed_matches
+    return data
 
 # Live Match Routes
 @app.route('/matches/<int:id>/live')
@@ -219,8 +372,7 @@ def live_match(id):
     
     # Create match stats if they don't exist
     if not match.stats_detail:
-        stats = MatchStats(match_id=id)
-        db.session.add(stats)
+        stats_reducer.get_or_create_stats(match)
         db.session.commit()
     
     return render_template('matches/live.html', match=match)
@@ -230,10 +382,8 @@ def live_match(id):
 def api_live_match_data(id):
     match = Match.query.get_or_404(id)
     
-    # Get recent updates (last 10)
-    recent_updates = MatchUpdate.query.filter_by(match_id=id)\
-                                    .order_by(MatchUpdate.timestamp.desc())\
-                                    .limit(10).all()
+    # Get recent updates (last 10), as rows with team and player names joined in
+    recent_updates = hot_queries.recent_updates(id)
     
     # Get match stats
     stats = match.stats_detail
@@ -242,16 +392,22 @@ def api_live_match_data(id):
         'home_score': match.home_score,
         'away_score': match.away_score,
         'status': match.status,
-        'updates': [update.to_dict() for update in recent_updates],
-        'stats': stats.to_dict() if stats else None
+        'updates': recent_updates,
+        'stats': stats.to_dict() if stats else None,
+        'clock': match_clock.clock_state(match)
     }
     
     return jsonify(response_data)
 
 @app.route('/api/matches/<int:id>/score', methods=['POST'])
+@serialized_write
 def api_update_score(id):
     match = Match.query.get_or_404(id)
     data = request.get_json()
+    try:
+        match_clock.require_live(match, 'score')
+    except match_clock.ClockError as e:
+        return jsonify({'error': str(e)}), 409
     
     team = data.get('team')  # 'home' or 'away'
     
@@ -265,40 +421,23 @@ def api_update_score(id):
         return jsonify({'error': 'Invalid team'}), 400
     
     # Create match update
+    minute, added = match_clock.match_minute(match)
     update = MatchUpdate(
         match_id=id,
-        minute=random.randint(1, 90),
+        minute=minute,
         update_type='goal',
         team_id=team_obj.id,
-        description=f'⚽ BUT ! {team_obj.name} marque !'
+        description=f'⚽ BUT ! {team_obj.name} marque !',
+        timestamp=datetime.utcnow()  # The snapshot and a later rebuild share it
     )
     
-    # Update match stats
-    if not match.stats_detail:
-        stats = MatchStats(match_id=id)
-        db.session.add(stats)
-    else:
-        stats = match.stats_detail
-    
-    # Simulate some stats updates
-    if team == 'home':
-        stats.home_shots += random.randint(1, 3)
-        stats.home_shots_on_target += 1
-    else:
-        stats.away_shots += random.randint(1, 3)
-        stats.away_shots_on_target += 1
-    
-    # Random possession adjustment
-    possession_change = random.randint(-5, 5)
-    if team == 'home':
-        stats.home_possession = min(100, max(0, stats.home_possession + possession_change))
-        stats.away_possession = 100 - stats.home_possession
-    else:
-        stats.away_possession = min(100, max(0, stats.away_possession + possession_change))
-        stats.home_possession = 100 - stats.away_possession
+    # Fold the goal into the match stats
+    stats = stats_reducer.apply_events(match, [('goal', team, update.timestamp)])
     
     db.session.add(update)
+    publish_match_event(match, 'update', update)
     db.session.commit()
+    invalidate_match(match)
     
     return jsonify({
         'home_score': match.home_score,
@@ -309,8 +448,13 @@ def api_update_score(id):
     })
 
 @app.route('/api/matches/<int:id>/start', methods=['POST'])
+@serialized_write
 def api_start_match(id):
     match = Match.query.get_or_404(id)
+    try:
+        match_clock.kick_off(match)
+    except match_clock.ClockError as e:
+        return jsonify({'error': str(e)}), 400
     match.status = 'in_progress'
     
     # Create kick-off update
@@ -322,28 +466,203 @@ def api_start_match(id):
     )
     
     db.session.add(update)
+    publish_match_event(match, 'update', update)
     db.session.commit()
+    invalidate_match(match)
     
     return jsonify({'status': 'success', 'match_status': match.status})
 
 @app.route('/api/matches/<int:id>/end', methods=['POST'])
+@serialized_write
 def api_end_match(id):
     match = Match.query.get_or_404(id)
+    try:
+        match_clock.final_whistle(match)
+    except match_clock.ClockError as e:
+        return jsonify({'error': str(e)}), 400
     match.status = 'completed'
     
     # Create final whistle update
+    minute, added = match_clock.match_minute(match)
     update = MatchUpdate(
         match_id=id,
-        minute=90,
+        minute=minute,
         update_type='final_whistle',
-        description='🔴 Fin du match !'
+        description='🔴 Fin du match !',
+        timestamp=match.ended_at
     )
+    stats_reducer.apply_events(match, [('final_whistle', None, match.ended_at)])
     
     db.session.add(update)
+    publish_match_event(match, 'update', update)
+    # Stats aggregation, ratings and projections run on the job workers
+    enqueue_post_match(match)
     db.session.commit()
+    invalidate_match(match)
+    eligibility.invalidate_team(match.home_team_id)
+    eligibility.invalidate_team(match.away_team_id)
     
     return jsonify({'status': 'success', 'match_status': match.status})
 
+@app.route('/api/matches/<int:id>/events', methods=['POST'])
+@serialized_write
+def api_post_events(id):
+    """Record a batch of typed events and fold them into the match stats in one write"""
+    match = Match.query.get_or_404(id)
+    data = request.get_json() or {}
+    events = data.get('events', [])
+    if not isinstance(events, list) or not events:
+        return jsonify({'error': 'No events'}), 400
+    try:
+        match_clock.require_live(match, 'record events')
+    except match_clock.ClockError as e:
+        return jsonify({'error': str(e)}), 409
+    
+    teams = {'home': match.home_team_id, 'away': match.away_team_id}
+    if not all(isinstance(event, dict) for event in events):
+        return jsonify({'error': 'Each event must be an object'}), 400
+    player_ids = {event.get('player_id') for event in events} - {None}
+    if not all(isinstance(player_id, int) and not isinstance(player_id, bool) for player_id in player_ids):
+        return jsonify({'error': 'player_id must be an integer'}), 400
+    player_teams = dict(db.session.execute(
+        db.select(Player.id, Player.team_id).where(Player.id.in_(player_ids))).all()) if player_ids else {}
+    minute, added = match_clock.match_minute(match)
+    now = datetime.utcnow()
+    updates, folded = [], []
+    for event in events:
+        event_type, side = event.get('type'), event.get('team')
+        if event_type not in stats_reducer.EVENT_TYPES or side not in teams:
+            return jsonify({'error': f'Invalid event: {event}'}), 400
+        if event.get('player_id') is not None and player_teams.get(event['player_id']) != teams[side]:
+            return jsonify({'error': f"Player {event['player_id']} does not play for the {side} team"}), 400
+        updates.append(MatchUpdate(
+            match_id=id,
+            minute=minute,
+            update_type=event_type,
+            team_id=teams[side],
+            player_id=event.get('player_id'),
+            description=event.get('description'),
+            timestamp=now
+        ))
+        folded.append((event_type, side, now))
+    
+    stats = stats_reducer.apply_events(match, folded)
+    db.session.add_all(updates)
+    for update in updates:
+        if update.update_type in ('yellow_card', 'red_card') and update.player_id:
+            _record_card(id, update.player_id, update.update_type)
+    db.session.flush()
+    publish_match_event(match, 'stats')
+    db.session.commit()
+    if any(update.update_type in ('yellow_card', 'red_card') for update in updates):
+        eligibility.invalidate_team(match.home_team_id)
+        eligibility.invalidate_team(match.away_team_id)
+    
+    return jsonify({
+        'stats': stats.to_dict(),
+        'updates': [update.to_dict() for update in updates]
+    })
+
+def _record_card(match_id, player_id, card):
+    """Count a card on the player's match performance, creating it for unselected players"""
+    performance = PlayerMatchPerformance.query.filter_by(player_id=player_id, match_id=match_id).first()
+    if not performance:
+        performance = PlayerMatchPerformance(player_id=player_id, match_id=match_id, yellow_cards=0, red_cards=0)
+        db.session.add(performance)
+    if card == 'yellow_card':
+        performance.yellow_cards = (performance.yellow_cards or 0) + 1
+    else:
+        performance.red_cards = (performance.red_cards or 0) + 1
+
+@app.route('/api/matches/<int:id>/stats/rebuild', methods=['POST'])
+@serialized_write
+def api_rebuild_stats(id):
+    Match.query.get_or_404(id)
+    stats = stats_reducer.rebuild_match_stats(id)
+    db.session.commit()
+    return jsonify({'stats': stats.to_dict()})
+
+@app.route('/api/matches/<int:id>/stats/series')
+def api_stats_series(id):
+    """Stat evolution for live charts; pass the last seen snapshot id as ?since= to get only new points.
+    `reset` means that point was rewritten by a rebuild: the series is complete, redraw the chart."""
+    Match.query.get_or_404(id)
+    since = request.args.get('since', 0, type=int)
+    series, reset = stats_reducer.stats_series(id, since)
+    return jsonify({
+        'fields': stats_reducer.SNAPSHOT_FIELDS,
+        'series': series,
+        'reset': reset,
+        'last_id': series['id'][-1] if series['id'] else (0 if reset else since)
+    })
+
+@app.route('/api/matches/<int:id>/half_time', methods=['POST'])
+@serialized_write
+def api_half_time(id):
+    return _clock_transition(id, match_clock.start_half_time, 'half_time', '⏸️ Mi-temps')
+
+@app.route('/api/matches/<int:id>/second_half', methods=['POST'])
+@serialized_write
+def api_second_half(id):
+    return _clock_transition(id, match_clock.start_second_half, 'second_half', '▶️ Début de la seconde période')
+
+def _clock_transition(id, transition, update_type, description):
+    match = Match.query.get_or_404(id)
+    try:
+        transition(match)
+    except match_clock.ClockError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    minute, added = match_clock.match_minute(match)
+    update = MatchUpdate(
+        match_id=id,
+        minute=minute,
+        update_type=update_type,
+        description=description,
+        timestamp=datetime.utcnow()
+    )
+    if update_type in stats_reducer.STOPPAGES:
+        stats_reducer.apply_events(match, [(update_type, None, update.timestamp)])
+    
+    db.session.add(update)
+    publish_match_event(match, 'update', update)
+    db.session.commit()
+    
+    return jsonify({'status': 'success', 'clock': match_clock.clock_state(match)})
+
+@app.route('/api/matches/<int:id>/added_time', methods=['POST'])
+@serialized_write
+def api_added_time(id):
+    match = Match.query.get_or_404(id)
+    minutes = (request.get_json() or {}).get('minutes')
+    if not isinstance(minutes, int) or not 0 <= minutes <= 30:
+        return jsonify({'error': 'Invalid minutes'}), 400
+    try:
+        match_clock.announce_added_time(match, minutes)
+    except match_clock.ClockError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    publish_match_event(match, 'clock')
+    db.session.commit()
+    
+    return jsonify({'status': 'success', 'clock': match_clock.clock_state(match)})
+
+# User provisioning
+@app.route('/api/users/import', methods=['POST'])
+@admin_required
+def api_import_users():
+    """Create accounts from a CSV upload ('file' field or raw body); duplicates are reported, not fatal"""
+    upload = request.files.get('file')
+    data = upload.read() if upload else request.get_data()
+    if not data:
+        return jsonify({'error': 'No CSV file'}), 400
+    try:
+        report = provisioning.provision_users(provisioning.read_upload(data))
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'error': str(e)}), 400
+    db.session.commit()
+    return jsonify(report)
+
 # Player Statistics Routes
 @app.route('/players/<int:id>')
 def player_detail(id):
@@ -358,26 +677,204 @@ def player_detail(id):
     return render_template('players/detail.html', player=player, stats=stats, recent_performances=recent_performances)
 
 @app.route('/players/stats')
+@conditional_get(lambda: [table_version(PlayerStats), table_version(Player)])
 def player_stats_leaderboard():
+    # Each shard returns its own top 10: keep the top 10 overall
     # Get top scorers
     top_scorers = db.session.query(Player, PlayerStats)\
                            .join(PlayerStats, Player.id == PlayerStats.player_id)\
                            .order_by(PlayerStats.goals.desc())\
                            .limit(10).all()
+    top_scorers = sharding.merge(top_scorers, key=lambda row: row[1].goals, reverse=True, limit=10)
     
     # Get top assists
     top_assists = db.session.query(Player, PlayerStats)\
                            .join(PlayerStats, Player.id == PlayerStats.player_id)\
                            .order_by(PlayerStats.assists.desc())\
                            .limit(10).all()
+    top_assists = sharding.merge(top_assists, key=lambda row: row[1].assists, reverse=True, limit=10)
     
     # Get most cards
     most_cards = db.session.query(Player, PlayerStats)\
                           .join(PlayerStats, Player.id == PlayerStats.player_id)\
                           .order_by((PlayerStats.yellow_cards + PlayerStats.red_cards).desc())\
                           .limit(10).all()
+    most_cards = sharding.merge(most_cards, key=lambda row: row[1].yellow_cards + row[1].red_cards,
+                                reverse=True, limit=10)
     
     return render_template('players/stats.html', 
                          top_scorers=top_scorers, 
                          top_assists=top_assists, 
                          most_cards=most_cards)
+
+# Report Routes
+@app.route('/reports/<report>.<fmt>')
+def stats_report(report, fmt):
+    if report not in REPORTS or fmt not in ('csv', 'json'):
+        abort(404)
+
+    stmt = REPORTS[report](
+        tournament_id=request.args.get('tournament_id', type=int),
+        team_id=request.args.get('team_id', type=int),
+        date_from=request.args.get('from', type=date.fromisoformat),
+        date_to=request.args.get('to', type=date.fromisoformat)
+    )
+
+    if fmt == 'csv':
+        body, mimetype = stream_csv(stmt), 'text/csv'
+    else:
+        body, mimetype = stream_json(stmt), 'application/json'
+
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={report}.{fmt}'
+    return response
+
+@app.route('/api/matches/<int:id>/events')
+def api_match_events(id):
+    """Resume a live feed: bus events of this match after the `since` sequence number"""
+    Match.query.get_or_404(id)
+    since = request.args.get('since', 0, type=int)
+    events = events_since(since, match_id=id)
+    return jsonify({
+        'events': [event.to_dict() for event in events],
+        'last_seq': events[-1].id if events else since
+    })
+
+@app.route('/api/teams/<int:id>/eligibility')
+def api_team_eligibility(id):
+    """Squad eligibility for the coach dashboard in one lookup"""
+    squad = eligibility.get_team_eligibility(id)
+    if squad is None:
+        return jsonify({'error': 'Team not found'}), 404
+    return jsonify({
+        'team_id': id,
+        'players': {str(player_id): row for player_id, row in squad.items()},
+        'eligible': sorted(player_id for player_id, row in squad.items() if row['eligible'])
+    })
+
+@app.route('/api/matches/<int:id>/preview')
+def api_match_preview(id):
+    match = Match.query.get_or_404(id)
+    preview = form_guide.match_preview(match)
+    return jsonify(preview)
+
+@app.route('/api/tournaments/<int:id>/projections')
+def api_tournament_projection(id):
+    Tournament.query.get_or_404(id)
+    projection = _latest_projection(id)
+    if not projection:
+        return jsonify({'error': 'No projection computed yet'}), 404
+    return jsonify(projection)
+
+@app.route('/api/tournaments/<int:id>/projections', methods=['POST'])
+@admin_required
+def api_compute_projection(id):
+    """Queue a projection run on the job workers; poll /api/jobs/<job_id> for its outcome"""
+    from season_analytics import SIMULATIONS
+    Tournament.query.get_or_404(id)
+    data = request.get_json(silent=True) or {}
+    simulations = data.get('simulations', SIMULATIONS)
+    seed = data.get('seed')
+    if not isinstance(simulations, int) or not 0 < simulations <= 100000:
+        return jsonify({'error': 'simulations must be between 1 and 100000'}), 400
+    if seed is not None and not isinstance(seed, int):
+        return jsonify({'error': 'seed must be an integer'}), 400
+    if Team.query.filter_by(tournament_id=id).count() < 2:
+        return jsonify({'error': 'Tournament needs at least 2 teams'}), 400
+    job = enqueue('tournament.projection', tournament_id=id, simulations=simulations, seed=seed)
+    db.session.commit()
+    return jsonify({'job_id': job.id, 'status': job.status}), 202
+
+@app.route('/api/jobs/<int:id>')
+@admin_required
+def api_job(id):
+    job = Job.query.get_or_404(id)
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/metrics')
+@admin_required
+def api_job_metrics():
+    hours = request.args.get('hours', 24, type=float)
+    return jsonify(job_metrics(datetime.utcnow() - timedelta(hours=hours)))
+
+@app.route('/api/coaches')
+def api_coaches():
+    """Unassigned coaches for the team form, by username/name prefix, keyset-paginated"""
+    limit = request.args.get('limit', coach_lookup.DEFAULT_LIMIT, type=int)
+    if not 0 < limit <= coach_lookup.MAX_LIMIT:
+        return jsonify({'error': f'limit must be between 1 and {coach_lookup.MAX_LIMIT}'}), 400
+    page = coach_lookup.cached_search(request.args.get('q', '').strip(), request.args.get('after'), limit)
+    return jsonify(page)
+
+def _search_args(default_limit):
+    kind = request.args.get('kind') or None
+    limit = request.args.get('limit', default_limit, type=int)
+    if kind and kind not in search.KINDS:
+        abort(400)
+    return request.args.get('q', ''), kind, max(1, min(limit, 100))
+
+@app.route('/api/search')
+def api_search():
+    q, kind, limit = _search_args(search.DEFAULT_LIMIT)
+    return jsonify({'results': search.search(q, kind, limit)})
+
+@app.route('/api/search/autocomplete')
+def api_search_autocomplete():
+    q, kind, limit = _search_args(search.AUTOCOMPLETE_LIMIT)
+    return jsonify({'results': search.autocomplete(q, kind, limit)})
+
+@app.route('/api/tournaments/<int:id>/referees/assign', methods=['POST'])
+def api_assign_referees(id):
+    """Staff the tournament's scheduled fixtures (or one matchday) with referees"""
+    Tournament.query.get_or_404(id)
+    data = request.get_json(silent=True) or {}
+    try:
+        day = date.fromisoformat(data['date']) if data.get('date') else None
+        rest_days = int(data.get('rest_days', referee_scheduler.DEFAULT_REST_DAYS))
+        max_team_matches = int(data.get('max_team_matches', referee_scheduler.DEFAULT_MAX_TEAM_MATCHES))
+        per_match = int(data.get('per_match', referee_scheduler.REFEREES_PER_MATCH))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    if rest_days < 0 or max_team_matches < 1 or per_match < 1:
+        return jsonify({'error': 'rest_days must be >= 0, max_team_matches and per_match >= 1'}), 400
+    report = referee_scheduler.assign_referees(id, day, rest_days, max_team_matches, per_match)
+    db.session.commit()
+    return jsonify(report)
+
+@app.route('/api/tournaments/<int:id>/referees/conflicts')
+def api_referee_conflicts(id):
+    Tournament.query.get_or_404(id)
+    rest_days = request.args.get('rest_days', referee_scheduler.DEFAULT_REST_DAYS, type=int)
+    return jsonify({'conflicts': referee_scheduler.find_conflicts(id, rest_days)})
+
+@app.route('/api/tournaments/<int:id>/fixtures/validate', methods=['POST'])
+def api_validate_fixtures(id):
+    """Check (and optionally repair) a fixture set against the tournament's matches without writing"""
+    tournament = Tournament.query.get_or_404(id)
+    data = request.get_json(silent=True) or {}
+    try:
+        fixtures = [fixture_clashes.parse_fixture(fixture) for fixture in data.get('fixtures', [])]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    exclude = {fixture['id'] for fixture in fixtures if fixture['id']}
+    index = fixture_clashes.ClashIndex.for_tournament(id, exclude=exclude)
+    if data.get('repair'):
+        moved, unplaced = fixture_clashes.repair(fixtures, index, last_day=tournament.end_date)
+        return jsonify({
+            'moved': moved,
+            'unplaced': unplaced,
+            'fixtures': [dict(fixture, match_date=fixture['match_date'].isoformat()) for fixture in fixtures]
+        })
+    return jsonify({'conflicts': fixture_clashes.validate(fixtures, index)})
+
+@app.route('/api/tournaments/<int:id>/clashes')
+def api_tournament_clashes(id):
+    """Clashes among the tournament's stored matches"""
+    Tournament.query.get_or_404(id)
+    matches = Match.query.filter_by(tournament_id=id).order_by(Match.match_date, Match.id).all()
+    fixtures = [{'id': m.id, 'home_team_id': m.home_team_id, 'away_team_id': m.away_team_id,
+                 'match_date': m.match_date, 'venue': m.venue} for m in matches]
+    conflicts = fixture_clashes.validate(fixtures)
+    for conflict in conflicts:
+        conflict['match_id'] = fixtures[conflict.pop('fixture')]['id']
+    return jsonify({'conflicts': conflicts})
@@ -0,0 +1,435 @@
+"""Name search over players, teams and tournaments.
+
+Three layers, picked by what the database offers:
+
+  * PostgreSQL: GIN expression indexes on to_tsvector('simple', name) for
+    word/prefix matches and pg_trgm indexes for typo-tolerant similarity.
+    Both are maintained by PostgreSQL itself.
+  * SQLite: an FTS5 table (search_index) with prefix indexes, ranked by bm25.
+    Mapper events write it in the same transaction as the ORM insert, update
+    or delete.
+  * Every process: an in-memory sorted prefix index of name words, used for
+    autocomplete. It is bisected in O(log n), patched after each commit that
+    touched a searchable row, and rebuilt when another process changed the
+    tables (checked at most every REFRESH_SECONDS).
+
+Bulk Core inserts (synthetic data, tournament imports) bypass mapper events:
+imports queue a search.reindex job, and `python search.py rebuild` refreshes
+everything.
+"""
+import argparse
+import bisect
+import threading
+import time
+import unicodedata
+
+from sqlalchemy import (event, inspect, select, text, func, case, literal, literal_column, union_all, table, column,
+                        Integer, String, Float)
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.orm import Session, object_session
+
+from extensions import db
+from http_cache import fingerprint, table_version
+from jobs import task
+from models import Player, Team, Tournament
+
+DEFAULT_LIMIT = 20
+AUTOCOMPLETE_LIMIT = 10
+REFRESH_SECONDS = 30
+TRIGRAM_THRESHOLD = 0.3
+
+KINDS = {'player': Player, 'team': Team, 'tournament': Tournament}
+
+POSTGRES_INDEXES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    *[f"CREATE INDEX IF NOT EXISTS ix_{table}_name_tsv ON {table} USING gin (to_tsvector('simple', name))"
+      for table in KINDS],
+    *[f"CREATE INDEX IF NOT EXISTS ix_{table}_name_trgm ON {table} USING gin (name gin_trgm_ops)"
+      for table in KINDS],
+]
+# FTS5 rowid = entity id * 4 + kind code, so a row is replaced or deleted by rowid
+KIND_CODES = {'player': 1, 'team': 2, 'tournament': 3}
+KIND_NAMES = {code: kind for kind, code in KIND_CODES.items()}
+FTS_TABLE = ("CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+             "title, subtitle, tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+FTS_BATCH = 5000
+
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+def normalize(value):
+    """Lowercase and strip accents, so 'Müller' and 'muller' share a key."""
+    decomposed = unicodedata.normalize('NFKD', value or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def _dialect(connection):
+    return connection.dialect.name
+
+
+def _fts_missing(connection):
+    """True when search_index does not exist yet, or is empty while there are rows to index."""
+    if connection.scalar(text("SELECT 1 FROM sqlite_master WHERE name = 'search_index'")) is None:
+        return True
+    return (connection.scalar(text("SELECT 1 FROM search_index LIMIT 1")) is None
+            and connection.scalar(select(_all_rows().subquery().c.id).limit(1)) is not None)
+
+
+def _fts_fill(connection):
+    """Index every existing row with a single INSERT ... SELECT."""
+    rows = _all_rows().subquery()
+    code = case(KIND_CODES, value=rows.c.kind)
+    connection.execute(
+        table('search_index', column('rowid'), column('title'), column('subtitle')).insert().from_select(
+            ['rowid', 'title', 'subtitle'], select(rows.c.id * 4 + code, rows.c.title, rows.c.subtitle)))
+
+
+def ensure_schema(connection):
+    """Create the search indexes for this database once per process; False when unavailable.
+
+    On SQLite, a new FTS table is filled from the existing rows in the same
+    transaction. A query_only read connection cannot do that: it answers False,
+    so searches use LIKE until a writer has created the index.
+    """
+    key = str(connection.engine.url)
+    with _schema_lock:
+        if key in _schema_ready:
+            return True
+    try:
+        if _dialect(connection) == 'postgresql':
+            with connection.begin_nested():
+                for statement in POSTGRES_INDEXES:
+                    connection.execute(text(statement))
+        elif _dialect(connection) == 'sqlite':
+            if _fts_missing(connection):
+                connection.execute(text(FTS_TABLE))
+                _fts_fill(connection)
+                return True  # Cached by a later call that finds it, in case this transaction rolls back
+        else:
+            return False
+    except (OperationalError, ProgrammingError):
+        return False  # No FTS5 / pg_trgm, or a read-only connection: search falls back to LIKE
+    with _schema_lock:
+        _schema_ready.add(key)
+    return True
+
+
+def _subtitle(connection, kind, target):
+    if kind == 'player':
+        return connection.scalar(select(Team.name).where(Team.id == target.team_id)) or ''
+    if kind == 'team':
+        return target.city or ''
+    return ''
+
+
+# --- SQLite FTS5 maintenance ------------------------------------------------
+
+def _rowid(kind, entity_id):
+    return entity_id * 4 + KIND_CODES[kind]
+
+
+def _fts_write(connection, rows):
+    """Insert or replace (kind, id, title, subtitle) rows."""
+    params = [{'rowid': _rowid(kind, entity_id), 'title': title, 'subtitle': subtitle}
+              for kind, entity_id, title, subtitle in rows]
+    if params:
+        connection.execute(text("DELETE FROM search_index WHERE rowid = :rowid"), params)
+        connection.execute(
+            text("INSERT INTO search_index (rowid, title, subtitle) VALUES (:rowid, :title, :subtitle)"), params)
+
+
+def _uses_fts(connection):
+    return _dialect(connection) == 'sqlite' and ensure_schema(connection)
+
+
+# Columns whose change affects what is indexed
+INDEXED_ATTRIBUTES = {'player': ('name', 'team_id'), 'team': ('name', 'city'), 'tournament': ('name',)}
+
+
+def _on_write(kind):
+    def listener(mapper, connection, target):
+        state = inspect(target)
+        if state.persistent and not any(state.attrs[name].history.has_changes()
+                                        for name in INDEXED_ATTRIBUTES[kind]):
+            return  # An update that does not touch the indexed columns
+        subtitle = _subtitle(connection, kind, target)
+        rows = [(kind, target.id, target.name, subtitle)]
+        if kind == 'team' and state.persistent and state.attrs.name.history.has_changes():
+            # Player rows carry the team name as their subtitle
+            rows.extend(('player', player_id, name, target.name) for player_id, name in connection.execute(
+                select(Player.id, Player.name).where(Player.team_id == target.id)))
+        if _uses_fts(connection):
+            _fts_write(connection, rows)
+        for row in rows:
+            _stage(target, ('add', *row))
+    return listener
+
+
+def _on_delete(kind):
+    def listener(mapper, connection, target):
+        if _uses_fts(connection):
+            connection.execute(text("DELETE FROM search_index WHERE rowid = :rowid"),
+                               {'rowid': _rowid(kind, target.id)})
+        _stage(target, ('remove', kind, target.id, None, None))
+    return listener
+
+
+for _kind, _model in KINDS.items():
+    event.listen(_model, 'after_insert', _on_write(_kind))
+    event.listen(_model, 'after_update', _on_write(_kind))
+    event.listen(_model, 'after_delete', _on_delete(_kind))
+
+
+# --- In-process prefix index ------------------------------------------------
+
+class PrefixIndex:
+    """Sorted (word, entry) arrays; a prefix lookup is a bisect plus a short scan."""
+
+    def __init__(self):
+        self._keys = []
+        self._refs = []
+        self._entries = []  # ref -> (kind, id, title, subtitle) or None once removed
+        self._by_entity = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _words(title):
+        words = normalize(title).split()
+        return set(words) | ({' '.join(words)} if len(words) > 1 else set())
+
+    def load(self, rows):
+        """Replace the content with (kind, id, title, subtitle) rows."""
+        pairs, entries, by_entity = [], [], {}
+        for ref, (kind, entity_id, title, subtitle) in enumerate(rows):
+            entries.append((kind, entity_id, title, subtitle))
+            by_entity[(kind, entity_id)] = ref
+            pairs.extend((word, ref) for word in self._words(title))
+        pairs.sort()
+        with self._lock:
+            self._keys = [word for word, _ in pairs]
+            self._refs = [ref for _, ref in pairs]
+            self._entries, self._by_entity = entries, by_entity
+
+    def remove(self, kind, entity_id):
+        with self._lock:
+            ref = self._by_entity.pop((kind, entity_id), None)
+            if ref is not None:
+                self._entries[ref] = None
+
+    def add(self, kind, entity_id, title, subtitle):
+        self.remove(kind, entity_id)
+        with self._lock:
+            ref = len(self._entries)
+            self._entries.append((kind, entity_id, title, subtitle))
+            self._by_entity[(kind, entity_id)] = ref
+            for word in self._words(title):
+                position = bisect.bisect_left(self._keys, word)
+                self._keys.insert(position, word)
+                self._refs.insert(position, ref)
+
+    def search(self, prefix, kind=None, limit=AUTOCOMPLETE_LIMIT):
+        prefix = ' '.join(normalize(prefix).split())
+        if not prefix:
+            return []
+        results, seen = [], set()
+        with self._lock:
+            position = bisect.bisect_left(self._keys, prefix)
+            while position < len(self._keys) and self._keys[position].startswith(prefix):
+                ref = self._refs[position]
+                entry = self._entries[ref]
+                position += 1
+                if entry is None or ref in seen or (kind and entry[0] != kind):
+                    continue
+                seen.add(ref)
+                results.append(entry)
+                if len(results) >= limit:
+                    break
+        return [_result(*entry) for entry in results]
+
+    def __len__(self):
+        return len(self._by_entity)
+
+
+prefix_index = PrefixIndex()
+_index_state = {'version': None, 'checked': 0.0}
+_index_lock = threading.Lock()
+
+
+def _stage(target, change):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('search_changes', []).append(change)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    for action, kind, entity_id, title, subtitle in session.info.pop('search_changes', ()):
+        if action == 'add':
+            prefix_index.add(kind, entity_id, title, subtitle)
+        else:
+            prefix_index.remove(kind, entity_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('search_changes', None)
+
+
+def _all_rows():
+    return union_all(
+        select(literal('player').label('kind'), Player.id.label('id'), Player.name.label('title'),
+               Team.name.label('subtitle')).join(Team, Team.id == Player.team_id),
+        select(literal('team'), Team.id, Team.name, func.coalesce(Team.city, '')),
+        select(literal('tournament'), Tournament.id, Tournament.name, literal('')),
+    )
+
+
+def _tables_version():
+    etag, _ = fingerprint(table_version(Player), table_version(Team), table_version(Tournament))
+    return etag
+
+
+def refresh_prefix_index(force=False):
+    """Reload the prefix index when searchable tables changed in another process."""
+    now = time.monotonic()
+    with _index_lock:
+        if not force and now - _index_state['checked'] < REFRESH_SECONDS and _index_state['version']:
+            return
+        _index_state['checked'] = now
+    version = _tables_version()
+    if force or version != _index_state['version']:
+        prefix_index.load(db.session.execute(_all_rows().execution_options(yield_per=5000)))
+        _index_state['version'] = version
+
+
+def autocomplete(prefix, kind=None, limit=AUTOCOMPLETE_LIMIT):
+    refresh_prefix_index()
+    return prefix_index.search(prefix, kind, limit)
+
+
+# --- Queries ----------------------------------------------------------------
+
+def _result(kind, entity_id, title, subtitle, score=None):
+    result = {'kind': kind, 'id': entity_id, 'title': title, 'subtitle': subtitle}
+    if score is not None:
+        result['score'] = round(float(score), 4)
+    return result
+
+
+def _fts_query(words):
+    # Every word as a quoted prefix term, so user input cannot inject FTS5 syntax.
+    # Only titles match: a subtitle (a player's team, a team's city) is display context.
+    return 'title : ({})'.format(' '.join('"{}"*'.format(word.replace('"', '""')) for word in words))
+
+
+def _search_sqlite(words, kinds, limit):
+    codes = ', '.join(str(KIND_CODES[kind]) for kind in kinds)
+    # A TextualSelect, so RoutingSession sends it to the read pool like any SELECT
+    rows = db.session.execute(
+        text("SELECT rowid, title, subtitle, bm25(search_index) AS rank FROM search_index "
+             f"WHERE search_index MATCH :query AND rowid % 4 IN ({codes}) ORDER BY rank LIMIT :limit")
+        .columns(rowid=Integer, title=String, subtitle=String, rank=Float),
+        {'query': _fts_query(words), 'limit': limit})
+    return [_result(KIND_NAMES[rowid % 4], rowid // 4, title, subtitle, -rank)
+            for rowid, title, subtitle, rank in rows]
+
+
+def _postgres_select(kind, words, raw):
+    model = KINDS[kind]
+    vector = func.to_tsvector(literal_column("'simple'"), model.name)
+    query = func.to_tsquery(literal_column("'simple'"), ' & '.join(f"{word}:*" for word in words))
+    score = func.greatest(func.ts_rank(vector, query), func.similarity(model.name, raw))
+    subtitle = {'player': Team.name, 'team': func.coalesce(Team.city, ''), 'tournament': literal('')}[kind]
+    stmt = select(literal(kind).label('kind'), model.id, model.name, subtitle.label('subtitle'), score.label('score'))
+    if kind == 'player':
+        stmt = stmt.join(Team, Team.id == Player.team_id)
+    return stmt.where(db.or_(vector.bool_op('@@')(query), model.name.bool_op('%')(raw)))
+
+
+def _search_postgres(words, raw, kinds, limit):
+    db.session.execute(text('SELECT set_limit(:threshold)'), {'threshold': TRIGRAM_THRESHOLD})
+    stmt = union_all(*[_postgres_select(kind, words, raw) for kind in kinds]).subquery()
+    rows = db.session.execute(select(stmt).order_by(stmt.c.score.desc()).limit(limit))
+    return [_result(*row) for row in rows]
+
+
+def _search_like(words, kinds, limit):
+    results = []
+    for kind in kinds:
+        model = KINDS[kind]
+        stmt = select(model.id, model.name).where(
+            *[model.name.icontains(word, autoescape=True) for word in words]).limit(limit)
+        results.extend(_result(kind, entity_id, name, '') for entity_id, name in db.session.execute(stmt))
+    return results[:limit]
+
+
+def search(q, kind=None, limit=DEFAULT_LIMIT):
+    """Ranked matches for free text across players, teams and tournaments."""
+    words = [''.join(char for char in word if char.isalnum()) for word in q.lower().split()]
+    words = [word for word in words if word]
+    if not words:
+        return []
+    kinds = [kind] if kind else list(KINDS)
+    dialect = db.session.get_bind().dialect.name
+    if dialect not in ('postgresql', 'sqlite') or not ensure_schema(db.session.connection()):
+        return _search_like(words, kinds, limit)
+    if dialect == 'postgresql':
+        return _search_postgres(words, q.strip(), kinds, limit)
+    return _search_sqlite(words, kinds, limit)
+
+
+# --- Rebuilds ---------------------------------------------------------------
+
+def rebuild(tournament_id=None):
+    """Rewrite the FTS5 rows (all, or one tournament's) and reload the prefix index."""
+    connection = db.session.connection()
+    if _uses_fts(connection):
+        rows = _all_rows().subquery()
+        selected = select(rows)
+        if tournament_id is None:
+            connection.execute(text('DELETE FROM search_index'))
+        else:
+            kind, entity_id = rows.c.kind, rows.c.id
+            selected = selected.where(db.or_(
+                db.and_(kind == 'player', entity_id.in_(
+                    select(Player.id).join(Team, Team.id == Player.team_id).where(Team.tournament_id == tournament_id))),
+                db.and_(kind == 'team', entity_id.in_(select(Team.id).where(Team.tournament_id == tournament_id))),
+                db.and_(kind == 'tournament', entity_id == tournament_id),
+            ))
+        batch = []
+        for row in db.session.execute(selected.execution_options(yield_per=FTS_BATCH)):
+            batch.append(tuple(row))
+            if len(batch) >= FTS_BATCH:
+                _fts_write(connection, batch)
+                batch = []
+        _fts_write(connection, batch)
+    db.session.commit()
+    refresh_prefix_index(force=True)
+    return len(prefix_index)
+
+
+@task('search.reindex')
+def reindex_tournament(tournament_id):
+    rebuild(tournament_id)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Search index maintenance.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('rebuild')
+    query_parser = sub.add_parser('query')
+    query_parser.add_argument('q')
+    args = parser.parse_args()
+
+    from app import app
+
+    with app.app_context():
+        if args.command == 'rebuild':
+            print(f"Indexed {rebuild()} names")
+        else:
+            started = time.perf_counter()
+            results = search(args.q)
+            for result in results:
+                print(f"{result['kind']:<10} {result['id']:>8}  {result['title']}  ({result['subtitle']})")
+            print(f"{len(results)} results in {(time.perf_counter() - started) * 1000:.1f} ms")
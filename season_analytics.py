@@ -0,0 +1,220 @@
+"""Season analytics: Elo ratings and Monte Carlo projections per tournament.
+
+A tournament's results and remaining fixtures are loaded once into compact
+NumPy arrays (team indexes, scores). Ratings are updated batch by batch: a
+batch holds matches with no team in common, placed after every earlier match
+of both teams, so the vectorized update gives exactly the sequential Elo
+result in about one step per round.
+
+The remaining fixtures are then simulated SIMULATIONS times with Poisson
+goals driven by the rating gap. Simulations run in chunks, each a few array
+operations over (chunk, fixtures), spread over a process pool. Every chunk
+gets its own child SeedSequence, so a seed gives the same odds whatever the
+worker count. The outcome is stored as a TournamentProjection snapshot, which
+the standings page reads.
+
+Usage:
+    python season_analytics.py 3 --simulations 20000 --workers 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sqlalchemy import select
+
+from extensions import db
+from models import Team, Match, TournamentProjection
+
+INITIAL_RATING = 1500.0
+K_FACTOR = 20.0
+HOME_ADVANTAGE = 60.0  # Rating points
+GOAL_SCALE = 800.0  # A 800 point gap multiplies the stronger side's expected goals by 10
+DEFAULT_GOALS = 1.3  # Per team per match when nothing has been played yet
+
+SIMULATIONS = 10000
+CHUNK_SIZE = 2000
+RELEGATION_PLACES = 3
+
+
+def load_season(tournament_id):
+    """Team ids plus (home, away, home_goals, away_goals) index arrays for played and remaining matches."""
+    team_ids = db.session.scalars(
+        select(Team.id).where(Team.tournament_id == tournament_id).order_by(Team.id)).all()
+    index = {team_id: i for i, team_id in enumerate(team_ids)}
+    rows = db.session.execute(
+        select(Match.home_team_id, Match.away_team_id, Match.home_score, Match.away_score, Match.status)
+        .where(Match.tournament_id == tournament_id)
+        .order_by(Match.match_date, Match.id)
+    ).all()
+
+    played = [(index[h], index[a], hs or 0, as_ or 0) for h, a, hs, as_, status in rows
+              if status == 'completed' and h in index and a in index]
+    remaining = [(index[h], index[a]) for h, a, _, _, status in rows
+                 if status != 'completed' and h in index and a in index]
+    played = np.array(played, dtype=np.int32).reshape(-1, 4)
+    remaining = np.array(remaining, dtype=np.int32).reshape(-1, 2)
+    return team_ids, played, remaining
+
+
+def _batches(home, away, n_teams):
+    """Batch number of every match: one past the latest batch of either team."""
+    last = np.full(n_teams, -1, dtype=np.int32)
+    batch = np.empty(len(home), dtype=np.int32)
+    for i, (h, a) in enumerate(zip(home.tolist(), away.tolist())):
+        batch[i] = max(last[h], last[a]) + 1
+        last[h] = last[a] = batch[i]
+    return batch
+
+
+def elo_ratings(played, n_teams):
+    ratings = np.full(n_teams, INITIAL_RATING)
+    if not len(played):
+        return ratings
+    home, away, home_goals, away_goals = played.T
+    score = np.where(home_goals > away_goals, 1.0, np.where(home_goals == away_goals, 0.5, 0.0))
+    margin = np.log1p(np.abs(home_goals - away_goals)) + 1.0
+    batch = _batches(home, away, n_teams)
+    order = np.argsort(batch, kind='stable')
+    bounds = np.flatnonzero(np.diff(batch[order])) + 1
+    for rows in np.split(order, bounds):
+        h, a = home[rows], away[rows]
+        expected = 1.0 / (1.0 + 10.0 ** ((ratings[a] - ratings[h] - HOME_ADVANTAGE) / 400.0))
+        delta = K_FACTOR * margin[rows] * (score[rows] - expected)
+        ratings[h] += delta
+        ratings[a] -= delta
+    return ratings
+
+
+def table(played, n_teams):
+    """Current points, goal difference and goals for, as arrays indexed like the teams."""
+    points = np.zeros(n_teams, dtype=np.int64)
+    goal_difference = np.zeros(n_teams, dtype=np.int64)
+    goals_for = np.zeros(n_teams, dtype=np.int64)
+    if len(played):
+        home, away, home_goals, away_goals = played.T
+        home_points = np.where(home_goals > away_goals, 3, np.where(home_goals == away_goals, 1, 0))
+        away_points = np.where(away_goals > home_goals, 3, np.where(home_goals == away_goals, 1, 0))
+        np.add.at(points, home, home_points)
+        np.add.at(points, away, away_points)
+        np.add.at(goal_difference, home, home_goals - away_goals)
+        np.add.at(goal_difference, away, away_goals - home_goals)
+        np.add.at(goals_for, home, home_goals)
+        np.add.at(goals_for, away, away_goals)
+    return points, goal_difference, goals_for
+
+
+def expected_goals(ratings, remaining, mean_goals):
+    gap = ratings[remaining[:, 0]] + HOME_ADVANTAGE - ratings[remaining[:, 1]]
+    return mean_goals * 10.0 ** (gap / GOAL_SCALE), mean_goals * 10.0 ** (-gap / GOAL_SCALE)
+
+
+def _simulate_chunk(args):
+    """Simulate one chunk of seasons; return (position counts [team, place], points sum per team)."""
+    seed, size, base, remaining, home_rate, away_rate = args
+    rng = np.random.default_rng(seed)
+    points, goal_difference, goals_for = (np.broadcast_to(column, (size, len(column))) for column in base)
+    n_teams = len(base[0])
+    if len(remaining):
+        home_goals = rng.poisson(home_rate, (size, len(remaining))).astype(np.float64)
+        away_goals = rng.poisson(away_rate, (size, len(remaining))).astype(np.float64)
+        # One-hot fixture -> team matrices turn per-fixture results into per-team totals with a
+        # matmul; float64 so it goes through BLAS (integer matmul does not)
+        home_onehot = np.zeros((len(remaining), n_teams))
+        away_onehot = np.zeros((len(remaining), n_teams))
+        fixtures = np.arange(len(remaining))
+        home_onehot[fixtures, remaining[:, 0]] = 1
+        away_onehot[fixtures, remaining[:, 1]] = 1
+        home_points = np.where(home_goals > away_goals, 3.0, np.where(home_goals == away_goals, 1.0, 0.0))
+        away_points = np.where(away_goals > home_goals, 3.0, np.where(home_goals == away_goals, 1.0, 0.0))
+        points = points + home_points @ home_onehot + away_points @ away_onehot
+        goal_difference = goal_difference + (home_goals - away_goals) @ (home_onehot - away_onehot)
+        goals_for = goals_for + home_goals @ home_onehot + away_goals @ away_onehot
+
+    # Same ordering as the standings (points, goal difference, goals for), random draw for exact ties
+    order = np.lexsort((rng.random((size, n_teams)), -goals_for, -goal_difference, -points), axis=-1)
+    places = np.empty_like(order)
+    np.put_along_axis(places, order, np.broadcast_to(np.arange(n_teams), order.shape), axis=-1)
+    cells = (np.arange(n_teams) * n_teams + places).ravel()
+    counts = np.bincount(cells, minlength=n_teams * n_teams).reshape(n_teams, n_teams)
+    return counts, points.sum(axis=0)
+
+
+def simulate(base, remaining, home_rate, away_rate, simulations=SIMULATIONS, workers=None, seed=None):
+    """Run the simulations in chunks, over a process pool when more than one worker is useful."""
+    sizes = [min(CHUNK_SIZE, simulations - start) for start in range(0, simulations, CHUNK_SIZE)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    chunks = [(s, size, base, remaining, home_rate, away_rate) for s, size in zip(seeds, sizes)]
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    if workers > 1:
+        # spawn: the web process runs bus and server threads, which fork() would copy mid-flight
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results = list(pool.map(_simulate_chunk, chunks))
+    else:
+        results = [_simulate_chunk(chunk) for chunk in chunks]
+    counts = sum(result[0] for result in results)
+    points = sum(result[1] for result in results)
+    return counts, points
+
+
+def project_tournament(tournament_id, simulations=SIMULATIONS, workers=None, seed=None):
+    """Compute ratings and projections for a tournament and store them as a new snapshot."""
+    team_ids, played, remaining = load_season(tournament_id)
+    n_teams = len(team_ids)
+    if n_teams < 2:
+        return None
+
+    ratings = elo_ratings(played, n_teams)
+    base = table(played, n_teams)
+    mean_goals = played[:, 2:].mean() if len(played) else DEFAULT_GOALS
+    home_rate, away_rate = expected_goals(ratings, remaining, mean_goals)
+    counts, points = simulate(base, remaining, home_rate, away_rate, simulations, workers, seed)
+
+    relegation = min(RELEGATION_PLACES, n_teams // 4)
+    names = dict(db.session.execute(select(Team.id, Team.name).where(Team.id.in_(team_ids))).all())
+    teams = []
+    for i, team_id in enumerate(team_ids):
+        teams.append({
+            'team_id': team_id,
+            'name': names[team_id],
+            'rating': round(float(ratings[i]), 1),
+            'points': int(base[0][i]),
+            'expected_points': round(float(points[i]) / simulations, 2),
+            'title_odds': round(float(counts[i, 0]) / simulations, 4),
+            'relegation_odds': round(float(counts[i, n_teams - relegation:].sum()) / simulations, 4),
+            'positions': [round(float(c) / simulations, 4) for c in counts[i]],
+        })
+    teams.sort(key=lambda team: (-team['expected_points'], -team['rating']))
+
+    projection = TournamentProjection(
+        tournament_id=tournament_id,
+        simulations=simulations,
+        completed_matches=len(played),
+        remaining_matches=len(remaining),
+        payload=json.dumps(teams)
+    )
+    db.session.add(projection)
+    db.session.commit()
+    return projection
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compute ratings and Monte Carlo projections for a tournament.')
+    parser.add_argument('tournament_id', type=int)
+    parser.add_argument('--simulations', type=int, default=SIMULATIONS)
+    parser.add_argument('--workers', type=int, default=None, help='Process pool size (default: CPU count)')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    from app import app
+
+    with app.app_context():
+        db.create_all()
+        projection = project_tournament(args.tournament_id, args.simulations, args.workers, args.seed)
+        if projection is None:
+            parser.exit(1, 'Tournament needs at least 2 teams\n')
+        for team in projection.to_dict()['teams']:
+            print(f"{team['name']:<30} {team['rating']:>7.1f} {team['expected_points']:>6.1f} pts  "
+                  f"title {team['title_odds']:>6.1%}  relegation {team['relegation_odds']:>6.1%}")
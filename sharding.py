@@ -0,0 +1,463 @@
+"""Tournament-sharded deployment mode.
+
+Each tournament and everything hanging off it (teams, players, matches,
+events, stats, performances, projections) lives in one shard database. The
+primary database (SQLALCHEMY_DATABASE_URI) is shard 0. It also keeps the
+global tables: users, jobs, live events and the search index. Extra shards
+are listed in SHARD_DATABASES and become Flask-SQLAlchemy binds:
+
+    SHARD_DATABASES="1=sqlite:////srv/shard1.db,2=sqlite:////srv/shard2.db"
+
+Ids say where a row lives. `python sharding.py init` starts every
+autoincrement id of shard n at n * SHARD_ID_SPAN, so shard_of(id) is
+id // SHARD_ID_SPAN for a tournament, team, player or match id alike. No
+directory lookup is needed, and ids stay unique across shards, so the
+identity map and URLs are unchanged.
+
+ShardSession routes statements without callers knowing:
+
+  * flushed objects go to the shard of their own id or, when new, of their
+    tournament_id / team_id / match_id / player_id. A new tournament goes to
+    NEW_TOURNAMENT_SHARD, or else to the shard holding the fewest
+    tournaments;
+  * queries on sharded tables go to the shard(s) named by an id compared in
+    their criteria or parameters (this covers get(), lazy loads, filters and
+    bulk writes). Otherwise they use the request's shard (picked from the
+    URL id by use_request_shard) or the shard set with use_shard(). A read
+    with no shard at all fans out to every shard and the results are
+    concatenated. Counts, sums, minimums and maximums are folded into one
+    row; other aggregates raise ShardingError;
+  * merge() re-sorts and trims fanned-out lists, for the cross-shard list
+    pages.
+
+A transaction writing to a shard and to the primary database (a score
+change and its live_event, a final whistle and its jobs) commits the shard
+first and the primary last. There is no two-phase commit: if the second
+commit fails, the match write stands without its events and jobs, but no
+event or job ever refers to a write that was not committed.
+
+Known gaps: search only indexes shard 0, and the coach and referee foreign
+keys (to users on the main database) are not enforced in the shards.
+
+Usage:
+    python sharding.py init      # create the shard schemas and id ranges
+    python sharding.py status    # tournaments per shard
+"""
+import argparse
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import current_app, g, has_app_context
+from sqlalchemy import MetaData, Select, event, func, select, text
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.sql.lambdas import StatementLambdaElement
+from sqlalchemy.sql.util import find_tables
+
+from sqlite_backend import RoutingSession, read_bind
+
+SHARD_ID_SPAN = 100_000_000  # Ids per shard; PostgreSQL INTEGER columns allow shards 0-20
+
+# Sharded tables and the column naming their owner, used for new rows
+SHARD_KEYS = {
+    'tournament': 'id',
+    'team': 'tournament_id',
+    'match': 'tournament_id',
+    'tournament_projection': 'tournament_id',
+    'player': 'team_id',
+    'player_stats': 'player_id',
+    'match_update': 'match_id',
+    'match_update_archive': 'match_id',
+    'match_summary': 'match_id',
+    'match_stats': 'match_id',
+    'match_stats_snapshot': 'match_id',
+    'player_match_performance': 'match_id',
+    'match_referees': 'match_id',
+}
+# Id columns of sharded tables whose value locates the row's shard
+ID_COLUMNS = {'id', 'tournament_id', 'team_id', 'home_team_id', 'away_team_id', 'match_id', 'player_id'}
+
+_shard = ContextVar('shard', default=None)
+
+
+class ShardingError(RuntimeError):
+    pass
+
+
+def shard_of(entity_id):
+    return int(entity_id) // SHARD_ID_SPAN
+
+
+def _bind_key(shard):
+    return None if shard == 0 else f'shard{shard}'
+
+
+def parse_shards(value):
+    """'1=url,2=url' -> {1: url, 2: url}"""
+    shards = {}
+    for entry in filter(None, (part.strip() for part in (value or '').split(','))):
+        number, _, url = entry.partition('=')
+        if not number.strip().isdigit() or int(number) < 1 or not url:
+            raise ValueError(f'Invalid SHARD_DATABASES entry: {entry}')
+        shards[int(number)] = url.strip()
+    return shards
+
+
+def configure(app):
+    """Register the shards of SHARD_DATABASES as binds; call before the database is initialized."""
+    shards = parse_shards(app.config.get('SHARD_DATABASES', os.environ.get('SHARD_DATABASES')))
+    app.extensions['sharding'] = sorted([0, *shards])
+    binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+    for shard, url in shards.items():
+        binds[_bind_key(shard)] = url
+
+
+def shard_numbers():
+    """All shard numbers, [0] when sharding is off."""
+    return current_app.extensions.get('sharding', [0]) if has_app_context() else [0]
+
+
+def enabled():
+    return len(shard_numbers()) > 1
+
+
+def engine_for(db, shard):
+    try:
+        return db.engines[_bind_key(shard)]
+    except KeyError:
+        raise ShardingError(f'Unknown shard {shard}') from None
+
+
+@contextmanager
+def use_shard(shard):
+    """Route statements that name no shard to `shard` (a shard number) in this block."""
+    token = _shard.set(shard)
+    try:
+        yield
+    finally:
+        _shard.reset(token)
+
+
+def use_request_shard(entity_id):
+    """Default shard of the current request, from the tournament/team/match/player id in its URL (or None)."""
+    g.shard = None if entity_id is None else shard_of(entity_id)
+
+
+def current_shard():
+    shard = _shard.get()
+    if shard is None and has_app_context():
+        shard = g.get('shard')
+    return shard
+
+
+def merge(rows, key, reverse=False, limit=None):
+    """Order and trim rows gathered from several shards, each already ordered and limited."""
+    rows = sorted(rows, key=key, reverse=reverse)
+    return rows if limit is None else rows[:limit]
+
+
+def scalar_values(columns):
+    """Values of scalar subqueries, in one SELECT per shard they involve.
+
+    Subqueries on sharded tables that name no shard are evaluated on every shard,
+    so there may be more values than columns; they come back in a stable order.
+    """
+    from extensions import db
+    by_shard = {}
+    for column in columns:
+        if _is_sharded(find_tables(column, include_crud=True)):
+            shards = shards_in_clause(column) or shard_numbers()
+        else:
+            shards = [0]
+        for shard in shards:
+            by_shard.setdefault(shard, []).append(column)
+    values = []
+    for shard in sorted(by_shard):
+        values += db.session.execute(select(*by_shard[shard]), bind_arguments={'shard': shard}).one()
+    return tuple(values)
+
+
+# Locating shards
+
+def _is_sharded(tables):
+    return any(table.name in SHARD_KEYS for table in tables)
+
+
+def _column(element):
+    table = getattr(element, 'table', None)
+    if table is not None and getattr(table, 'name', None) in SHARD_KEYS and element.key in ID_COLUMNS:
+        return element
+    return None
+
+
+def _values(value):
+    if value is None:
+        return []
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+def shards_in_clause(clause, params=None):
+    """Shards named by `sharded id column == / IN value` comparisons anywhere in the statement."""
+    shards = set()
+    params = params if isinstance(params, dict) else {}
+    for element in visitors.iterate(clause):
+        if not isinstance(element, BinaryExpression) or element.operator not in (operators.eq, operators.in_op):
+            continue
+        column, bind = element.left, element.right
+        if not isinstance(bind, BindParameter):
+            column, bind = bind, column
+        if not isinstance(bind, BindParameter) or _column(column) is None:
+            continue
+        value = params[bind.key] if bind.key in params else bind.effective_value
+        shards.update(shard_of(v) for v in _values(value) if isinstance(v, int))
+    return shards
+
+
+def shards_in_parameters(table_names, parameters):
+    """Shards named by id values of INSERT/UPDATE parameters (one dict or an executemany list)."""
+    shards = set()
+    if not any(name in SHARD_KEYS for name in table_names):
+        return shards
+    for row in parameters if isinstance(parameters, (list, tuple)) else [parameters or {}]:
+        for name, value in row.items():
+            if name in ID_COLUMNS and isinstance(value, int):
+                shards.add(shard_of(value))
+                break
+    return shards
+
+
+def shard_for_instance(mapper, instance):
+    """The shard an object is written to: its own id, else its owner's id."""
+    table = mapper.local_table.name
+    if table not in SHARD_KEYS:
+        return None
+    for name in ('id', SHARD_KEYS[table]):
+        value = getattr(instance, name, None)
+        if value is not None:
+            return shard_of(value)
+    if table == 'tournament':
+        return placement()
+    shard = current_shard()
+    if shard is None:
+        raise ShardingError(f'No shard for new {mapper.class_.__name__}: set {SHARD_KEYS[table]} first')
+    return shard
+
+
+def placement():
+    """Shard for a new tournament: NEW_TOURNAMENT_SHARD, the current shard, or the emptiest one."""
+    configured = current_app.config.get('NEW_TOURNAMENT_SHARD', os.environ.get('NEW_TOURNAMENT_SHARD'))
+    if configured is not None:
+        return int(configured)
+    if current_shard() is not None:
+        return current_shard()
+    return min(shard_numbers(), key=lambda shard: (tournament_count(shard), shard))
+
+
+def tournament_count(shard):
+    # Never a second connection on a write engine: a SQLite writer pool holds one,
+    # which the flushing session may already have checked out
+    from extensions import db
+    reader = db.engines.get(read_bind(_bind_key(shard)))
+    if reader is not None:
+        with reader.connect() as conn:
+            return conn.scalar(text('SELECT count(*) FROM tournament'))
+    return db.session.connection(bind_arguments={'shard': shard}).scalar(text('SELECT count(*) FROM tournament'))
+
+
+class ShardSession(RoutingSession):
+    """RoutingSession that also sends tournament data to its shard."""
+
+    def flush(self, objects=None):
+        # Flushes ask for a connection per object instead of per mapper. Only while
+        # flushing: ORM bulk statements refuse to run with connection_callable set.
+        self.connection_callable = self._connection_for_instance if enabled() else None
+        try:
+            super().flush(objects)
+        finally:
+            self.connection_callable = None
+
+    def commit(self):
+        transaction = self._transaction
+        if enabled() and transaction is not None and transaction._parent is None and transaction.is_active:
+            # The primary database holds the live_event and job outboxes: commit it after the
+            # shards, so a failure in between loses notifications instead of announcing a write
+            # that never committed. SQLAlchemy itself commits connections in no set order.
+            transaction._prepare_impl()  # before_commit hooks and the last flush
+            primary = engine_for(self._db, 0)
+            for key, (connection, trans, should_commit, autoclose) in list(transaction._connections.items()):
+                if should_commit and connection.engine is not primary:
+                    if trans.is_active:
+                        trans.commit()
+                    transaction._connections[key] = (connection, trans, False, autoclose)
+        super().commit()
+
+    def _connection_for_instance(self, mapper, instance):
+        return self.connection(bind_arguments={'mapper': mapper, 'shard': shard_for_instance(mapper, instance)})
+
+    def get_bind(self, mapper=None, clause=None, bind=None, shard=None, **kwargs):
+        if bind is not None or not enabled():
+            return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if shard is None:
+            tables = list(mapper.tables) if mapper is not None else []
+            if clause is not None and not isinstance(clause, StatementLambdaElement):
+                tables += find_tables(clause, include_crud=True)
+            if not _is_sharded(tables):
+                return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+            shards = shards_in_clause(clause) if clause is not None else set()
+            if len(shards) > 1:
+                raise ShardingError(f'Statement spans shards {sorted(shards)}')
+            shard = shards.pop() if shards else current_shard()
+            if shard is None:
+                raise ShardingError('No shard for this statement: run it inside sharding.use_shard()')
+        return self._route(engine_for(self._db, shard), clause)
+
+
+def _statement_shards(orm_context, tables):
+    statement = orm_context.statement
+    if isinstance(statement, StatementLambdaElement):
+        statement = statement._resolved  # With this call's closure values
+    shards = shards_in_clause(statement, orm_context.parameters)
+    if not orm_context.is_select:
+        shards |= shards_in_parameters({table.name for table in tables}, orm_context.parameters)
+    if not shards and orm_context.lazy_loaded_from is not None:
+        parent = orm_context.lazy_loaded_from
+        parent_shard = shard_for_instance(parent.mapper, parent.obj())
+        shards = {parent_shard} if parent_shard is not None else set()
+    return shards
+
+
+def _total(values):
+    values = [value for value in values if value is not None]
+    return sum(values) if values else None
+
+
+def _extreme(pick):
+    def fold(values):
+        values = [value for value in values if value is not None]
+        return pick(values) if values else None
+    return fold
+
+
+# Aggregates of a fanned-out read that per-shard values can be folded into, by function name
+COMBINERS = {'count': _total, 'sum': _total, 'total': _total, 'max': _extreme(max), 'min': _extreme(min)}
+AGGREGATES = {*COMBINERS, 'avg', 'group_concat', 'string_agg', 'array_agg', 'json_group_array'}
+
+
+def _combiners(statement):
+    """Per-column folds when a fanned-out read is a single-row aggregate, else None.
+
+    Raises ShardingError for aggregates whose shard values cannot be combined
+    (averages, grouped aggregates, aggregates next to plain columns).
+    """
+    if not isinstance(statement, Select):
+        return None
+    names = []
+    for column in statement.selected_columns:
+        element = getattr(column, 'element', column)  # Unwrap labels
+        names.append(element.name.lower() if isinstance(element, FunctionElement) else None)
+    if not AGGREGATES.intersection(names):
+        return None
+    if statement._group_by_clauses or not all(name in COMBINERS for name in names):
+        raise ShardingError('Aggregate over every shard cannot be combined: run it per shard with use_shard()')
+    return [COMBINERS[name] for name in names]
+
+
+@event.listens_for(ShardSession, 'do_orm_execute')
+def _route_orm_execute(orm_context):
+    """Send an ORM statement to the shard(s) its ids name, fanning reads out when they name none."""
+    if 'shard' in orm_context.bind_arguments or not enabled():
+        return None
+    tables = [table for mapper in orm_context.all_mappers for table in mapper.tables]
+    if not isinstance(orm_context.statement, StatementLambdaElement):
+        tables += find_tables(orm_context.statement, include_crud=True)
+    if not _is_sharded(tables):
+        return None
+    shards = _statement_shards(orm_context, tables)
+    if not shards and current_shard() is not None:
+        shards = {current_shard()}
+    if not shards:
+        if not orm_context.is_select:
+            raise ShardingError('No shard for this write: run it inside sharding.use_shard()')
+        shards = set(shard_numbers())
+    if len(shards) > 1 and not orm_context.is_select:
+        raise ShardingError(f'Write spans shards {sorted(shards)}: split it per shard')
+    combine = _combiners(orm_context.statement) if len(shards) > 1 else None
+    results = []
+    for shard in sorted(shards):
+        # use_shard too: bulk INSERT/UPDATE ask for their connection by mapper alone
+        with use_shard(shard):
+            results.append(orm_context.invoke_statement(bind_arguments={'shard': shard}))
+    if len(results) == 1:
+        return results[0]
+    if combine is None:
+        return results[0].merge(*results[1:])
+    # One aggregate row per shard: fold them into the single row the caller expects
+    frozen = results[0].freeze()
+    rows = list(frozen.data) + [tuple(result.one()) for result in results[1:]]
+    return frozen.with_new_rows([tuple(fn(values) for fn, values in zip(combine, zip(*rows)))])()
+
+
+# Shard setup
+
+def _shard_tables(metadata):
+    copy = MetaData()
+    tables = []
+    for table in metadata.tables.values():
+        if table.name in SHARD_KEYS:
+            table = table.to_metadata(copy)
+            for constraint in list(table.foreign_key_constraints):
+                if constraint.elements[0].target_fullname.split('.')[0] not in SHARD_KEYS:
+                    # Coaches and referees are users, which stay on the main database
+                    table.constraints.discard(constraint)
+                    for element in constraint.elements:
+                        element.parent.foreign_keys.discard(element)
+                        table.foreign_keys.discard(element)
+            if list(table.primary_key.columns.keys()) == ['id']:
+                # AUTOINCREMENT keeps the id sequence in sqlite_sequence, where it can start at the offset
+                table.dialect_options['sqlite']['autoincrement'] = True
+            tables.append(table)
+    return copy, tables
+
+
+def init_shard(engine, shard, metadata):
+    """Create the sharded tables in a shard database and start their ids at its range."""
+    copy, tables = _shard_tables(metadata)
+    copy.create_all(engine, tables=tables)
+    offset = shard * SHARD_ID_SPAN
+    with engine.begin() as conn:
+        for table in tables:
+            if list(table.primary_key.columns.keys()) != ['id']:
+                continue
+            current = conn.scalar(select(func.max(table.c.id))) or 0
+            if current >= offset:
+                continue
+            if engine.dialect.name == 'sqlite':
+                conn.execute(text('DELETE FROM sqlite_sequence WHERE name = :name'), {'name': table.name})
+                conn.execute(text('INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)'),
+                             {'name': table.name, 'seq': offset})
+            elif engine.dialect.name == 'postgresql':
+                conn.execute(text("SELECT setval(pg_get_serial_sequence(:name, 'id'), :seq)"),
+                             {'name': table.name, 'seq': offset})
+            else:
+                raise ShardingError(f'Unsupported shard database: {engine.dialect.name}')
+    return [table.name for table in tables]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tournament shards.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('init', help='Create shard schemas and id ranges (idempotent)')
+    sub.add_parser('status', help='Tournaments per shard')
+    args = parser.parse_args()
+
+    from app import app
+    from extensions import db
+
+    with app.app_context():
+        for shard in shard_numbers():
+            if args.command == 'init' and shard:
+                init_shard(engine_for(db, shard), shard, db.metadata)
+            print(f"Shard {shard} ({engine_for(db, shard).url}): "
+                  f"{tournament_count(shard)} tournaments, ids from {shard * SHARD_ID_SPAN + 1}")
@@ -0,0 +1,352 @@
+"""Static snapshots of finished tournaments.
+
+Once every match of a tournament is completed, its pages never change.
+publish() renders them once through the app itself: the tournament detail
+page, standings, team and player pages, and the JSON of its projections,
+clashes and matches. Each 200 response is stored gzip-compressed under
+SNAPSHOT_DIR/<tournament id>/, next to a manifest.json that maps each URL to
+its file, content type, ETag and sizes. The snapshot is built in a staging
+directory and renamed into place, so readers never see half of one.
+
+serve() runs before the views. An anonymous GET for a published URL without
+a query string is answered from the snapshot: gzip as stored, or decompressed
+for clients that do not accept it. Nothing else is queried, and If-None-Match
+gets a 304. Everything else falls through to live rendering. Each process
+keeps the manifests in memory and re-reads them when SNAPSHOT_DIR changes.
+
+A write through the ORM to a published tournament's rows unpublishes it when
+the transaction commits, and the same transaction queues a delayed
+'tournament.snapshot' job. Bulk and Core statements bypass the mapper events,
+so their writers call mark_stale() themselves. The job, also queued with
+every final whistle, publishes again once the post-match jobs have caught up.
+
+Usage:
+    python snapshots.py publish 3 [--force]   # --force: even if matches remain
+    python snapshots.py publish-finished
+    python snapshots.py unpublish 3
+    python snapshots.py list
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+from flask import Response, current_app, has_app_context, request
+from flask_login import current_user
+from sqlalchemy import event, select, func, case
+from sqlalchemy.orm import Session, object_session
+
+from extensions import db
+from http_cache import DEFAULT_MAX_AGE, DEFAULT_SHARED_MAX_AGE
+from jobs import task, enqueue
+from models import (Tournament, Team, Player, Match, MatchUpdate, MatchStats, MatchStatsSnapshot, PlayerStats,
+                    PlayerMatchPerformance, TournamentProjection, Job)
+
+MANIFEST = 'manifest.json'
+SNAPSHOT_DELAY = 60  # Seconds after a final whistle, leaving time for the post-match jobs
+RENDER_FLAG = 'snapshots.render'  # WSGI environ key of publish()'s own requests
+
+TOURNAMENT_URLS = ('/tournaments/{id}', '/tournaments/{id}/standings',
+                   '/api/tournaments/{id}/projections', '/api/tournaments/{id}/clashes')
+TEAM_URLS = ('/teams/{id}',)
+PLAYER_URLS = ('/players/{id}',)
+MATCH_URLS = ('/api/matches/{id}/live', '/api/matches/{id}/stats/series')
+
+# Post-match and post-import jobs whose results the pages show
+PENDING_JOBS = ('match.player_stats', 'match.ratings', 'tournament.player_stats', 'tournament.ratings',
+                'tournament.projection')
+
+
+def snapshot_root():
+    return current_app.config.get('SNAPSHOT_DIR') or os.path.join(current_app.instance_path, 'snapshots')
+
+
+class SnapshotIndex:
+    """The manifests under a snapshot directory, reloaded when the directory changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._root = None
+        self._stamp = None
+        self.urls = {}        # url -> (tournament directory, file entry)
+        self.owners = {}      # (kind, id) -> tournament id
+
+    def refresh(self, root):
+        try:
+            stamp = os.stat(root).st_mtime_ns
+        except FileNotFoundError:
+            stamp = None
+        if root == self._root and stamp == self._stamp:
+            return self
+        with self._lock:
+            urls, owners = {}, {}
+            for name in os.listdir(root) if stamp is not None else ():
+                if name.startswith('.'):
+                    continue  # Staging or trash directory
+                try:
+                    with open(os.path.join(root, name, MANIFEST)) as fp:
+                        manifest = json.load(fp)
+                except (FileNotFoundError, NotADirectoryError, ValueError):
+                    continue
+                directory = os.path.join(root, name)
+                urls.update((url, (directory, entry)) for url, entry in manifest['files'].items())
+                for kind, ids in manifest['entities'].items():
+                    owners.update(((kind, entity_id), manifest['tournament_id']) for entity_id in ids)
+            self.urls, self.owners = urls, owners
+            self._root, self._stamp = root, stamp
+        return self
+
+
+index = SnapshotIndex()
+
+
+def published():
+    return index.refresh(snapshot_root())
+
+
+def is_finished(tournament_id):
+    """True once the tournament has matches and all of them are completed."""
+    total, completed = db.session.execute(
+        select(func.count(), func.coalesce(func.sum(case((Match.status == 'completed', 1), else_=0)), 0))
+        .where(Match.tournament_id == tournament_id)).one()
+    return total > 0 and total == completed
+
+
+def _entities(tournament_id):
+    teams = db.session.scalars(select(Team.id).where(Team.tournament_id == tournament_id).order_by(Team.id)).all()
+    players = db.session.scalars(select(Player.id).join(Team, Team.id == Player.team_id)
+                                 .where(Team.tournament_id == tournament_id).order_by(Player.id)).all()
+    matches = db.session.scalars(select(Match.id).where(Match.tournament_id == tournament_id)
+                                 .order_by(Match.id)).all()
+    return {'tournament': [tournament_id], 'team': teams, 'player': players, 'match': matches}
+
+
+def snapshot_urls(entities):
+    urls = []
+    for kind, templates in (('tournament', TOURNAMENT_URLS), ('team', TEAM_URLS),
+                            ('player', PLAYER_URLS), ('match', MATCH_URLS)):
+        urls += [template.format(id=entity_id) for entity_id in entities[kind] for template in templates]
+    return urls
+
+
+def _file_path(url, mimetype):
+    return url.strip('/') + ('.json' if mimetype == 'application/json' else '.html') + '.gz'
+
+
+def _replace(directory, target):
+    """Move a directory into place (or None: remove target), leaving no partial state visible."""
+    trash = None
+    if os.path.exists(target):
+        trash = tempfile.mkdtemp(prefix='.trash-', dir=os.path.dirname(target))
+        os.replace(target, os.path.join(trash, 'old'))
+    if directory is not None:
+        os.replace(directory, target)
+    if trash is not None:
+        shutil.rmtree(trash, ignore_errors=True)
+
+
+def publish(tournament_id, force=False):
+    """Render and store a finished tournament's pages; returns the manifest, or None if not finished."""
+    import routes  # noqa: F401 - registers the views on the app (job workers only load app.py)
+
+    if db.session.get(Tournament, tournament_id) is None:
+        raise ValueError(f'Tournament {tournament_id} not found')
+    if not force and not is_finished(tournament_id):
+        return None
+    entities = _entities(tournament_id)
+    # The pages are rendered by requests with their own sessions: end this transaction so
+    # they neither wait for its SQLite write lock nor miss its changes
+    db.session.commit()
+    root = snapshot_root()
+    os.makedirs(root, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f'.{tournament_id}-', dir=root)
+    app, client, files = current_app._get_current_object(), current_app.test_client(), {}
+    try:
+        for url in snapshot_urls(entities):
+            with app.app_context():  # A fresh session and g per page, like a real request
+                response = client.get(url, environ_overrides={RENDER_FLAG: True})
+            if response.status_code != 200:
+                continue  # No projection computed, ...: stays live
+            body = response.get_data()
+            compressed = gzip.compress(body, 9, mtime=0)
+            path = _file_path(url, response.mimetype)
+            os.makedirs(os.path.join(staging, os.path.dirname(path)), exist_ok=True)
+            with open(os.path.join(staging, path), 'wb') as fp:
+                fp.write(compressed)
+            files[url] = {'path': path, 'content_type': response.content_type,
+                          'etag': hashlib.sha1(body).hexdigest()[:20],
+                          'size': len(body), 'compressed_size': len(compressed)}
+        if not files:
+            # Missing views or a broken page: fail the job rather than publish an empty snapshot
+            raise RuntimeError(f'No page of tournament {tournament_id} rendered')
+        manifest = {'tournament_id': tournament_id,
+                    'published_at': datetime.now(timezone.utc).replace(microsecond=0).isoformat(),
+                    'entities': entities, 'files': files}
+        with open(os.path.join(staging, MANIFEST), 'w') as fp:
+            json.dump(manifest, fp, indent=1)
+        _replace(staging, os.path.join(root, str(tournament_id)))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return manifest
+
+
+def unpublish(tournament_id):
+    _replace(None, os.path.join(snapshot_root(), str(tournament_id)))
+
+
+def serve():
+    """The snapshot response for the current request, or None to render it live."""
+    if request.method not in ('GET', 'HEAD') or request.query_string or request.environ.get(RENDER_FLAG):
+        return None
+    found = published().urls.get(request.path)
+    if found is None or current_user.is_authenticated:
+        return None
+    directory, entry = found
+    try:
+        with open(os.path.join(directory, entry['path']), 'rb') as fp:
+            body = fp.read()
+    except FileNotFoundError:
+        return None  # Unpublished meanwhile
+    if request.if_none_match.contains_weak(entry['etag']):
+        response = Response(status=304)
+    elif 'gzip' in request.accept_encodings:
+        response = Response(body, content_type=entry['content_type'])
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(gzip.decompress(body), content_type=entry['content_type'])
+    response.set_etag(entry['etag'], weak=True)
+    response.headers['Cache-Control'] = (
+        f'public, max-age={DEFAULT_MAX_AGE}, s-maxage={DEFAULT_SHARED_MAX_AGE}, '
+        f'stale-while-revalidate={DEFAULT_SHARED_MAX_AGE}'
+    )
+    response.vary.update(('Cookie', 'Accept-Encoding'))
+    return response
+
+
+# --- Unpublishing on writes ---------------------------------------------------
+
+# Model -> (kind, attribute) locating the published tournament a row belongs to
+OWNERS = {
+    Tournament: ('tournament', 'id'),
+    Team: ('tournament', 'tournament_id'),
+    Match: ('tournament', 'tournament_id'),
+    TournamentProjection: ('tournament', 'tournament_id'),
+    Player: ('team', 'team_id'),
+    PlayerStats: ('player', 'player_id'),
+    MatchUpdate: ('match', 'match_id'),
+    MatchStats: ('match', 'match_id'),
+    MatchStatsSnapshot: ('match', 'match_id'),
+    PlayerMatchPerformance: ('match', 'match_id'),
+}
+
+
+def mark_stale(session, kind, entity_ids):
+    """Unpublish the tournaments owning these rows when `session` commits."""
+    if session is None or not has_app_context():
+        return
+    owners = published().owners
+    if not owners:
+        return
+    stale = {owners.get((kind, entity_id)) for entity_id in entity_ids} - {None}
+    if stale:
+        session.info.setdefault('stale_snapshots', set()).update(stale)
+
+
+def _on_write(kind, attribute):
+    def listener(mapper, connection, target):
+        mark_stale(object_session(target), kind, [getattr(target, attribute)])
+    return listener
+
+
+for _model, (_kind, _attribute) in OWNERS.items():
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event, _on_write(_kind, _attribute))
+
+
+@event.listens_for(Session, 'before_commit')
+def _queue_republish(session):
+    if session.in_nested_transaction() or not has_app_context() or not published().owners:
+        return  # Savepoints (enqueue() uses one) fire before_commit too
+    session.flush()  # Writes still pending mark their tournaments now, not during the commit
+    for tournament_id in session.info.get('stale_snapshots', ()):
+        enqueue('tournament.snapshot', delay=SNAPSHOT_DELAY, tournament_id=tournament_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _unpublish_stale(session):
+    for tournament_id in session.info.pop('stale_snapshots', ()):
+        unpublish(tournament_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_stale(session):
+    session.info.pop('stale_snapshots', None)
+
+
+@task('tournament.snapshot')
+def tournament_snapshot(tournament_id):
+    if not is_finished(tournament_id):
+        return
+    match_ids = db.session.scalars(select(Match.id).where(Match.tournament_id == tournament_id)).all()
+    pending = db.session.scalar(
+        select(Job.id).where(Job.status.in_(('queued', 'running')), Job.name.in_(PENDING_JOBS),
+                             Job.args.in_([json.dumps({'match_id': match_id}) for match_id in match_ids]
+                                          + [json.dumps({'tournament_id': tournament_id})])).limit(1))
+    if pending is not None:
+        # Stats, ratings or projection still being computed: try again later
+        enqueue('tournament.snapshot', delay=SNAPSHOT_DELAY, tournament_id=tournament_id)
+        return
+    publish(tournament_id)
+
+
+def publish_finished():
+    """Publish every finished tournament that has no snapshot yet. Returns their ids."""
+    done = {int(name) for name in os.listdir(snapshot_root()) if name.isdigit()} \
+        if os.path.isdir(snapshot_root()) else set()
+    ids = [tournament_id for tournament_id in db.session.scalars(select(Tournament.id).order_by(Tournament.id))
+           if tournament_id not in done and is_finished(tournament_id)]
+    for tournament_id in ids:
+        publish(tournament_id)
+    return ids
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Static snapshots of finished tournaments.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    publish_parser = sub.add_parser('publish')
+    publish_parser.add_argument('tournament_id', type=int)
+    publish_parser.add_argument('--force', action='store_true', help='Publish even if matches remain')
+    sub.add_parser('publish-finished')
+    unpublish_parser = sub.add_parser('unpublish')
+    unpublish_parser.add_argument('tournament_id', type=int)
+    sub.add_parser('list')
+    args = parser.parse_args()
+
+    from app import app
+
+    with app.app_context():
+        if args.command == 'publish':
+            manifest = publish(args.tournament_id, args.force)
+            if manifest is None:
+                raise SystemExit(f'Tournament {args.tournament_id} is not finished (use --force).')
+            print(f"Published {len(manifest['files'])} files for tournament {args.tournament_id}")
+        elif args.command == 'publish-finished':
+            print(f"Published tournaments: {publish_finished() or 'none'}")
+        elif args.command == 'unpublish':
+            unpublish(args.tournament_id)
+            print(f"Unpublished tournament {args.tournament_id}")
+        else:
+            by_tournament = {}
+            for directory, entry in published().urls.values():
+                sizes = by_tournament.setdefault(os.path.basename(directory), [0, 0, 0])
+                sizes[0] += 1
+                sizes[1] += entry['size']
+                sizes[2] += entry['compressed_size']
+            for name, (count, size, compressed) in sorted(by_tournament.items()):
+                print(f"Tournament {name}: {count} files, {size} bytes ({compressed} compressed)")
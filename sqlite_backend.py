@@ -0,0 +1,333 @@
+"""Production profile for running on a SQLite file.
+
+SQLite allows one writer at a time. With default settings, concurrent Gunicorn
+writers fail with "database is locked": each transaction starts as a reader
+and only asks for the write lock at its first write, so two such transactions
+deadlock, and SQLite fails one of them without waiting. When
+SQLALCHEMY_DATABASE_URI is a SQLite file, init_app() sets up:
+
+  * pragmas on every connection: WAL journal (readers never block the writer
+    and the writer never blocks readers), synchronous=NORMAL (durable at
+    checkpoints, no fsync per commit), a 64 MiB page cache, 256 MiB mmap and
+    a busy timeout;
+  * a write engine with one pooled connection per process whose transactions
+    start with BEGIN IMMEDIATE, so writers queue on the lock with the busy
+    timeout instead of deadlocking;
+  * a read engine (the READ_BIND bind) with a larger pool of query_only
+    connections. SQLite binds get the same pair, the reader as
+    '<bind>_read';
+  * RoutingSession, which sends a session's SELECTs (and bare connection()
+    calls) to the read engine during GET/HEAD requests until the session
+    first writes. Everything else uses the
+    write engine: other requests, CLIs and job workers;
+  * a per-process writer thread. Live scoring views decorated with
+    @serialized_write run there one at a time, so they queue in order instead
+    of competing for the connection.
+
+Other databases are left untouched, and serialized_write runs views inline.
+
+Usage:
+    python sqlite_backend.py bench --processes 4 --threads 4 --seconds 10
+"""
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import queue
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
+from flask import current_app, copy_current_request_context, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, select, insert, update
+
+READ_BIND = 'sqlite_read'
+BUSY_TIMEOUT = 30  # Seconds a writer waits for the lock before failing
+READ_POOL_SIZE = 8
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64 * 1024,  # KiB
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'busy_timeout': BUSY_TIMEOUT * 1000,
+}
+
+
+def is_sqlite_file(uri):
+    return uri.startswith('sqlite') and ':memory:' not in uri and not uri.endswith('://')
+
+
+def install(engine, readonly=False):
+    """Apply the connection pragmas and transaction mode to a SQLite engine."""
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        # Take over BEGIN from the driver so the lock mode can be chosen below
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        if readonly:
+            cursor.execute('PRAGMA query_only=ON')
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def on_begin(conn):
+        conn.exec_driver_sql('BEGIN' if readonly else 'BEGIN IMMEDIATE')
+
+    return engine
+
+
+def engine_options(options=None, readonly=False):
+    """Engine options of the write (one connection) or read (pooled) engine."""
+    return {
+        **(options or {}),
+        'pool_size': READ_POOL_SIZE if readonly else 1,
+        'max_overflow': 0,
+        'pool_timeout': BUSY_TIMEOUT,
+        'connect_args': {'timeout': BUSY_TIMEOUT, 'check_same_thread': False},
+    }
+
+
+def read_bind(key):
+    """Bind key of the read engine paired with the write engine of bind `key` (None: the default)."""
+    return READ_BIND if key is None else f'{key}_read'
+
+
+def init_app(app, db):
+    """Initialize `db` on the app, with the SQLite profile for every bind that is a SQLite file."""
+    options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+    writers = {None: {'url': app.config['SQLALCHEMY_DATABASE_URI'], **options}}
+    writers.update((key, value if isinstance(value, dict) else {'url': value, **options})
+                   for key, value in list(binds.items()))
+    sqlite = [key for key, value in writers.items() if is_sqlite_file(value['url'])]
+    for key in sqlite:
+        if key is None:
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(options)
+        else:
+            binds[key] = {'url': writers[key]['url'], **engine_options(writers[key])}
+        binds[read_bind(key)] = {'url': writers[key]['url'], **engine_options(writers[key], readonly=True)}
+    db.init_app(app)
+    with app.app_context():
+        for key in sqlite:
+            install(db.engines[key])
+            install(db.engines[read_bind(key)], readonly=True)
+
+
+def read_engine(db):
+    """The engine for background reads: the read pool on SQLite, else the default engine."""
+    return db.engines.get(READ_BIND, db.engine)
+
+
+def _is_read(clause):
+    return getattr(clause, 'is_select', False) and getattr(clause, '_for_update_arg', None) is None
+
+
+class RoutingSession(Session):
+    """Session that reads from the SQLite read pool during read-only requests."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        return engine if bind is not None else self._route(engine, clause)
+
+    def _route(self, engine, clause):
+        """The read engine paired with write engine `engine` when `clause` may use it."""
+        engines = self._db.engines
+        reader = next((engines[read_bind(key)] for key, candidate in engines.items()
+                       if candidate is engine and read_bind(key) in engines), None)
+        if reader is None:
+            return engine
+        if (not self.info.get('wrote') and not self._flushing and (clause is None or _is_read(clause))
+                and has_request_context() and request.method in READ_METHODS):
+            return reader  # Including a bare connection() or get_bind() for the dialect
+        if clause is None and not self._flushing:
+            return engine  # get_bind() asked for the dialect, nothing was written
+        # Once written, read your own writes from the write connection
+        self.info['wrote'] = True
+        return engine
+
+
+class WriteQueue:
+    """A thread that runs submitted callables one at a time, in submission order."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _run(self):
+        while True:
+            future, fn, args, kwargs = self._queue.get()
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            # Started on first use, so each Gunicorn worker gets its own writer after the fork
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+                self._thread.start()
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+
+write_queue = WriteQueue()
+
+
+def serialized_write(view):
+    """Run a view on the process's writer thread when the app uses the SQLite profile."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if READ_BIND not in current_app.config.get('SQLALCHEMY_BINDS', {}):
+            return view(*args, **kwargs)
+        return write_queue.submit(copy_current_request_context(view), *args, **kwargs).result()
+    return wrapper
+
+
+# Benchmark: live scoring writes against match page reads, default settings vs this profile
+
+def _bench_engines(url, profile):
+    if profile == 'default':
+        # What the app used before: one pool, driver-managed deferred transactions
+        engine = create_engine(url, pool_recycle=300, pool_pre_ping=True)
+        return engine, engine
+    writer = install(create_engine(url, **engine_options()))
+    reader = install(create_engine(url, **engine_options(readonly=True)), readonly=True)
+    return writer, reader
+
+
+def _bench_seed(url, matches):
+    from models import Match, MatchUpdate
+    engine = create_engine(url)
+    Match.__table__.create(engine)
+    MatchUpdate.__table__.create(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Match.__table__), [
+            {'id': i, 'tournament_id': 1, 'home_team_id': 1, 'away_team_id': 2, 'match_date': datetime.utcnow(),
+             'status': 'in_progress', 'home_score': 0, 'away_score': 0} for i in range(1, matches + 1)])
+    engine.dispose()
+
+
+def _bench_process(url, profile, threads, seconds, write_ratio, matches, seed, results):
+    from models import Match, MatchUpdate
+    match, updates = Match.__table__, MatchUpdate.__table__
+    writer, reader = _bench_engines(url, profile)
+    writer_lock = threading.Lock() if profile == 'production' else None  # Stands in for the writer thread
+    deadline = time.perf_counter() + seconds
+    stats = {'reads': [], 'writes': [], 'errors': 0}
+    stats_lock = threading.Lock()
+
+    def write(conn, match_id):
+        score = conn.scalar(select(match.c.home_score).where(match.c.id == match_id))
+        conn.execute(update(match).where(match.c.id == match_id).values(home_score=score + 1))
+        conn.execute(insert(updates).values(match_id=match_id, minute=score, update_type='goal',
+                                            timestamp=datetime.utcnow()))
+
+    def read(conn, match_id):
+        conn.execute(select(match).where(match.c.id == match_id)).first()
+        conn.execute(select(updates).where(updates.c.match_id == match_id)
+                     .order_by(updates.c.timestamp.desc()).limit(10)).all()
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        reads, writes, errors = [], [], 0
+        while time.perf_counter() < deadline:
+            is_write = rng.random() < write_ratio
+            match_id = rng.randint(1, matches)
+            started = time.perf_counter()
+            try:
+                if is_write and writer_lock:
+                    with writer_lock, writer.begin() as conn:
+                        write(conn, match_id)
+                elif is_write:
+                    with writer.begin() as conn:
+                        write(conn, match_id)
+                else:
+                    with reader.begin() as conn:
+                        read(conn, match_id)
+            except Exception:
+                errors += 1
+                continue
+            (writes if is_write else reads).append(time.perf_counter() - started)
+        with stats_lock:
+            stats['reads'] += reads
+            stats['writes'] += writes
+            stats['errors'] += errors
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put(stats)
+
+
+def _percentile_ms(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(pct / 100 * len(values)))] * 1000, 2)
+
+
+def bench(profile, processes=4, threads=4, seconds=10.0, write_ratio=0.2, matches=50, seed=1):
+    """Concurrent read/write throughput of one profile on a fresh database file."""
+    directory = tempfile.mkdtemp(prefix='sqlite-bench-')
+    url = f'sqlite:///{os.path.join(directory, "bench.db")}'
+    _bench_seed(url, matches)
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    workers = [context.Process(target=_bench_process,
+                               args=(url, profile, threads, seconds, write_ratio, matches, seed + i, results))
+               for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    totals = {'reads': [], 'writes': [], 'errors': 0}
+    for _ in workers:
+        stats = results.get()
+        for key in totals:
+            totals[key] += stats[key]
+    for worker in workers:
+        worker.join()
+
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        goals = conn.exec_driver_sql('SELECT count(*) FROM match_update').scalar()
+        scored = conn.exec_driver_sql('SELECT sum(home_score) FROM match').scalar()
+    engine.dispose()
+    return {
+        'profile': profile,
+        'reads_per_s': round(len(totals['reads']) / seconds, 1),
+        'writes_per_s': round(len(totals['writes']) / seconds, 1),
+        'errors': totals['errors'],
+        'lost_updates': goals - scored,  # Committed goals missing from the scores
+        'read_ms': {'p50': _percentile_ms(totals['reads'], 50), 'p99': _percentile_ms(totals['reads'], 99)},
+        'write_ms': {'p50': _percentile_ms(totals['writes'], 50), 'p99': _percentile_ms(totals['writes'], 99)},
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='SQLite production profile tools.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    bench_parser = sub.add_parser('bench', help='Compare concurrent throughput with default settings')
+    bench_parser.add_argument('--processes', type=int, default=4, help='Like Gunicorn workers')
+    bench_parser.add_argument('--threads', type=int, default=4, help='Per process')
+    bench_parser.add_argument('--seconds', type=float, default=10.0)
+    bench_parser.add_argument('--write-ratio', type=float, default=0.2)
+    bench_parser.add_argument('--matches', type=int, default=50)
+    args = parser.parse_args()
+
+    reports = [bench(profile, args.processes, args.threads, args.seconds, args.write_ratio, args.matches)
+               for profile in ('default', 'production')]
+    print(json.dumps(reports, indent=2))
@@ -0,0 +1,222 @@
+"""Match statistics folded from the typed event stream.
+
+MatchStats is the running result of folding a match's events in order: each
+event increments counters or moves the possession accumulator. Live requests
+fold only their new events onto the stored row and write it once per batch;
+rebuild_match_stats() folds the full MatchUpdate history from zero, so
+corrections can be replayed without double counting.
+
+Every change is also appended to MatchStatsSnapshot as one narrow row: the
+match minute (without added time, like MatchUpdate.minute) plus
+SNAPSHOT_FIELDS packed as little-endian int32 (64 bytes). MatchStats stays the
+current value (it is written in the same transaction as the latest snapshot),
+and stats_series() returns a match's whole evolution from a single range read
+on (match_id, id). Live writes add one snapshot per batch of events; a rebuild
+replays one snapshot per batch (the events sharing a timestamp), so both
+produce the same series. A rebuild keeps the stored rows (and their ids) up to
+the first snapshot that differs and rewrites only the rest, so clients polling
+with ?since= see an append-only series. When the snapshot they last saw was
+rewritten, stats_series() tells them to reset.
+
+Possession is time based: a `possession` event starts the clock for the side
+that won the ball, and the interval is credited when the ball changes hands or
+play stops (half time, final whistle).
+"""
+import struct
+from datetime import datetime
+
+from sqlalchemy import delete, insert
+
+from extensions import db
+from models import Match, MatchUpdate, MatchUpdateArchive, MatchStats, MatchStatsSnapshot, MatchSummary
+from snapshots import mark_stale
+import match_clock
+
+# Event type -> MatchStats counters incremented for the event's side
+COUNTERS = {
+    'shot': ('shots',),
+    'shot_on_target': ('shots', 'shots_on_target'),
+    'goal': ('shots', 'shots_on_target'),
+    'corner': ('corners',),
+    'foul': ('fouls',),
+    'yellow_card': ('yellow_cards',),
+    'red_card': ('red_cards',),
+}
+STOPPAGES = ('half_time', 'final_whistle')
+EVENT_TYPES = set(COUNTERS) | {'possession'}
+
+COUNTER_FIELDS = sorted({f'{side}_{name}' for names in COUNTERS.values() for name in names
+                         for side in ('home', 'away')})
+
+# Positional layout of stored snapshots: only ever append new fields at the end
+SNAPSHOT_FIELDS = COUNTER_FIELDS + ['home_possession_seconds', 'away_possession_seconds']
+
+
+def initial_state():
+    state = dict.fromkeys(COUNTER_FIELDS, 0)
+    state.update(home_possession_seconds=0, away_possession_seconds=0,
+                 possession_team=None, possession_since=None)
+    return state
+
+
+def _close_possession(state, at):
+    team, since = state['possession_team'], state['possession_since']
+    if team and since and at > since:
+        state[f'{team}_possession_seconds'] += int((at - since).total_seconds())
+    state['possession_since'] = at
+
+
+def fold(state, event_type, side, at):
+    """Apply one event to the state dict in place and return it."""
+    if side is None and event_type not in STOPPAGES:
+        return state
+    for name in COUNTERS.get(event_type, ()):
+        state[f'{side}_{name}'] += 1
+    if event_type == 'possession':
+        _close_possession(state, at)
+        state['possession_team'] = side
+    elif event_type in STOPPAGES:
+        _close_possession(state, at)
+        state['possession_team'] = None
+    return state
+
+
+def possession_percentages(state):
+    home, away = state['home_possession_seconds'], state['away_possession_seconds']
+    if home + away == 0:
+        return 50, 50
+    home_pct = round(home * 100 / (home + away))
+    return home_pct, 100 - home_pct
+
+
+def state_from_stats(stats):
+    state = initial_state()
+    for key in state:
+        value = getattr(stats, key)
+        if value is not None:
+            state[key] = value
+    return state
+
+
+def write_state(stats, state):
+    for key, value in state.items():
+        setattr(stats, key, value)
+    stats.home_possession, stats.away_possession = possession_percentages(state)
+
+
+def get_or_create_stats(match):
+    stats = match.stats_detail
+    if stats is None:
+        stats = MatchStats(match_id=match.id, home_possession=50, away_possession=50)
+        write_state(stats, initial_state())
+        db.session.add(stats)
+    return stats
+
+
+def side_of(match, team_id):
+    if team_id == match.home_team_id:
+        return 'home'
+    if team_id == match.away_team_id:
+        return 'away'
+    return None
+
+
+def pack(state):
+    return struct.pack(f'<{len(SNAPSHOT_FIELDS)}i', *(state[name] for name in SNAPSHOT_FIELDS))
+
+
+def unpack(values):
+    """Snapshot bytes -> {field: value}; older, shorter snapshots read missing fields as 0."""
+    unpacked = struct.unpack(f'<{len(values) // 4}i', values)
+    return {name: unpacked[i] if i < len(unpacked) else 0 for i, name in enumerate(SNAPSHOT_FIELDS)}
+
+
+def apply_events(match, events):
+    """Fold (event_type, side, timestamp) tuples onto the match's stats row; caller commits."""
+    stats = get_or_create_stats(match)
+    state = state_from_stats(stats)
+    before = pack(state)
+    at = datetime.utcnow()
+    for event_type, side, at in events:
+        at = at or datetime.utcnow()
+        fold(state, event_type, side, at)
+    write_state(stats, state)
+    values = pack(state)
+    if values != before:
+        minute, _ = match_clock.match_minute(match, at)
+        db.session.add(MatchStatsSnapshot(match_id=match.id, minute=minute, recorded_at=at, values=values))
+    return stats
+
+
+def rebuild_match_stats(match_id):
+    """Recompute a match's stats from zero by replaying its whole event history; caller commits."""
+    match = db.session.get(Match, match_id)
+    model = MatchUpdateArchive if db.session.get(MatchSummary, match_id) else MatchUpdate
+    rows = db.session.execute(
+        db.select(model.update_type, model.team_id, model.timestamp, model.minute)
+        .where(model.match_id == match_id)
+        .order_by(model.timestamp, model.id)
+        .execution_options(yield_per=1000)
+    )
+    state = initial_state()
+    snapshots, last, batch = [], pack(state), None
+
+    def snapshot():
+        values = pack(state)
+        if batch is not None and values != last:
+            snapshots.append({'match_id': match_id, 'minute': batch[0], 'recorded_at': batch[1], 'values': values})
+        return values
+
+    for event_type, team_id, at, minute in rows:
+        if batch is not None and at != batch[1]:
+            last = snapshot()  # The previous batch is complete
+        fold(state, event_type, side_of(match, team_id), at)
+        batch = (minute, at)
+    snapshot()
+    stats = get_or_create_stats(match)
+    write_state(stats, state)
+    stored = db.session.execute(
+        db.select(MatchStatsSnapshot.id, MatchStatsSnapshot.minute, MatchStatsSnapshot.recorded_at,
+                  MatchStatsSnapshot.values)
+        .where(MatchStatsSnapshot.match_id == match_id)
+        .order_by(MatchStatsSnapshot.id)
+    ).all()
+    kept = 0  # Unchanged leading snapshots keep their rows and ids
+    while (kept < len(stored) and kept < len(snapshots)
+           and tuple(stored[kept][1:]) == (snapshots[kept]['minute'], snapshots[kept]['recorded_at'],
+                                           snapshots[kept]['values'])):
+        kept += 1
+    if kept < len(stored):
+        db.session.execute(delete(MatchStatsSnapshot).where(
+            MatchStatsSnapshot.match_id == match_id, MatchStatsSnapshot.id >= stored[kept][0]))
+    if snapshots[kept:]:
+        db.session.execute(insert(MatchStatsSnapshot), snapshots[kept:])
+    mark_stale(db.session(), 'match', [match_id])  # Core statements skip the mapper events
+    return stats
+
+
+def stats_series(match_id, since=0):
+    """Columnar stat evolution of a match after snapshot `since`, from one range read.
+
+    Returns (series, reset). When a rebuild rewrote snapshot `since`, the whole
+    series is returned with reset=True so the client starts its chart over.
+    """
+    reset = bool(since) and db.session.scalar(
+        db.select(MatchStatsSnapshot.id).where(MatchStatsSnapshot.match_id == match_id,
+                                               MatchStatsSnapshot.id == since)) is None
+    if reset:
+        since = 0
+    rows = db.session.execute(
+        db.select(MatchStatsSnapshot.id, MatchStatsSnapshot.minute, MatchStatsSnapshot.recorded_at,
+                  MatchStatsSnapshot.values)
+        .where(MatchStatsSnapshot.match_id == match_id, MatchStatsSnapshot.id > since)
+        .order_by(MatchStatsSnapshot.id)
+    ).all()
+    series = {'id': [], 'minute': [], 'recorded_at': [], **{name: [] for name in SNAPSHOT_FIELDS}}
+    for snapshot_id, minute, recorded_at, values in rows:
+        series['id'].append(snapshot_id)
+        series['minute'].append(minute)
+        series['recorded_at'].append(recorded_at.isoformat() if recorded_at else None)
+        for name, value in unpack(values).items():
+            series[name].append(value)
+    return series, reset
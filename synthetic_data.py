@@ -0,0 +1,313 @@
+"""Synthetic league generator for load testing and benchmarks.
+
+Creates N tournaments x 32 teams x 25 players with a full double round-robin,
+MatchUpdate streams, MatchStats, PlayerMatchPerformance and PlayerStats rows.
+Everything goes through bulk Core inserts, one tournament at a time, so memory
+stays bounded by a single tournament's fixtures.
+
+Usage:
+    python synthetic_data.py --tournaments 3 --seed 42
+"""
+import argparse
+import random
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert
+
+from extensions import db
+from models import (Tournament, Team, Player, Match, MatchUpdate, MatchStats,
+                    PlayerStats, PlayerMatchPerformance)
+
+POSITIONS = ['goalkeeper'] * 3 + ['defender'] * 8 + ['midfielder'] * 8 + ['forward'] * 6
+CITIES = ['Casablanca', 'Rabat', 'Fès', 'Marrakech', 'Tanger', 'Agadir', 'Oujda', 'Meknès',
+          'Kénitra', 'Tétouan', 'Safi', 'El Jadida', 'Nador', 'Berkane', 'Khouribga', 'Settat']
+FIRST_NAMES = ['Achraf', 'Hakim', 'Youssef', 'Sofyan', 'Azzedine', 'Bilal', 'Nayef', 'Romain',
+               'Yassine', 'Munir', 'Abde', 'Selim', 'Amine', 'Ilias', 'Zakaria', 'Anass']
+LAST_NAMES = ['Hakimi', 'Ziyech', 'En-Nesyri', 'Amrabat', 'Ounahi', 'El Khannouss', 'Aguerd',
+              'Saiss', 'Bounou', 'Mohamedi', 'Ezzalzouli', 'Amallah', 'Harit', 'Akhomach',
+              'Attiat Allah', 'Dari']
+
+STARTERS = 11
+SUBSTITUTES = 3
+
+
+def round_robin(team_ids):
+    """Double round-robin pairings (circle method), returned as a list of rounds."""
+    ids = list(team_ids)
+    if len(ids) % 2:
+        ids.append(None)
+    half = len(ids) // 2
+    rounds = []
+    for r in range(len(ids) - 1):
+        pairs = []
+        for i in range(half):
+            home, away = ids[i], ids[-1 - i]
+            if home is not None and away is not None:
+                pairs.append((home, away) if r % 2 == 0 else (away, home))
+        rounds.append(pairs)
+        ids.insert(1, ids.pop())
+    return rounds + [[(away, home) for home, away in pairs] for pairs in rounds]
+
+
+def bulk_insert(model, rows, returning=False):
+    """Insert rows in one executemany; optionally return the new ids in input order."""
+    if not rows:
+        return []
+    if returning:
+        stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+        return list(db.session.scalars(stmt, rows))
+    db.session.execute(insert(model), rows)
+    return []
+
+
+def _pick_lineup(rng, squad):
+    """Choose starters and substitutes, always with one goalkeeper in the starting XI."""
+    keepers = [p for p in squad if p[1] == 'goalkeeper']
+    outfield = [p for p in squad if p[1] != 'goalkeeper']
+    starters = [rng.choice(keepers)] + rng.sample(outfield, STARTERS - 1)
+    bench = [p for p in squad if p not in starters and p[1] != 'goalkeeper']
+    return starters, rng.sample(bench, min(SUBSTITUTES, len(bench)))
+
+
+def _scorer(rng, lineup):
+    weights = [{'forward': 6, 'midfielder': 3, 'defender': 1}.get(p[1], 0) for p in lineup]
+    return rng.choices(lineup, weights=weights)[0] if any(weights) else rng.choice(lineup)
+
+
+def _simulate_match(rng, match_id, match, squads, kickoff, updates_per_match):
+    """Return (updates, stats, performances) rows for one completed match."""
+    home_id, away_id = match['home_team_id'], match['away_team_id']
+    home_score, away_score = match['home_score'], match['away_score']
+    lineups = {team_id: _pick_lineup(rng, squads[team_id]) for team_id in (home_id, away_id)}
+    perf, spells = {}, {}  # spells: player id -> [minute on, minute off]
+    for team_id, (starters, subs) in lineups.items():
+        for player in starters:
+            perf[player[0]], spells[player[0]] = {'is_playing': True}, [0, 90]
+        # Each substitute replaces a different outfield starter
+        for player, replaced in zip(subs, rng.sample(starters[1:], len(subs))):
+            sub_minute = rng.randint(46, 85)
+            spells[replaced[0]][1] = sub_minute
+            perf[player[0]], spells[player[0]] = {'is_playing': True}, [sub_minute, 90]
+
+    def on_pitch(team_id, minute):
+        starters, subs = lineups[team_id]
+        return [p for p in starters + subs if spells[p[0]][0] < minute <= spells[p[0]][1]]
+
+    def count(player, key):
+        perf[player[0]][key] = perf[player[0]].get(key, 0) + 1
+
+    def event(minute, update_type, team_id=None, player_id=None, description=''):
+        return {
+            'match_id': match_id, 'minute': minute, 'update_type': update_type,
+            'team_id': team_id, 'player_id': player_id, 'description': description,
+            'timestamp': kickoff + timedelta(minutes=minute + (15 if minute > 45 else 0)),
+        }
+
+    planned = [(rng.randint(1, 90), 'goal', team_id)
+               for team_id, goals in ((home_id, home_score), (away_id, away_score)) for _ in range(goals)]
+    for _ in range(updates_per_match - 2 - len(planned)):
+        planned.append((rng.randint(1, 90), 'yellow_card' if rng.random() < 0.8 else 'red_card',
+                        rng.choice((home_id, away_id))))
+    # Played in minute order, so every event goes to a player on the pitch at that minute
+    planned.sort(key=lambda planned_event: planned_event[0])
+
+    updates = [event(0, 'kickoff', description='🟢 Le match commence !')]
+    cards = {home_id: [0, 0], away_id: [0, 0]}
+    for minute, update_type, team_id in planned:
+        players = on_pitch(team_id, minute)
+        if update_type == 'goal':
+            scorer = _scorer(rng, players)
+            count(scorer, 'goals')
+            assisters = [p for p in players if p != scorer]
+            if assisters:
+                count(rng.choice(assisters), 'assists')
+            updates.append(event(minute, 'goal', team_id, scorer[0], f'⚽ BUT ! {scorer[2]} marque !'))
+            continue
+        # A red card sends a player off for good: only players not already due to leave get one
+        sendable = [p for p in players if spells[p[0]][1] == 90]
+        if update_type == 'red_card' and sendable:
+            player = rng.choice(sendable)
+            spells[player[0]][1] = minute
+            count(player, 'red_cards')
+            cards[team_id][1] += 1
+            updates.append(event(minute, 'red_card', team_id, player[0], f'🟥 {player[2]}'))
+        else:
+            player = rng.choice(players)
+            count(player, 'yellow_cards')
+            cards[team_id][0] += 1
+            updates.append(event(minute, 'yellow_card', team_id, player[0], f'🟨 {player[2]}'))
+    updates.append(event(90, 'final_whistle', description='🔴 Fin du match !'))
+    for player_id, (on, off) in spells.items():
+        perf[player_id]['minutes_played'] = off - on
+
+    home_possession = rng.randint(30, 70)
+    home_shots, away_shots = home_score + rng.randint(3, 15), away_score + rng.randint(3, 15)
+    stats = {
+        'match_id': match_id,
+        'home_possession': home_possession, 'away_possession': 100 - home_possession,
+        'home_shots': home_shots, 'away_shots': away_shots,
+        'home_shots_on_target': home_score + rng.randint(0, home_shots - home_score),
+        'away_shots_on_target': away_score + rng.randint(0, away_shots - away_score),
+        'home_corners': rng.randint(0, 12), 'away_corners': rng.randint(0, 12),
+        'home_fouls': rng.randint(5, 20), 'away_fouls': rng.randint(5, 20),
+        'home_yellow_cards': cards[home_id][0], 'away_yellow_cards': cards[away_id][0],
+        'home_red_cards': cards[home_id][1], 'away_red_cards': cards[away_id][1],
+    }
+
+    performances = []
+    for player_id, row in perf.items():
+        passes = rng.randint(10, 80) * row['minutes_played'] // 90
+        goals = row.get('goals', 0)
+        shots = goals + rng.randint(0, 4)
+        performances.append({
+            'player_id': player_id, 'match_id': match_id,
+            'goals': goals, 'assists': row.get('assists', 0),
+            'yellow_cards': row.get('yellow_cards', 0), 'red_cards': row.get('red_cards', 0),
+            'minutes_played': row['minutes_played'],
+            'shots': shots, 'shots_on_target': goals + rng.randint(0, shots - goals),
+            'passes': passes, 'passes_completed': int(passes * rng.uniform(0.6, 0.95)),
+            'tackles': rng.randint(0, 6), 'interceptions': rng.randint(0, 5),
+            'saves': rng.randint(0, 8) if player_id in (lineups[home_id][0][0][0], lineups[away_id][0][0][0]) else 0,
+            'is_selected': True, 'is_playing': row['is_playing'], 'created_at': kickoff,
+        })
+    return updates, stats, performances
+
+
+def generate_tournament(rng, index, teams_per_tournament=32, players_per_team=25,
+                        updates_per_match=12, played_ratio=0.75, start=date(2024, 8, 16)):
+    """Generate and bulk insert one full tournament graph. Returns row counts."""
+    tournament_id = bulk_insert(Tournament, [{
+        'name': f'Synthetic League {index + 1}',
+        'description': 'Generated by synthetic_data.py',
+        'start_date': start,
+        'end_date': start + timedelta(days=7 * 2 * (teams_per_tournament - 1)),
+        'max_teams': teams_per_tournament,
+        'status': 'active',
+    }], returning=True)[0]
+
+    team_ids = bulk_insert(Team, [{
+        'name': f'{CITIES[i % len(CITIES)]} FC {index + 1}-{i + 1}',
+        'city': CITIES[i % len(CITIES)],
+        'founded_year': rng.randint(1900, 2015),
+        'tournament_id': tournament_id,
+    } for i in range(teams_per_tournament)], returning=True)
+
+    squads = {}
+    for team_id in team_ids:
+        rows = [{
+            'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'position': POSITIONS[n % len(POSITIONS)],
+            'jersey_number': n + 1,
+            'age': rng.randint(17, 36),
+            'nationality': 'Moroccan',
+            'team_id': team_id,
+            'is_available': rng.random() > 0.05,
+        } for n in range(players_per_team)]
+        player_ids = bulk_insert(Player, rows, returning=True)
+        squads[team_id] = [(pid, row['position'], row['name']) for pid, row in zip(player_ids, rows)]
+
+    rounds = round_robin(team_ids)
+    played_rounds = int(len(rounds) * played_ratio)
+    match_rows = []
+    for round_number, pairs in enumerate(rounds, start=1):
+        match_day = datetime.combine(start + timedelta(days=7 * (round_number - 1)), datetime.min.time())
+        completed = round_number <= played_rounds
+        for home_id, away_id in pairs:
+            match_rows.append({
+                'tournament_id': tournament_id,
+                'home_team_id': home_id,
+                'away_team_id': away_id,
+                'match_date': match_day + timedelta(hours=rng.choice((15, 17, 19, 21))),
+                'venue': f'Stade {rng.choice(CITIES)}',
+                'home_score': rng.choices(range(6), weights=(25, 33, 23, 11, 5, 3))[0] if completed else 0,
+                'away_score': rng.choices(range(6), weights=(33, 33, 20, 9, 3, 2))[0] if completed else 0,
+                'status': 'completed' if completed else 'scheduled',
+                'round_number': round_number,
+            })
+    match_ids = bulk_insert(Match, match_rows, returning=True)
+
+    counts = defaultdict(int)
+    totals = defaultdict(lambda: defaultdict(int))
+    updates, stats, performances = [], [], []
+    for match_id, match in zip(match_ids, match_rows):
+        if match['status'] != 'completed':
+            continue
+        match_updates, match_stats, match_perfs = _simulate_match(
+            rng, match_id, match, squads, match['match_date'], updates_per_match)
+        updates.extend(match_updates)
+        stats.append(match_stats)
+        performances.extend(match_perfs)
+        for row in match_perfs:
+            total = totals[row['player_id']]
+            total['matches_played'] += 1
+            for key in ('goals', 'assists', 'yellow_cards', 'red_cards', 'minutes_played', 'shots',
+                        'shots_on_target', 'passes', 'passes_completed', 'tackles', 'interceptions', 'saves'):
+                total[key] += row[key]
+        if len(performances) >= 20000:
+            counts['updates'] += len(updates)
+            counts['performances'] += len(performances)
+            bulk_insert(MatchUpdate, updates)
+            bulk_insert(PlayerMatchPerformance, performances)
+            updates, performances = [], []
+    counts['updates'] += len(updates)
+    counts['performances'] += len(performances)
+    bulk_insert(MatchUpdate, updates)
+    bulk_insert(PlayerMatchPerformance, performances)
+    bulk_insert(MatchStats, stats)
+
+    player_stats = []
+    for squad in squads.values():
+        for player_id, _, _ in squad:
+            total = totals.get(player_id, {})
+            passes = total.get('passes', 0)
+            row = {key: total.get(key, 0) for key in (
+                'goals', 'assists', 'yellow_cards', 'red_cards', 'matches_played', 'minutes_played',
+                'shots', 'shots_on_target', 'passes', 'tackles', 'interceptions', 'saves')}
+            row['player_id'] = player_id
+            row['pass_accuracy'] = round(total.get('passes_completed', 0) / passes * 100, 1) if passes else 0.0
+            player_stats.append(row)
+    bulk_insert(PlayerStats, player_stats)
+    db.session.commit()
+
+    counts.update(teams=len(team_ids), players=len(team_ids) * players_per_team,
+                  matches=len(match_ids), stats=len(stats))
+    return counts
+
+
+def generate_league(num_tournaments=1, seed=42, **options):
+    """Generate num_tournaments synthetic tournaments with a reproducible seed."""
+    rng = random.Random(seed)
+    totals = defaultdict(int)
+    for index in range(num_tournaments):
+        started = time.perf_counter()
+        counts = generate_tournament(rng, index, **options)
+        for key, value in counts.items():
+            totals[key] += value
+        print(f" - Tournament {index + 1}/{num_tournaments}: {counts['matches']} matches, "
+              f"{counts['updates']} updates, {counts['performances']} performances "
+              f"in {time.perf_counter() - started:.1f}s")
+    return dict(totals)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic league for load testing.')
+    parser.add_argument('--tournaments', type=int, default=1)
+    parser.add_argument('--teams', type=int, default=32)
+    parser.add_argument('--players', type=int, default=25)
+    parser.add_argument('--updates-per-match', type=int, default=12)
+    parser.add_argument('--played-ratio', type=float, default=0.75)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from app import app
+
+    with app.app_context():
+        db.create_all()
+        print("Generating synthetic league...")
+        totals = generate_league(
+            args.tournaments, seed=args.seed,
+            teams_per_tournament=args.teams, players_per_team=args.players,
+            updates_per_match=args.updates_per_match, played_ratio=args.played_ratio)
+        print(f"Synthetic league complete: {totals}")
@@ -0,0 +1,65 @@
+from datetime import date
+
+import pytest
+from flask import Flask
+from sqlalchemy import text
+
+from extensions import db
+from models import Player, Team, Tournament
+import search
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'search.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+def _tournament(name, team_name, player_name):
+    tournament = Tournament(name=name, start_date=date(2024, 6, 1))
+    team = Team(name=team_name, tournament=tournament)
+    db.session.add_all([tournament, team, Player(name=player_name, team=team)])
+    db.session.commit()
+    return tournament
+
+
+def test_rebuild_one_tournament(app):
+    first = _tournament('Summer Cup', 'Casablanca FC', 'Youssef Amrani')
+    _tournament('Winter Cup', 'Rabat United', 'Karim Benali')
+    db.session.execute(text('DELETE FROM search_index'))
+    db.session.commit()
+
+    search.rebuild(first.id)
+
+    titles = {result['title'] for result in search.search('cup') + search.search('casablanca')
+              + search.search('youssef') + search.search('karim')}
+    assert titles == {'Summer Cup', 'Casablanca FC', 'Youssef Amrani'}
+
+
+def test_matches_titles_only(app):
+    _tournament('Summer Cup', 'Casablanca FC', 'Youssef Amrani')
+    assert [result['kind'] for result in search.search('casablanca')] == ['team']
+
+
+def test_team_rename_refreshes_player_subtitles(app):
+    _tournament('Summer Cup', 'Casablanca FC', 'Youssef Amrani')
+    db.session.execute(db.select(Team)).scalar_one().name = 'Raja Club'
+    db.session.commit()
+    assert search.search('youssef')[0]['subtitle'] == 'Raja Club'
+    assert search.autocomplete('yous')[0]['subtitle'] == 'Raja Club'
+
+
+def test_new_index_is_filled_from_existing_rows(app):
+    _tournament('Summer Cup', 'Casablanca FC', 'Youssef Amrani')
+    db.session.execute(text('DROP TABLE search_index'))
+    db.session.commit()
+    search._schema_ready.clear()
+
+    results = search.search('summer')
+    assert [result['title'] for result in results] == ['Summer Cup']
+    assert 'score' in results[0]  # Answered by FTS, not the LIKE fallback
@@ -0,0 +1,226 @@
+"""Streaming export/import of a full tournament graph.
+
+A tournament is written as newline-delimited JSON: one header line, then one
+line per row, parents before children (tournament, teams, players, matches,
+updates, archived updates, match summaries, stats, player stats,
+performances). Reads use server-side cursors
+with yield_per and imports go through batched Core insert() calls, so memory
+only grows with the id maps for teams, players and matches, never with the
+number of MatchUpdate rows.
+
+Usage:
+    python transfer.py export 3 season-2024.ndjson.gz
+    python transfer.py import season-2024.ndjson.gz
+"""
+import argparse
+import gzip
+import json
+from datetime import date, datetime
+
+from sqlalchemy import insert, select
+
+from extensions import db
+from models import (Tournament, Team, Player, Match, MatchUpdate, MatchUpdateArchive, MatchSummary,
+                    MatchStats, PlayerStats, PlayerMatchPerformance)
+from post_match import enqueue_post_import
+
+FORMAT_VERSION = 1
+BATCH_SIZE = 5000
+
+# Export order matters: a row's foreign keys always point to rows already seen.
+SECTIONS = [
+    ('tournament', Tournament),
+    ('team', Team),
+    ('player', Player),
+    ('match', Match),
+    ('match_update', MatchUpdate),
+    ('match_update_archive', MatchUpdateArchive),
+    ('match_summary', MatchSummary),
+    ('match_stats', MatchStats),
+    ('player_stats', PlayerStats),
+    ('performance', PlayerMatchPerformance),
+]
+
+# Foreign keys rewritten on import: column -> section whose id map resolves it.
+REMAP = {
+    'tournament_id': 'tournament',
+    'team_id': 'team',
+    'home_team_id': 'team',
+    'away_team_id': 'team',
+    'player_id': 'player',
+    'match_id': 'match',
+}
+
+# Environment specific references that are not carried across.
+DROPPED_COLUMNS = {'coach_id'}
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def _section_query(section, model, tournament_id):
+    table = model.__table__
+    stmt = select(table)
+    if section == 'tournament':
+        stmt = stmt.where(table.c.id == tournament_id)
+    elif section == 'team' or section == 'match':
+        stmt = stmt.where(table.c.tournament_id == tournament_id)
+    elif section == 'player':
+        stmt = stmt.join(Team.__table__, Team.__table__.c.id == table.c.team_id)\
+                   .where(Team.__table__.c.tournament_id == tournament_id)
+    elif section in ('match_update', 'match_update_archive', 'match_stats', 'performance'):
+        stmt = stmt.join(Match.__table__, Match.__table__.c.id == table.c.match_id)\
+                   .where(Match.__table__.c.tournament_id == tournament_id)
+    elif section == 'match_summary':
+        stmt = stmt.where(table.c.tournament_id == tournament_id)
+    elif section == 'player_stats':
+        stmt = stmt.join(Player.__table__, Player.__table__.c.id == table.c.player_id)\
+                   .join(Team.__table__, Team.__table__.c.id == Player.__table__.c.team_id)\
+                   .where(Team.__table__.c.tournament_id == tournament_id)
+    return stmt.order_by(*table.primary_key.columns)
+
+
+def _encode(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def iter_tournament(tournament_id, yield_per=BATCH_SIZE):
+    """Yield (section, row dict) for every row of a tournament graph, streaming from the database."""
+    for section, model in SECTIONS:
+        stmt = _section_query(section, model, tournament_id)
+        result = db.session.execute(stmt.execution_options(stream_results=True, yield_per=yield_per))
+        for row in result.mappings():
+            yield section, {key: _encode(value) for key, value in row.items() if key not in DROPPED_COLUMNS}
+
+
+def export_tournament(tournament_id, fp):
+    """Write a tournament graph as NDJSON to an open text file. Returns per-section counts."""
+    if db.session.get(Tournament, tournament_id) is None:
+        raise ValueError(f'Tournament {tournament_id} does not exist')
+    counts = dict.fromkeys((section for section, _ in SECTIONS), 0)
+    fp.write(json.dumps({'format': 'tournament-ndjson', 'version': FORMAT_VERSION}) + '\n')
+    for section, row in iter_tournament(tournament_id):
+        fp.write(json.dumps({'type': section, 'row': row}, ensure_ascii=False) + '\n')
+        counts[section] += 1
+    return counts
+
+
+def _decoder(model):
+    """Build a function turning exported JSON values back into column values."""
+    parsers = {}
+    for column in model.__table__.columns:
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            python_type = None
+        if python_type is datetime:
+            parsers[column.name] = datetime.fromisoformat
+        elif python_type is date:
+            parsers[column.name] = date.fromisoformat
+
+    def decode(row):
+        for name, parse in parsers.items():
+            if row.get(name) is not None:
+                row[name] = parse(row[name])
+        return row
+    return decode
+
+
+class _Importer:
+    """Buffers rows per section and flushes them with batched inserts."""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.id_maps = {section: {} for section in ('tournament', 'team', 'player', 'match')}
+        self.models = dict(SECTIONS)
+        self.decoders = {section: _decoder(model) for section, model in SECTIONS}
+        self.pending_section = None
+        self.old_ids = []
+        self.rows = []
+        self.counts = dict.fromkeys(self.models, 0)
+
+    def add(self, section, row):
+        if section not in self.models:
+            raise ValueError(f'Unknown section {section!r}')
+        if section != self.pending_section:
+            self.flush()
+            self.pending_section = section
+        old_id = row.pop('id', None)  # match_summary is keyed by match_id
+        for column, target in REMAP.items():
+            if row.get(column) is not None and column in self.models[section].__table__.c:
+                try:
+                    row[column] = self.id_maps[target][row[column]]
+                except KeyError:
+                    raise ValueError(f'{section} {old_id} references unknown {column}={row[column]}')
+        self.old_ids.append(old_id)
+        self.rows.append(self.decoders[section](row))
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        section, model = self.pending_section, self.models[self.pending_section]
+        if section in self.id_maps:
+            stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+            new_ids = db.session.scalars(stmt, self.rows).all()
+            self.id_maps[section].update(zip(self.old_ids, new_ids))
+        else:
+            db.session.execute(insert(model), self.rows)
+        self.counts[section] += len(self.rows)
+        self.old_ids, self.rows = [], []
+
+
+def import_tournament(fp, batch_size=BATCH_SIZE):
+    """Import an NDJSON tournament graph from an open text file in a single transaction.
+
+    Ids are reassigned by the target database; returns (new tournament id, per-section counts).
+    """
+    header = json.loads(fp.readline() or '{}')
+    if header.get('format') != 'tournament-ndjson' or header.get('version') != FORMAT_VERSION:
+        raise ValueError(f'Unsupported export header: {header}')
+
+    importer = _Importer(batch_size)
+    try:
+        for line in fp:
+            if line.strip():
+                record = json.loads(line)
+                importer.add(record['type'], record['row'])
+        importer.flush()
+        new_tournament_ids = list(importer.id_maps['tournament'].values())
+        for tournament_id in new_tournament_ids:
+            # Player stats, ratings and projections are rebuilt by the job workers
+            enqueue_post_import(tournament_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return (new_tournament_ids[0] if new_tournament_ids else None), importer.counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export or import a tournament as NDJSON.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    export_parser = sub.add_parser('export')
+    export_parser.add_argument('tournament_id', type=int)
+    export_parser.add_argument('path', help='output file, gzip-compressed if it ends with .gz')
+    import_parser = sub.add_parser('import')
+    import_parser.add_argument('path')
+    args = parser.parse_args()
+
+    from app import app
+
+    with app.app_context():
+        if args.command == 'export':
+            with _open(args.path, 'w') as fp:
+                counts = export_tournament(args.tournament_id, fp)
+            print(f"Exported tournament {args.tournament_id} to {args.path}: {counts}")
+        else:
+            with _open(args.path, 'r') as fp:
+                tournament_id, counts = import_tournament(fp)
+            print(f"Imported {args.path} as tournament {tournament_id}: {counts}")